@@ -0,0 +1,42 @@
+"""
+八字计算Controller层
+处理HTTP请求，调用Service层处理业务逻辑
+"""
+from fastapi import APIRouter, HTTPException, Request
+from starlette.datastructures import UploadFile
+
+from services.bazi_service import BaziService
+from utils.unified_logger import get_logger
+
+# 创建路由器
+router = APIRouter(prefix="/api/bazi", tags=["bazi"])
+
+logger = get_logger(__name__)
+
+# 初始化服务
+bazi_service = BaziService()
+
+
+@router.post("/batch")
+async def batch_bazi(request: Request):
+    """
+    批量计算八字（NDJSON 流式返回）
+
+    表单字段 file 为出生时间CSV文件（公历，北京时间），第一行为表头，需包含 birth_time 列（格式：1990-05-17 10:30），
+    或 year、month、day、hour 四列及可选的 minute 列；可选 id 列会原样返回。
+    每行返回一个 JSON：row、id、year_zhu、month_zhu、day_zhu、hour_zhu，解析失败的行返回 error。
+    文件需为 UTF-8 编码，否则返回 400；文件中途出现编码或格式错误时，最后一行为 {"error", "row"}
+    """
+    try:
+        # 手动解析表单，上传文件在流式响应结束前保持打开
+        form = await request.form()
+        file = form.get("file")
+        if not isinstance(file, UploadFile):
+            raise HTTPException(status_code=400, detail="缺少CSV文件（表单字段 file）")
+        await bazi_service.check_encoding(file)
+        return bazi_service.create_ndjson_response(bazi_service.batch_from_csv(file))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"批量计算八字失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"{str(e)}")
@@ -2,10 +2,14 @@
 聊天API Controller层
 处理HTTP请求，调用ChatService处理业务逻辑
 """
+import json
 from typing import Optional, List
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
+from infrastructure.parlant_client import parlant_client
+from services.chat_event_hub import chat_event_hub
 from services.chat_service import chat_service
 from utils.unified_logger import get_logger
 
@@ -22,6 +26,12 @@ class CreateSessionRequest(BaseModel):
     title: Optional[str] = None
 
 
+class SendMessageRequest(BaseModel):
+    """发送消息并流式返回回复的请求"""
+    agent_id: str  # 必需参数
+    message: str
+
+
 class CreateEventRequest(BaseModel):
     """创建事件请求"""
     agent_id: str  # 必需参数
@@ -126,6 +136,88 @@ async def list_events(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/sessions/{session_id}/stream")
+async def stream_events(
+    session_id: str,
+    request: Request,
+    agent_id: str = Query(..., description="Agent ID（必需参数）"),
+    min_offset: int = Query(0, description="从该偏移量开始推送"),
+    kinds: Optional[List[str]] = Query(None, description="事件类型过滤")
+):
+    """
+    推送会话事件（Server-Sent Events）
+    
+    代替客户端循环调用 /events 长轮询：同一会话的所有连接共享一个上游轮询。
+    每个事件的 SSE id 为其 offset，断线重连时浏览器携带 Last-Event-ID，从下一个事件继续推送；
+    没有新事件时定期发送心跳注释。会话不存在时返回 404，推送中会话被删除时结束响应
+    """
+    if not agent_id:
+        raise HTTPException(status_code=400, detail="agent_id 是必需参数")
+    # 打开长连接前检查会话是否存在（结果有缓存），不存在的会话不建立上游轮询
+    if not await chat_service.check_session_exists(session_id):
+        raise HTTPException(status_code=404, detail="会话不存在或已过期")
+    last_event_id = request.headers.get("last-event-id", "")
+    if last_event_id.isdigit():
+        min_offset = max(min_offset, int(last_event_id) + 1)
+
+    async def generate_stream():
+        async for event in chat_event_hub.subscribe(session_id, agent_id, min_offset=min_offset, kinds=kinds):
+            if event is None:
+                yield ": ping\n\n"
+                continue
+            offset = event.get("offset")
+            event_id = f"id: {offset}\n" if offset is not None else ""
+            yield f"{event_id}data: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(
+        generate_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/sessions/{session_id}/turn")
+async def send_and_stream(session_id: str, request: SendMessageRequest):
+    """
+    发送消息并流式返回 Agent 的回复（Server-Sent Events）
+    
+    一次请求完成一轮对话：先发送用户消息（accepted 事件返回该消息），
+    之后只推送该消息之后 Agent 产生的事件，Agent 进入 ready 状态时发送 done 事件并关闭连接
+    """
+    if not request.agent_id:
+        raise HTTPException(status_code=400, detail="agent_id 是必需参数")
+    try:
+        customer_event = await chat_service.create_event(
+            session_id, request.agent_id, {"kind": "message", "source": "customer", "message": request.message}
+        )
+    except RuntimeError as e:
+        error_msg = str(e)
+        if "会话不存在" in error_msg or "已过期" in error_msg:
+            raise HTTPException(
+                status_code=404,
+                detail=f"会话不存在或已过期，请重新创建会话。会话ID: {session_id}"
+            )
+        logger.error(f"发送消息失败: {e}")
+        raise HTTPException(status_code=500, detail=error_msg)
+
+    async def generate_stream():
+        yield f"event: accepted\ndata: {json.dumps(customer_event, ensure_ascii=False)}\n\n"
+        async for event in chat_event_hub.stream_turn(session_id, request.agent_id, customer_event):
+            if event is None:
+                yield ": ping\n\n"
+                continue
+            offset = event.get("offset")
+            event_id = f"id: {offset}\n" if offset is not None else ""
+            yield f"{event_id}data: {json.dumps(event, ensure_ascii=False)}\n\n"
+        yield "event: done\ndata: {}\n\n"
+
+    return StreamingResponse(
+        generate_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.get("/agent/info")
 async def get_agent_info():
     """获取Agent信息"""
@@ -144,3 +236,12 @@ async def get_agent_info():
         logger.error(f"获取Agent信息失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+
+@router.get("/stats")
+async def get_stats():
+    """获取访问 Parlant 的连接池、请求统计、会话缓存和事件推送统计"""
+    return {
+        "parlant_client": parlant_client.stats(),
+        "chat_service": chat_service.stats(),
+        "event_hub": chat_event_hub.stats(),
+    }
@@ -2,11 +2,12 @@
 专家管理Controller层
 处理HTTP请求，调用Service层处理业务逻辑
 """
+import asyncio
 from typing import List, Optional, Dict, Any
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 
-from services.expert_service import ExpertService
+from services.expert_service import expert_service
 from utils.unified_logger import get_logger
 
 # 创建路由器
@@ -14,9 +15,6 @@ router = APIRouter(prefix="/api/expert", tags=["expert"])
 
 logger = get_logger(__name__)
 
-# 初始化服务
-expert_service = ExpertService()
-
 
 class ExpertCreate(BaseModel):
     """创建专家请求模型"""
@@ -44,6 +42,15 @@ class ExpertResponse(BaseModel):
     prompt: Optional[str] = ""
     icon: Optional[str] = "🔮"
     required_fields: Optional[List[Dict[str, Any]]] = []
+    # 当前 prompt 版本号，仅 SQLite 存储提供
+    prompt_version: Optional[int] = None
+
+
+class PromptVersionResponse(BaseModel):
+    """prompt 版本响应模型"""
+    version: int
+    prompt: str
+    created_at: float
 
 
 @router.get("/list", response_model=List[ExpertResponse])
@@ -72,6 +79,23 @@ async def get_expert(expert_id: str):
         raise HTTPException(status_code=500, detail=f"获取专家信息失败: {str(e)}")
 
 
+@router.get("/{expert_id}/versions", response_model=List[PromptVersionResponse])
+async def get_expert_versions(expert_id: str):
+    """获取专家的 prompt 版本历史（仅 SQLite 存储支持）"""
+    try:
+        if not expert_service.supports_versions:
+            raise HTTPException(status_code=400, detail="当前专家存储不保存 prompt 版本历史")
+        versions = await asyncio.to_thread(expert_service.get_prompt_versions, expert_id)
+        if not versions:
+            raise HTTPException(status_code=404, detail="专家不存在")
+        return versions
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"获取专家版本历史失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"获取专家版本历史失败: {str(e)}")
+
+
 @router.post("/create", response_model=ExpertResponse)
 async def create_expert(expert: ExpertCreate):
     """创建新专家"""
@@ -83,7 +107,7 @@ async def create_expert(expert: ExpertCreate):
             "icon": expert.icon or "🔮",
             "required_fields": expert.required_fields or []
         }
-        new_expert = expert_service.create_expert(expert_data)
+        new_expert = await expert_service.create_expert(expert_data)
         return new_expert
     except Exception as e:
         logger.error(f"创建专家失败: {str(e)}")
@@ -106,7 +130,7 @@ async def update_expert(expert_id: str, expert_update: ExpertUpdate):
         if expert_update.required_fields is not None:
             expert_data["required_fields"] = expert_update.required_fields
         
-        expert = expert_service.update_expert(expert_id, expert_data)
+        expert = await expert_service.update_expert(expert_id, expert_data)
         if not expert:
             raise HTTPException(status_code=404, detail="专家不存在")
         return expert
@@ -121,7 +145,7 @@ async def update_expert(expert_id: str, expert_update: ExpertUpdate):
 async def delete_expert(expert_id: str):
     """删除专家"""
     try:
-        success = expert_service.delete_expert(expert_id)
+        success = await expert_service.delete_expert(expert_id)
         if not success:
             raise HTTPException(status_code=404, detail="专家不存在")
         return {"message": "专家已删除"}
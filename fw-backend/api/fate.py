@@ -6,6 +6,12 @@ from typing import List, Optional
 from fastapi import APIRouter, HTTPException, Query, Request
 from starlette.datastructures import UploadFile
 
+from graph.graph_registry import fate_graph_registry
+from infrastructure.analysis_cache import analysis_cache
+from infrastructure.blob_store import blob_store
+from infrastructure.checkpointer import checkpoint_manager
+from infrastructure.service_manager import service_manager
+from llm_provider.limiter import llm_limiters
 from services.fortune_service import FortuneService
 from utils.unified_logger import get_logger
 
@@ -23,6 +29,7 @@ async def analyze_fortune(
     request: Request,
     expert: Optional[List[str]] = Query(None, description="专家ID列表（查询参数）"),
     task_id: str = Query(..., description="任务ID（必需参数）"),
+    stream: bool = Query(False, description="是否逐token流式返回专家报告"),
 ):
     """
     命理分析接口（流式返回）
@@ -30,6 +37,8 @@ async def analyze_fortune(
     根据选定的专家配置，动态处理表单数据并进行命理分析
     使用Server-Sent Events流式返回最终分析结果
     专家ID从查询参数（expert）获取
+    stream=true 时，专家报告以 delta 事件（expert_name、delta、seq）逐token返回，
+    每个专家结束时发送携带完整报告的 done 事件
     """
     try:
         # 获取专家列表
@@ -52,7 +61,7 @@ async def analyze_fortune(
         )
         
         # 构建用户数据
-        user_data = fortune_service.build_user_data(
+        user_data = await fortune_service.build_user_data(
             selected_experts, expert_form_data, expert_uploaded_files
         )
         
@@ -61,7 +70,7 @@ async def analyze_fortune(
         
         # 执行分析并返回流式响应
         stream_generator = fortune_service.analyze_fortune_stream(
-            task_id, selected_experts, user_data
+            task_id, selected_experts, user_data, stream_tokens=stream
         )
         
         return fortune_service.create_streaming_response(stream_generator)
@@ -70,4 +79,16 @@ async def analyze_fortune(
         raise
     except Exception as e:
         logger.error(f"命理分析失败: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"{str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"{str(e)}")
+
+@router.get("/stats")
+async def get_stats():
+    """获取分析链路的缓存统计信息、LLM 限流和对冲请求统计"""
+    return {
+        "graph_cache": fate_graph_registry.stats(),
+        "analysis_cache": analysis_cache.stats(),
+        "blob_store": blob_store.stats(),
+        "checkpointer": checkpoint_manager.stats(),
+        "llm_limiters": llm_limiters.stats(),
+        "llm_hedge": service_manager.get_hedge_stats(),
+    }
@@ -0,0 +1,353 @@
+"""
+命理分析链路端到端基准测试
+
+在进程内直接驱动 ASGI 应用（不经过网络）调用 /api/fortune/analyze，覆盖完整的热路径：
+表单解析（api/fate.analyze_fortune）、FortuneService.build_user_data（含图片预处理）、
+FateGraph 构建、专家并行分析、process_streaming_events 和 SSE 编码。
+模型为固定延迟的模拟模型（llm_provider.fake.FakeChatModel，无抖动、无错误），
+因此结果只反映本服务自身的开销和并发行为。
+指定 --cassette 时改为回放录制的真实模型调用（LLM_CASSETTE_MODE=record 时录制，见 llm_provider.cassette），
+按原始的逐 token 时间返回真实长度和结构的报告；回放未命中时轮流使用同一模型的任意录制。
+
+按专家数（1、3、N）× 是否上传图片 × 并发数运行，每组输出：
+- ttfb: 首个响应字节的延迟（httpx.ASGITransport 会缓冲整个响应，这里用自带的 ASGI 驱动计时）
+- latency: 完整流式响应的延迟（p50 / p90 / p99）
+- rps: 每秒完成的请求数
+- peak_rss: 运行期间进程常驻内存峰值（采样 /proc/self/statm）
+另外单独测量 FateGraph 的构建（编译）耗时。
+
+结果写入 JSON 文件（默认 bench_analyze-<commit>.json），--compare 指定另一次的结果文件时输出对比，
+用于比较不同提交之间的性能回归。
+
+使用方法（在 fw-backend 目录下，需已配置 .env 或环境变量）:
+    python -m benchmarks.bench_analyze
+    python -m benchmarks.bench_analyze --experts 10 --concurrency 1,16,64 --stream --compare bench_analyze-abc1234.json
+    python -m benchmarks.bench_analyze --cassette llm_cassette.jsonl --cassette-model dashscope:qwen-plus
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlencode
+
+import httpx
+from fastapi import FastAPI
+from PIL import Image
+
+BIRTH_FIELD = {"field_name": "出生日期（公历）", "field_type": "datetime", "field_id": "birth_date"}
+IMAGE_FIELDS = [
+    {"field_name": "左手照片", "field_type": "image", "field_id": "left_hand"},
+    {"field_name": "右手照片", "field_type": "image", "field_id": "right_hand"},
+]
+PROMPT = "# 角色\n你是一位经验丰富的命理师。\n# 任务\n根据用户信息进行命理分析，返回 markdown 格式的报告。"
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    values = sorted(values)
+    if not values:
+        return {}
+
+    def pick(q: float) -> float:
+        return round(values[min(int(len(values) * q), len(values) - 1)] * 1000, 2)
+
+    return {"p50": pick(0.5), "p90": pick(0.9), "p99": pick(0.99), "max": round(values[-1] * 1000, 2)}
+
+
+class _RssSampler:
+    """后台线程定期采样进程常驻内存，记录峰值（非 Linux 时退回 ru_maxrss）"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @staticmethod
+    def current() -> int:
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except OSError:
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self.current())
+            self._stop.wait(self.interval)
+
+    def __enter__(self) -> "_RssSampler":
+        self.peak = self.current()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.current())
+
+
+async def _asgi_post(app, path: str, query: str, headers: Dict[str, str], body: bytes) -> Dict[str, Any]:
+    """直接调用 ASGI 应用，记录首字节和完整响应的耗时，统计 SSE 数据块和错误块"""
+    started = time.perf_counter()
+    result: Dict[str, Any] = {"status": 0, "ttfb": None, "bytes": 0, "chunks": 0, "errors": 0}
+    buffer = bytearray()
+    finished = asyncio.Event()
+    body_sent = False
+
+    async def receive() -> Dict[str, Any]:
+        nonlocal body_sent
+        if not body_sent:
+            body_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message: Dict[str, Any]) -> None:
+        if message["type"] == "http.response.start":
+            result["status"] = message["status"]
+        elif message["type"] == "http.response.body":
+            data = message.get("body", b"")
+            if data and result["ttfb"] is None:
+                result["ttfb"] = time.perf_counter() - started
+            result["bytes"] += len(data)
+            buffer.extend(data)
+            if not message.get("more_body", False):
+                finished.set()
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+        "query_string": query.encode(), "client": ("127.0.0.1", 50000), "server": ("bench", 80),
+        "headers": [(key.lower().encode(), value.encode()) for key, value in headers.items()],
+    }
+    try:
+        await app(scope, receive, send)
+    finally:
+        finished.set()
+    result["latency"] = time.perf_counter() - started
+    for block in bytes(buffer).decode("utf-8").split("\n\n"):
+        if not block.startswith("data: "):
+            continue
+        result["chunks"] += 1
+        if json.loads(block[6:]).get("step") == "error":
+            result["errors"] += 1
+    return result
+
+
+def _make_image(width: int = 2400, height: int = 1800, seed: int = 0) -> bytes:
+    """生成接近手机照片大小的 JPEG（渐变 + 噪声，避免被过度压缩）"""
+    rng = random.Random(seed)
+    image = Image.new("RGB", (width // 8, height // 8))
+    image.putdata([
+        ((x * 2 + rng.randint(0, 40)) % 256, (y * 2 + rng.randint(0, 40)) % 256, rng.randint(80, 160))
+        for y in range(height // 8) for x in range(width // 8)
+    ])
+    image = image.resize((width, height), Image.BILINEAR)
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=92)
+    return output.getvalue()
+
+
+def _experts(count: int) -> List[Dict[str, Any]]:
+    """生成专家配置：每个专家都需要出生日期，带图片的场景另外需要左右手照片"""
+    experts = []
+    for i in range(count):
+        experts.append({
+            "id": f"bench-text-{i}", "name": f"八字专家{i}", "skills": "八字", "icon": "📅",
+            "prompt": f"{PROMPT}\n（专家 {i}）", "required_fields": [BIRTH_FIELD],
+        })
+        experts.append({
+            "id": f"bench-image-{i}", "name": f"手相专家{i}", "skills": "手相", "icon": "✋",
+            "prompt": f"{PROMPT}\n（专家 {i}）", "required_fields": [BIRTH_FIELD, *IMAGE_FIELDS],
+        })
+    return experts
+
+
+def _request_body(images: bool, image_bytes: bytes) -> tuple[Dict[str, str], bytes]:
+    """构造 multipart 表单请求体，所有请求共用"""
+    files = {field["field_id"]: (f"{field['field_id']}.jpg", image_bytes, "image/jpeg") for field in IMAGE_FIELDS} if images else None
+    request = httpx.Request("POST", "http://bench/api/fortune/analyze",
+                            data={"birth_date": "1990-05-17 08:30"}, files=files)
+    body = request.read()
+    return {"content-type": request.headers["content-type"], "content-length": str(len(body))}, body
+
+
+async def _run_scenario(app, expert_ids: List[str], images: bool, image_bytes: bytes, concurrency: int,
+                        requests: int, stream: bool) -> Dict[str, Any]:
+    headers, body = _request_body(images, image_bytes)
+
+    def query() -> str:
+        return urlencode({"expert": expert_ids, "task_id": f"bench-{uuid.uuid4().hex}",
+                          "stream": "true" if stream else "false"}, doseq=True)
+
+    # 预热：构建并缓存该专家组合的 FateGraph
+    warmup = await _asgi_post(app, "/api/fortune/analyze", query(), headers, body)
+    if warmup["status"] != 200 or warmup["errors"]:
+        raise RuntimeError(f"预热请求失败: {warmup}")
+
+    results: List[Dict[str, Any]] = []
+    remaining = requests
+
+    async def worker() -> None:
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            results.append(await _asgi_post(app, "/api/fortune/analyze", query(), headers, body))
+
+    with _RssSampler() as rss:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    ok = [r for r in results if r["status"] == 200 and not r["errors"]]
+    return {
+        "name": f"experts={len(expert_ids)},images={'yes' if images else 'no'},c={concurrency}{',stream' if stream else ''}",
+        "experts": len(expert_ids),
+        "images": images,
+        "concurrency": concurrency,
+        "requests": len(results),
+        "errors": len(results) - len(ok),
+        "rps": round(len(ok) / elapsed, 2),
+        "ttfb_ms": _percentiles([r["ttfb"] for r in ok if r["ttfb"] is not None]),
+        "latency_ms": _percentiles([r["latency"] for r in ok]),
+        "sse_chunks": ok[0]["chunks"] if ok else 0,
+        "response_bytes": ok[0]["bytes"] if ok else 0,
+        "peak_rss_mb": round(rss.peak / 1024 / 1024, 1),
+    }
+
+
+def _graph_build_ms(experts: List[Dict[str, Any]], rounds: int = 20) -> float:
+    from graph.fate_graph import FateGraph
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        FateGraph(experts)
+    return round((time.perf_counter() - started) / rounds * 1000, 2)
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _print_results(results: Dict[str, Any], baseline: Optional[Dict[str, Any]]) -> None:
+    previous = {s["name"]: s for s in (baseline or {}).get("scenarios", [])}
+    print(f"{'场景':<32} {'req/s':>8} {'ttfb p50':>10} {'p50':>10} {'p90':>10} {'p99':>10} {'RSS':>8}")
+    for scenario in results["scenarios"]:
+        ttfb, latency = scenario["ttfb_ms"], scenario["latency_ms"]
+        line = (f"{scenario['name']:<32} {scenario['rps']:>8.1f} {ttfb.get('p50', 0):>8.1f}ms "
+                f"{latency.get('p50', 0):>8.1f}ms {latency.get('p90', 0):>8.1f}ms {latency.get('p99', 0):>8.1f}ms "
+                f"{scenario['peak_rss_mb']:>6.0f}MB")
+        if scenario["errors"]:
+            line += f"  错误 {scenario['errors']}"
+        old = previous.get(scenario["name"])
+        if old and old.get("rps") and old["latency_ms"].get("p99"):
+            line += (f"  | req/s {(scenario['rps'] / old['rps'] - 1) * 100:+.1f}%"
+                     f"，p99 {(latency.get('p99', 0) / old['latency_ms']['p99'] - 1) * 100:+.1f}%")
+        print(line)
+    builds = "，".join(f"{count} 个专家 {ms}ms" for count, ms in results["graph_build_ms"].items())
+    print(f"FateGraph 构建: {builds}")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="命理分析链路端到端基准测试")
+    parser.add_argument("--experts", type=int, default=10, help="最大专家数 N（另外固定测试 1 和 3）")
+    parser.add_argument("--concurrency", default="1,16", help="并发客户端数，逗号分隔")
+    parser.add_argument("--requests", type=int, default=20, help="每组的请求数")
+    parser.add_argument("--ttft", type=float, default=0.05, help="模拟模型首 token 延迟（秒）")
+    parser.add_argument("--tps", type=float, default=2000.0, help="模拟模型生成速度（token/秒）")
+    parser.add_argument("--output-tokens", type=int, default=400, help="模拟模型每次输出的 token 数")
+    parser.add_argument("--stream", action="store_true", help="逐 token 流式返回（stream=true）")
+    parser.add_argument("--cassette", default=None, help="回放的 LLM 录制文件（替代模拟模型）")
+    parser.add_argument("--cassette-model", default=None, help="回放录制中的模型名，默认为 FAST_LLM 配置")
+    parser.add_argument("--cassette-speed", type=float, default=1.0, help="回放速度倍数，0 为不等待")
+    parser.add_argument("--no-images", action="store_true", help="只测试不带图片的场景")
+    parser.add_argument("--output", default=None, help="结果 JSON 文件，默认 bench_analyze-<commit>.json")
+    parser.add_argument("--compare", default=None, help="与之前的结果 JSON 文件对比")
+    args = parser.parse_args()
+
+    import api.fate
+    from cfg.setting import get_settings
+    from infrastructure.expert_store import JsonExpertStore
+    from infrastructure.service_manager import service_manager
+    from llm_provider.cassette import Cassette, CassetteChatModel
+    from llm_provider.fake import FakeChatModel
+    from services.expert_service import expert_service
+
+    settings = get_settings()
+    llm = FakeChatModel(model="bench", ttft=args.ttft, tokens_per_second=args.tps, output_tokens=args.output_tokens)
+    if args.cassette:
+        llm = CassetteChatModel(inner=llm, cassette=Cassette(args.cassette), model=args.cassette_model or settings.fast_llm,
+                                mode="replay", speed=args.cassette_speed, miss="any")
+    service_manager.settings = settings
+    service_manager.fast_llm = llm
+    service_manager.vision_llm = llm
+
+    expert_counts = sorted({1, 3, args.experts})
+    experts = _experts(max(expert_counts))
+    experts_file = Path(tempfile.mkdtemp()) / "experts.json"
+    experts_file.write_text(json.dumps(experts, ensure_ascii=False), encoding="utf-8")
+    expert_service.store = JsonExpertStore(experts_file)
+
+    app = FastAPI()
+    app.include_router(api.fate.router)
+    image_bytes = _make_image()
+    concurrency_levels = [int(value) for value in args.concurrency.split(",") if value.strip()]
+    print(f"模拟模型: ttft {args.ttft}s，{args.tps:.0f} token/s，每次 {args.output_tokens} token；"
+          f"图片 {len(image_bytes):,} 字节 × {len(IMAGE_FIELDS)}；每组 {args.requests} 个请求，stream={args.stream}")
+
+    scenarios = []
+    for images in ((False,) if args.no_images else (False, True)):
+        for count in expert_counts:
+            prefix = "bench-image" if images else "bench-text"
+            expert_ids = [f"{prefix}-{i}" for i in range(count)]
+            for concurrency in concurrency_levels:
+                scenario = await _run_scenario(app, expert_ids, images, image_bytes, concurrency, args.requests, args.stream)
+                scenarios.append(scenario)
+                print(f"  {scenario['name']}: {scenario['rps']} req/s，p99 {scenario['latency_ms'].get('p99')}ms")
+
+    commit = _git_commit()
+    results = {
+        "meta": {
+            "commit": commit,
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+            "checkpointer": settings.checkpointer,
+        },
+        "graph_build_ms": {
+            str(count): _graph_build_ms([e for e in experts if e["id"].startswith("bench-text-")][:count])
+            for count in expert_counts
+        },
+        "scenarios": scenarios,
+    }
+    baseline = None
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        print(f"对比基线: {args.compare}（commit {baseline.get('meta', {}).get('commit')}）")
+    _print_results(results, baseline)
+
+    output = Path(args.output or f"bench_analyze-{commit or 'local'}.json")
+    output.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"结果已写入 {output}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
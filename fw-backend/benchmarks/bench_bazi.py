@@ -0,0 +1,130 @@
+"""
+天干地支与农历转换基准测试
+
+1. 在 1900-2100 全部日期、每个小时，以及每个节前后一分钟，校验预计算表与逐项计算结果一致
+2. 校验 1900-2100 全部日期的公历、农历互转可逆
+3. 如已安装 lunar_python，抽样与其八字排盘结果对照（节交接前后 2 分钟内的时刻跳过，节气时刻来源不同）
+4. 对比单次调用耗时（不使用任何缓存）
+
+使用方法（在 fw-backend 目录下）:
+    python -m benchmarks.bench_bazi
+"""
+import random
+import time
+import timeit
+from datetime import date, timedelta
+
+from tools.bazi_tools import TABLE_MAX_YEAR, TABLE_MIN_YEAR, _tian_gan_di_zhi_compute, tian_gan_di_zhi
+from tools.lunar_calendar import (
+    days_since_epoch,
+    lunar_to_solar,
+    parse_lunar_datetime,
+    solar_term_minutes,
+    solar_to_lunar,
+)
+
+
+def check_equivalence() -> int:
+    """逐日逐时及每个节前后校验，返回校验的组合数"""
+    checked = 0
+    current = date(TABLE_MIN_YEAR, 1, 1)
+    end = date(TABLE_MAX_YEAR, 12, 31)
+    while current <= end:
+        for hour in range(24):
+            args = (current.year, current.month, current.day, hour)
+            expected = _tian_gan_di_zhi_compute(*args)
+            actual = tian_gan_di_zhi(*args)
+            assert actual == expected, f"{args}: {actual} != {expected}"
+            checked += 1
+        current += timedelta(days=1)
+
+    epoch = date(TABLE_MIN_YEAR, 1, 1)
+    for year in range(TABLE_MIN_YEAR, TABLE_MAX_YEAR + 1):
+        for jie in range(12):
+            minutes = solar_term_minutes(year, jie * 2)
+            for moment in (minutes - 1, minutes):
+                day = epoch + timedelta(days=moment // 1440)
+                args = (day.year, day.month, day.day, moment % 1440 // 60, moment % 60)
+                expected = _tian_gan_di_zhi_compute(*args)
+                actual = tian_gan_di_zhi(*args)
+                assert actual == expected, f"{args}: {actual} != {expected}"
+                checked += 1
+    return checked
+
+
+def check_lunar_round_trip() -> int:
+    """公历转农历再转回公历，返回校验的天数"""
+    checked = 0
+    current = date(TABLE_MIN_YEAR, 1, 31)
+    end = date(TABLE_MAX_YEAR, 12, 31)
+    while current <= end:
+        lunar = solar_to_lunar(current.year, current.month, current.day)
+        assert lunar_to_solar(*lunar) == current, f"{current}: {lunar}"
+        checked += 1
+        current += timedelta(days=1)
+    return checked
+
+
+def check_lunar_python(samples: int = 5000) -> int:
+    """与 lunar_python 的八字排盘抽样对照，未安装时返回 0"""
+    try:
+        from lunar_python import Solar
+    except ImportError:
+        return 0
+    rng = random.Random(0)
+    checked = 0
+    while checked < samples:
+        year, month, day = rng.randint(1901, 2099), rng.randint(1, 12), rng.randint(1, 28)
+        hour, minute = rng.randint(0, 23), rng.randint(0, 59)
+        moment = days_since_epoch(year, month, day) * 1440 + hour * 60 + minute
+        if abs(moment - solar_term_minutes(year, 2 * (month - 1))) <= 2:
+            continue
+        eight_char = Solar.fromYmdHms(year, month, day, hour, minute, 0).getLunar().getEightChar()
+        eight_char.setSect(2)
+        expected = (eight_char.getYear(), eight_char.getMonth(), eight_char.getDay(), eight_char.getTime())
+        actual = tian_gan_di_zhi(year, month, day, hour, minute)
+        assert actual == expected, f"{(year, month, day, hour, minute)}: {actual} != {expected}"
+        checked += 1
+    return checked
+
+
+def main() -> None:
+    started = time.perf_counter()
+    lunar_to_solar(2000, 1, 1)
+    print(f"农历数据首次加载: {(time.perf_counter() - started) * 1000:.2f} ms")
+    started = time.perf_counter()
+    tian_gan_di_zhi(2000, 1, 1, 0)
+    print(f"预计算表首次构建: {(time.perf_counter() - started) * 1000:.2f} ms")
+
+    started = time.perf_counter()
+    checked = check_equivalence()
+    print(f"预计算表校验通过: {checked} 个组合，耗时 {time.perf_counter() - started:.1f} s")
+
+    started = time.perf_counter()
+    checked = check_lunar_round_trip()
+    print(f"公历农历互转校验通过: {checked} 天，耗时 {time.perf_counter() - started:.1f} s")
+
+    checked = check_lunar_python()
+    print(f"lunar_python 对照通过: {checked} 个样本" if checked else "未安装 lunar_python，跳过对照")
+
+    number = 200_000
+    cases = (
+        ("逐项计算", lambda: _tian_gan_di_zhi_compute(1990, 5, 17, 10, 30)),
+        ("预计算表", lambda: tian_gan_di_zhi(1990, 5, 17, 10, 30)),
+        ("农历转公历", lambda: lunar_to_solar(1990, 4, 23)),
+        ("公历转农历", lambda: solar_to_lunar(1990, 5, 17)),
+        ("农历输入到八字", lambda: _pillars_from_lunar("1990-04-23 10:30")),
+    )
+    for name, func in cases:
+        seconds = min(timeit.repeat(func, number=number, repeat=3))
+        print(f"{name}: {seconds / number * 1e9:.0f} ns/次")
+
+
+def _pillars_from_lunar(text: str):
+    """单次请求的完整路径：解析农历输入、转公历、排四柱"""
+    solar = parse_lunar_datetime(text)
+    return tian_gan_di_zhi(solar.year, solar.month, solar.day, solar.hour, solar.minute)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+专家列表接口并发吞吐基准测试
+
+在临时目录生成包含 EXPERT_COUNT 个专家的 experts.json，通过 ASGI 传输直接调用 /api/expert/list
+（不经过网络），以不同并发数发送请求，对比：
+
+- 旧实现：每次请求打开并解析 experts.json，按ID查找为线性扫描
+- 当前实现：内存快照，文件 mtime/大小不变时不重新读取，按ID查找为字典索引
+
+输出每秒请求数和 p50 / p99 延迟，以及 get_expert_by_id 的单次耗时
+
+使用方法（在 fw-backend 目录下，需已配置 .env 或环境变量）:
+    python -m benchmarks.bench_experts
+"""
+import asyncio
+import json
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+from fastapi import FastAPI
+
+import api.expert
+from infrastructure.expert_store import JsonExpertStore
+from services.expert_service import ExpertService
+
+EXPERT_COUNT = 50
+PROMPT_CHARS = 2000
+REQUESTS = 2000
+CONCURRENCY = (1, 10, 50)
+LOOKUP_ROUNDS = 10000
+
+
+class LegacyExpertService:
+    """旧实现：每次调用都读取并解析文件"""
+
+    def __init__(self, experts_file: Path):
+        self.experts_file = experts_file
+
+    def load_experts(self) -> List[Dict[str, Any]]:
+        with open(self.experts_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def get_all_experts(self) -> List[Dict[str, Any]]:
+        return self.load_experts()
+
+    def get_expert_by_id(self, expert_id: str) -> Optional[Dict[str, Any]]:
+        return next((e for e in self.load_experts() if e.get("id") == expert_id), None)
+
+
+def _write_experts(path: Path) -> List[str]:
+    experts = [
+        {
+            "id": str(uuid.uuid4()),
+            "name": f"专家{i}",
+            "skills": "八字、紫微斗数、手相",
+            "prompt": ("你是一位经验丰富的命理师，请根据用户信息进行分析。" * PROMPT_CHARS)[:PROMPT_CHARS],
+            "icon": "🔮",
+            "required_fields": [
+                {"field_name": "出生时间", "field_type": "text", "field_id": "birth_date"},
+                {"field_name": "左手照片", "field_type": "image", "field_id": "left_hand"},
+            ],
+        }
+        for i in range(EXPERT_COUNT)
+    ]
+    path.write_text(json.dumps(experts, ensure_ascii=False, indent=2), encoding="utf-8")
+    return [expert["id"] for expert in experts]
+
+
+async def _run(client: httpx.AsyncClient, concurrency: int) -> Dict[str, float]:
+    latencies: List[float] = []
+    remaining = REQUESTS
+
+    async def worker() -> None:
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            response = await client.get("/api/expert/list")
+            latencies.append(time.perf_counter() - started)
+            assert response.status_code == 200 and len(response.json()) == EXPERT_COUNT
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "rps": len(latencies) / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99)] * 1000,
+    }
+
+
+def _lookup_us(service, expert_ids: List[str]) -> float:
+    started = time.perf_counter()
+    for i in range(LOOKUP_ROUNDS):
+        assert service.get_expert_by_id(expert_ids[i % len(expert_ids)]) is not None
+    return (time.perf_counter() - started) / LOOKUP_ROUNDS * 1e6
+
+
+async def main() -> None:
+    experts_file = Path(tempfile.mkdtemp()) / "experts.json"
+    expert_ids = _write_experts(experts_file)
+    current = ExpertService()
+    current.store = JsonExpertStore(experts_file)
+
+    app = FastAPI()
+    app.include_router(api.expert.router)
+    transport = httpx.ASGITransport(app=app)
+
+    print(f"{EXPERT_COUNT} 个专家（文件 {experts_file.stat().st_size:,} 字节），每组 {REQUESTS} 个请求")
+    print(f"{'实现':<6} {'并发':>4} {'req/s':>10} {'p50':>10} {'p99':>10}")
+    for name, service in (("旧实现", LegacyExpertService(experts_file)), ("快照", current)):
+        api.expert.expert_service = service
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for concurrency in CONCURRENCY:
+                result = await _run(client, concurrency)
+                print(
+                    f"{name:<6} {concurrency:>6} {result['rps']:>10,.0f} "
+                    f"{result['p50_ms']:>8.2f}ms {result['p99_ms']:>8.2f}ms"
+                )
+    print(f"get_expert_by_id: 旧实现 {_lookup_us(LegacyExpertService(experts_file), expert_ids):.1f}us，"
+          f"快照 {_lookup_us(current, expert_ids):.2f}us（重新加载 {current.reloads} 次）")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,137 @@
+"""
+检查点序列化器基准测试
+
+对比旧的 pickle 序列化器与当前的 msgpack 序列化器（CustomSerializer），数据为接近实际的状态：
+
+- reports: FateGraphState，10 个专家的 markdown 报告（每份约 4000 字）和综合报告
+- images: 旧版本在状态中直接保存的 base64 图片（两张约 300KB 的图片）
+- messages: 专家节点调用模型时的消息列表（系统提示、带图片的用户消息、模型回复）
+- blob: 原始图片字节
+
+输出每种数据的序列化结果字节数、dumps / loads 耗时；当前序列化器分别测试不压缩和默认压缩阈值
+（超过阈值时使用 zstd）。开始计时前校验两种序列化器的往返结果一致
+
+使用方法（在 fw-backend 目录下）:
+    python -m benchmarks.bench_serializer
+"""
+import base64
+import os
+import pickle
+import random
+import time
+from typing import Any, Callable, Dict, Tuple
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from graph.fate_graph import SYNTHESIS_EXPERT_NAME
+from utils.custom_serializer import DEFAULT_COMPRESS_THRESHOLD, CustomSerializer
+
+REPORT_CHARS = 4000
+EXPERT_COUNT = 10
+IMAGE_BYTES = 300 * 1024
+ROUNDS = 200
+
+
+class LegacySerializer:
+    """旧序列化器：顶层消息转为字典后 pickle，其余对象直接 pickle"""
+
+    def dumps_typed(self, obj: Any) -> Tuple[str, bytes]:
+        if isinstance(obj, (AIMessage, HumanMessage, SystemMessage)):
+            obj_dict = {
+                "type": obj.__class__.__name__,
+                "content": obj.content,
+                "additional_kwargs": obj.additional_kwargs,
+                "id": obj.id,
+            }
+            return obj.__class__.__name__, pickle.dumps(obj_dict)
+        return "pickle", pickle.dumps(obj)
+
+    def loads_typed(self, data: Tuple[str, bytes]) -> Any:
+        return pickle.loads(data[1])
+
+
+_SENTENCES = (
+    "- **日主**：甲木生于寅月，得令而旺。\n",
+    "- **用神**：取火泄秀，以金为忌。\n",
+    "| 大运 | 年份 | 吉凶 |\n|---|---|---|\n| 丙午 | 2024-2033 | 吉 |\n\n",
+    "今年事业上有贵人相助，宜主动争取机会。",
+    "财运平稳，正财为主，偏财不宜冒进。",
+    "感情方面需多加沟通，避免因小事起争执。",
+    "健康上注意肝胆与睡眠，作息宜规律。",
+    "流年天干透出官星，工作中责任加重，压力随之而来。",
+    "月柱与日柱相合，家庭关系和睦，长辈助力明显。",
+    "下半年运势渐佳，适合学习进修或调整方向。",
+)
+
+
+def _report(name: str, rng: random.Random) -> str:
+    """由常见段落随机组合的 markdown 报告"""
+    parts = [f"# {name} 分析报告\n\n"]
+    length = len(parts[0])
+    while length < REPORT_CHARS:
+        if rng.random() < 0.1:
+            part = f"\n## 第{len(parts)}节\n\n"
+        else:
+            part = rng.choice(_SENTENCES)
+        parts.append(part)
+        length += len(part)
+    return "".join(parts)[:REPORT_CHARS]
+
+
+def _image_base64() -> str:
+    # 随机字节模拟已压缩的 JPEG，压缩算法无法进一步缩小
+    return "data:image/jpeg;base64," + base64.b64encode(os.urandom(IMAGE_BYTES)).decode("utf-8")
+
+
+def _cases() -> Dict[str, Any]:
+    rng = random.Random(0)
+    reports = {f"专家{i}": _report(f"专家{i}", rng) for i in range(EXPERT_COUNT)}
+    images = {"palm": {"birth_date": "1990-04-23 10:30", "left_hand": _image_base64(), "right_hand": _image_base64()}}
+    messages = [
+        SystemMessage(content=_report("系统提示", rng)),
+        HumanMessage(content=[
+            {"type": "text", "text": "请分析我的手相"},
+            {"type": "image_url", "image_url": {"url": images["palm"]["left_hand"]}},
+        ]),
+        AIMessage(content=reports["专家0"], additional_kwargs={"refusal": None}, id="run-1"),
+    ]
+    return {
+        "reports": {"user_data": {"expert": {"birth_date": "1990-04-23 10:30"}},
+                    "expert_reports": reports,
+                    "final_report": _report(SYNTHESIS_EXPERT_NAME, rng)},
+        "images": {"user_data": images, "expert_reports": {}, "final_report": ""},
+        "messages": messages,
+        "blob": os.urandom(IMAGE_BYTES),
+    }
+
+
+def _timeit(func: Callable[[], Any]) -> float:
+    started = time.perf_counter()
+    for _ in range(ROUNDS):
+        func()
+    return (time.perf_counter() - started) / ROUNDS
+
+
+def main() -> None:
+    serializers = (
+        ("pickle(旧)", LegacySerializer()),
+        ("msgpack", CustomSerializer(compress_threshold=0)),
+        ("msgpack+zstd", CustomSerializer()),
+    )
+    print(f"每项运行 {ROUNDS} 次，压缩阈值 {DEFAULT_COMPRESS_THRESHOLD:,} 字节")
+    print(f"{'数据':<10} {'序列化器':<14} {'类型':<14} {'bytes':>10} {'dumps':>11} {'loads':>11}")
+    for case_name, obj in _cases().items():
+        for serializer_name, serializer in serializers:
+            typed = serializer.dumps_typed(obj)
+            restored = serializer.loads_typed(typed)
+            assert restored == obj, (case_name, serializer_name)
+            dumps_seconds = _timeit(lambda: serializer.dumps_typed(obj))
+            loads_seconds = _timeit(lambda: serializer.loads_typed(typed))
+            print(
+                f"{case_name:<10} {serializer_name:<14} {typed[0]:<14} {len(typed[1]):>10,} "
+                f"{dumps_seconds * 1e6:>9.1f}us {loads_seconds * 1e6:>9.1f}us"
+            )
+
+
+if __name__ == "__main__":
+    main()
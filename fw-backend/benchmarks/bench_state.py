@@ -0,0 +1,151 @@
+"""
+FateGraphState 内存与序列化基准测试
+
+用与 FateGraph 相同的拓扑（START -> N 个专家节点 -> collect -> END）和相同的检查点配置
+（MemorySaver + CustomSerializer）运行 1、3、10 个专家，节点直接返回固定长度的报告，不调用模型。
+对比旧状态结构（expert_reports 与 streaming_chunks 各存一份报告）和当前结构（每份报告只存一次）：
+
+- state: 最终状态序列化后的字节数（超过压缩阈值时为 zstd 压缩后的大小，报告内容重复度高，压缩后两种结构差别不大）
+- checkpoint: 检查点中保存的全部字节数（通道快照 + 节点写入）
+- serialize: 最终状态序列化耗时
+- run: 整个图运行耗时（含每个超步的检查点写入）
+- peak: 运行期间 Python 分配的内存峰值（tracemalloc）
+
+使用方法（在 fw-backend 目录下）:
+    python -m benchmarks.bench_state
+"""
+import asyncio
+import time
+import tracemalloc
+from typing import Annotated, Any, Callable, Dict, List, TypedDict
+
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph import END, START, StateGraph
+
+from graph.fate_graph import SYNTHESIS_EXPERT_NAME, FateGraphState
+from utils.custom_serializer import CustomSerializer
+
+# 单份报告的长度（字符），与实际专家报告的量级相当
+REPORT_CHARS = 4000
+EXPERT_COUNTS = (1, 3, 10)
+ROUNDS = 20
+
+
+def _legacy_merge_dicts(left: Dict[str, Any], right: Dict[str, Any]) -> Dict[str, Any]:
+    result = left.copy()
+    result.update(right)
+    return result
+
+
+def _legacy_merge_lists(left: List[Dict[str, Any]], right: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return left + right
+
+
+class LegacyFateGraphState(TypedDict):
+    """旧的状态结构：报告同时写入 expert_reports 和 streaming_chunks"""
+    user_data: Dict[str, Any]
+    streaming_chunks: Annotated[List[Dict[str, Any]], _legacy_merge_lists]
+    expert_reports: Annotated[Dict[str, Any], _legacy_merge_dicts]
+
+
+def _report(name: str) -> str:
+    return (f"# {name} 分析报告\n" + "命理分析内容。" * REPORT_CHARS)[:REPORT_CHARS]
+
+
+def _legacy_update(name: str, report: str) -> Dict[str, Any]:
+    return {
+        "expert_reports": {name: report},
+        "streaming_chunks": [{"expert_name": name, "expert_report": report}],
+    }
+
+
+def _lean_update(name: str, report: str) -> Dict[str, Any]:
+    return {"expert_reports": {name: report}}
+
+
+def _lean_collect(report: str) -> Dict[str, Any]:
+    return {"final_report": report}
+
+
+def _build(state_type, expert_update: Callable, collect_update: Callable, expert_count: int):
+    workflow = StateGraph(state_type)
+    for i in range(expert_count):
+        name = f"expert_{i}"
+
+        async def expert_node(state, _name=name):
+            return expert_update(_name, _report(_name))
+
+        workflow.add_node(name, expert_node)
+        workflow.add_edge(START, name)
+        workflow.add_edge(name, "collect")
+
+    async def collect_node(state):
+        return collect_update(_report(SYNTHESIS_EXPERT_NAME))
+
+    workflow.add_node("collect", collect_node)
+    workflow.add_edge("collect", END)
+    checkpointer = MemorySaver(serde=CustomSerializer())
+    return workflow.compile(checkpointer=checkpointer), checkpointer
+
+
+def _checkpoint_bytes(checkpointer: MemorySaver) -> int:
+    blob_bytes = sum(len(value[1]) for value in checkpointer.blobs.values())
+    write_bytes = sum(
+        len(write[2][1])
+        for writes in checkpointer.writes.values()
+        for write in writes.values()
+    )
+    return blob_bytes + write_bytes
+
+
+async def _measure(name: str, state_type, expert_update, collect_update, initial_state, expert_count: int) -> Dict[str, float]:
+    serializer = CustomSerializer()
+    run_seconds = []
+    for i in range(ROUNDS):
+        graph, checkpointer = _build(state_type, expert_update, collect_update, expert_count)
+        config = {"configurable": {"thread_id": f"{name}-{expert_count}-{i}"}}
+        if i == 0:
+            tracemalloc.start()
+        started = time.perf_counter()
+        final_state = await graph.ainvoke(initial_state, config=config)
+        run_seconds.append(time.perf_counter() - started)
+        if i == 0:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            checkpoint_bytes = _checkpoint_bytes(checkpointer)
+
+    started = time.perf_counter()
+    for _ in range(ROUNDS):
+        _, state_bytes = serializer.dumps_typed(final_state)
+    serialize_seconds = (time.perf_counter() - started) / ROUNDS
+    return {
+        "state": len(state_bytes),
+        "checkpoint": checkpoint_bytes,
+        "serialize_ms": serialize_seconds * 1000,
+        "run_ms": min(run_seconds) * 1000,
+        "peak": peak,
+    }
+
+
+async def main() -> None:
+    user_data = {"expert": {"birth_date": "1990-04-23 10:30", "left_hand": "blob:sha256:" + "0" * 64}}
+    print(f"报告长度 {REPORT_CHARS} 字符，每组运行 {ROUNDS} 次")
+    print(f"{'专家数':>4} {'结构':<6} {'state':>10} {'checkpoint':>12} {'serialize':>11} {'run':>9} {'peak':>10}")
+    for expert_count in EXPERT_COUNTS:
+        cases = (
+            ("旧结构", LegacyFateGraphState, _legacy_update,
+             lambda report: _legacy_update(SYNTHESIS_EXPERT_NAME, report),
+             {"user_data": user_data, "streaming_chunks": [], "expert_reports": {}}),
+            ("新结构", FateGraphState, _lean_update, _lean_collect,
+             {"user_data": user_data, "expert_reports": {}, "final_report": ""}),
+        )
+        for name, state_type, expert_update, collect_update, initial_state in cases:
+            result = await _measure(name, state_type, expert_update, collect_update, initial_state, expert_count)
+            print(
+                f"{expert_count:>6} {name:<6} {result['state']:>10,} {result['checkpoint']:>12,} "
+                f"{result['serialize_ms']:>9.3f}ms {result['run_ms']:>7.2f}ms {result['peak']:>10,}"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,151 @@
+"""
+检查点续跑校验
+
+1. 子进程以 sqlite 检查点运行 3 个专家的分析，模型为假模型：第一个专家很快返回，其余两个很慢
+2. 父进程收到第一个专家报告 0.5 秒后 kill 子进程（此时另外两个专家仍在运行），模拟运行中崩溃。
+   LangGraph 在后台线程写入节点结果，节点结束事件先于写入完成，因此不在收到事件的瞬间 kill
+3. 新的子进程用同一个 task_id 重新提交：第一个专家的报告应立即重放，只调用剩余两个专家和综合分析
+4. 已完成的任务不续跑：用另一个 task_id 以专家 0、1 完整运行一次，再用同一个 task_id 只提交专家 2，
+   不应重放或重新发送专家 0、1 的旧报告（旧报告也不能进入综合分析）
+
+使用方法（在 fw-backend 目录下，需已配置 .env 或环境变量）:
+    python -m benchmarks.check_resume
+"""
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, List, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+TASK_ID = "resume-check"
+COMPLETED_TASK_ID = "resume-check-completed"
+EXPERT_COUNT = 3
+
+
+class _SlowFakeChatModel(BaseChatModel):
+    """按系统提示中的专家编号延迟返回的假模型，记录调用次数"""
+
+    slow_seconds: float = 0.0
+    calls: List[str] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "slow-fake"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        raise NotImplementedError
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        prompt = str(messages[0].content)
+        self.calls.append(prompt)
+        if "expert-0" not in prompt and "综合" not in prompt:
+            await asyncio.sleep(self.slow_seconds)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=f"报告: {prompt[:20]}"))])
+
+
+def _experts(indexes=range(EXPERT_COUNT)):
+    return [
+        {
+            "id": f"expert-{i}",
+            "name": f"专家{i}",
+            "prompt": f"expert-{i} 的分析提示",
+            "required_fields": [{"field_name": "问题", "field_type": "text", "field_id": "question"}],
+        }
+        for i in indexes
+    ]
+
+
+async def _run_phase(task_id: str, indexes: List[int], slow_seconds: float) -> None:
+    """子进程：运行一次分析，每个 SSE 数据块输出一行 JSON"""
+    from cfg.setting import get_settings
+    from graph.fate_graph import FateGraph
+    from infrastructure.service_manager import service_manager
+
+    fake = _SlowFakeChatModel(slow_seconds=slow_seconds)
+    service_manager.settings = get_settings()
+    service_manager.fast_llm = fake
+    service_manager.vision_llm = fake
+
+    experts = _experts(indexes)
+    user_data = {expert["id"]: {"question": "今年运势如何"} for expert in experts}
+    graph = FateGraph(experts)
+    async for chunk in graph.chat_with_planning_stream(task_id, user_data):
+        print(json.dumps(chunk, ensure_ascii=False), flush=True)
+    print(json.dumps({"llm_calls": len(fake.calls)}), flush=True)
+
+
+# 子进程阶段：task_id、专家编号、慢专家的延迟
+PHASES = {
+    "run": (TASK_ID, list(range(EXPERT_COUNT)), 60.0),
+    "resume": (TASK_ID, list(range(EXPERT_COUNT)), 0.0),
+    "complete-first": (COMPLETED_TASK_ID, [0, 1], 0.0),
+    "complete-second": (COMPLETED_TASK_ID, [2], 0.0),
+}
+
+
+def _spawn(phase: str, db_path: str) -> subprocess.Popen:
+    env = {**os.environ, "CHECKPOINTER": "sqlite", "CHECKPOINTER_SQLITE_PATH": db_path}
+    return subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.check_resume", phase],
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, env=env,
+    )
+
+
+def main() -> None:
+    db_path = os.path.join(tempfile.mkdtemp(), "checkpoints.db")
+
+    # 第一次运行：收到第一个专家报告后 kill
+    proc = _spawn("run", db_path)
+    for line in proc.stdout:
+        chunk = json.loads(line)
+        if chunk.get("expert_report"):
+            print(f"第一次运行收到 {chunk['expert_name']} 的报告，kill 子进程")
+            time.sleep(0.5)
+            proc.kill()
+            break
+    proc.wait()
+
+    # 第二次运行：同一个 task_id 续跑
+    proc = _spawn("resume", db_path)
+    chunks = [json.loads(line) for line in proc.stdout]
+    proc.wait()
+    replayed = [chunk["expert_name"] for chunk in chunks if chunk.get("replayed")]
+    reports = [chunk["expert_name"] for chunk in chunks if "expert_report" in chunk]
+    llm_calls = chunks[-1]["llm_calls"]
+    print(f"续跑重放: {replayed}")
+    print(f"续跑发送的报告: {reports}")
+    print(f"续跑模型调用次数: {llm_calls}")
+    assert replayed == ["专家0"], replayed
+    assert len(reports) == EXPERT_COUNT + 1, reports
+    assert llm_calls == EXPERT_COUNT, llm_calls
+    print("续跑校验通过：已完成的专家未重新调用模型")
+
+    # 已完成的任务：同一个 task_id 提交新的专家组合，不应带出旧报告
+    for phase in ("complete-first", "complete-second"):
+        proc = _spawn(phase, db_path)
+        chunks = [json.loads(line) for line in proc.stdout]
+        proc.wait()
+    reports = [chunk["expert_name"] for chunk in chunks if "expert_report" in chunk]
+    contents = "".join(chunk.get("expert_report", "") for chunk in chunks)
+    print(f"已完成任务再次提交发送的报告: {reports}")
+    assert not any(chunk.get("replayed") for chunk in chunks), chunks
+    assert set(reports) <= {"专家2", "命理师综合分析"} and "专家2" in reports, reports
+    assert "expert-0" not in contents and "expert-1" not in contents, contents
+    assert chunks[-1]["llm_calls"] == 1, chunks[-1]
+    print("已完成任务校验通过：旧的专家报告未被重新发送")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        asyncio.run(_run_phase(*PHASES[sys.argv[1]]))
+    else:
+        main()
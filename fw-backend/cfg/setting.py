@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import Dict, Optional
 
 class Settings(BaseSettings):
     """应用配置类 - 使用Pydantic Settings管理配置"""
@@ -19,6 +20,111 @@ class Settings(BaseSettings):
     port: int
 
     embedding: str
+
+    # 模拟 LLM（FAST_LLM/VISION_LLM/EMBEDDING 配置为 fake:<名称> 时使用），用于离线压测：
+    # 首 token 延迟（秒）、生成速度（token/秒）、抖动分布（none/uniform/normal/lognormal/exponential）及尺度、
+    # 错误率、随机种子、输出 token 数（0 表示按原文）、固定输出的 markdown 文件（为空时使用内置报告）
+    fake_llm_ttft: float = 0.5
+    fake_llm_tokens_per_second: float = 50.0
+    fake_llm_jitter: str = "none"
+    fake_llm_jitter_scale: float = 0.2
+    fake_llm_error_rate: float = 0.0
+    fake_llm_seed: Optional[int] = None
+    fake_llm_output_tokens: int = 0
+    fake_llm_output_file: str = ""
+
+    # LLM 调用录制回放：模式（空为关闭、record 录制、replay 回放）、录制文件、回放速度倍数（0 为不等待）、
+    # 回放未命中时的处理（error 报错、any 轮流返回该模型的任意录制）
+    llm_cassette_mode: str = ""
+    llm_cassette_path: str = "llm_cassette.jsonl"
+    llm_cassette_speed: float = 1.0
+    llm_cassette_miss: str = "error"
+
+    # LLM 调用限流（按 provider:model，0 表示不限制）：最大并发调用数、每分钟请求数、每分钟 token 数；
+    # llm_limits 按 provider:model 覆盖默认值，如 {"dashscope:qwen-plus": {"max_in_flight": 8, "rpm": 600, "tpm": 1000000}}；
+    # 预扣 TPM 时为输出预留的 token 数（调用结束后按实际用量修正）
+    llm_max_in_flight: int = 0
+    llm_rpm: int = 0
+    llm_tpm: int = 0
+    llm_limits: Dict[str, Dict[str, int]] = {}
+    llm_output_token_reserve: int = 1000
+
+    # 专家节点对冲请求：主模型超过对冲延迟仍未返回首 token 时，向备用模型（<provider>:<model>，为空时不启用）
+    # 发送同样的请求，先返回者胜出；对冲延迟（秒，0 表示按主模型最近延迟的分位数自适应）、
+    # 样本不足时的初始延迟（秒）、分位数、样本窗口和最少样本数
+    llm_hedge_fast_llm: str = ""
+    llm_hedge_vision_llm: str = ""
+    llm_hedge_delay: float = 0.0
+    llm_hedge_initial_delay: float = 5.0
+    llm_hedge_quantile: float = 0.9
+    llm_hedge_window: int = 200
+    llm_hedge_min_samples: int = 20
+
+    # 编译后 FateGraph 缓存的最大数量（按专家组合）
+    graph_cache_size: int = 32
+
+    # 专家分析缓存（按四柱复用八字类专家报告），默认关闭
+    analysis_cache_enabled: bool = False
+    analysis_cache_ttl: int = 7 * 24 * 3600
+    analysis_cache_size: int = 1024
+    # SQLite 磁盘层路径，为空时只使用内存层
+    analysis_cache_sqlite_path: str = ""
+    # SQLite 磁盘层的最大行数，超出时淘汰最久未访问的条目
+    analysis_cache_sqlite_max_rows: int = 100_000
+
+    # 上传图片预处理：按 EXIF 旋正、缩小到最长边、重新编码（jpeg 或 webp）
+    image_preprocess_enabled: bool = True
+    image_max_edge: int = 1568
+    image_format: str = "jpeg"
+    image_quality: int = 85
+
+    # 图片对象存储：内存层预算（MB），超出后写入磁盘目录（为空时使用系统临时目录），磁盘对象的保留时间（秒）
+    blob_store_memory_mb: int = 64
+    blob_store_dir: str = ""
+    blob_store_ttl: int = 24 * 3600
+
+    # FateGraph 检查点存储：none（不保存）、memory（内存，限制线程数和 TTL）、sqlite（磁盘）
+    checkpointer: str = "memory"
+    checkpointer_max_threads: int = 256
+    checkpointer_ttl: int = 3600
+    checkpointer_sqlite_path: str = "checkpoints.db"
+    # 检查点序列化结果超过该字节数时使用 zstd 压缩，0 表示不压缩
+    checkpointer_compress_threshold: int = 64 * 1024
+
+    # 专家配置存储：json（cfg/experts.json）、sqlite（按行更新，保存 prompt 版本历史）
+    expert_backend: str = "json"
+    expert_sqlite_path: str = "experts.db"
+    # 检查存储变化标记（其他进程写入、手动编辑文件）的最小间隔（秒），检查在线程池中进行
+    expert_reload_interval: float = 2.0
+
+    # Parlant 服务地址；与后端在同一台机器时可配置 Unix 域套接字路径，连接走套接字
+    parlant_url: str = "http://localhost:8800"
+    parlant_uds: str = ""
+    # Parlant 共享 HTTP 客户端连接池
+    parlant_max_connections: int = 100
+    parlant_max_keepalive: int = 20
+    parlant_keepalive_expiry: float = 30.0
+    # Parlant 请求超时（秒）：建立连接、探活类请求、写入类请求、长轮询在 wait_for_data 之外的余量
+    parlant_connect_timeout: float = 5.0
+    parlant_probe_timeout: float = 5.0
+    parlant_write_timeout: float = 30.0
+    parlant_poll_grace: float = 10.0
+
+    # 聊天事件推送（SSE）：每个会话缓冲的事件数、上游长轮询等待时间（秒）、
+    # 心跳间隔（秒）、最后一个订阅者离开后保留上游轮询的时间（秒）
+    chat_stream_buffer_size: int = 512
+    chat_stream_poll_wait: int = 30
+    chat_stream_heartbeat: float = 15.0
+    chat_stream_idle_grace: float = 10.0
+    # 发送消息并流式返回回复：等待 Agent 回复完成（ready 状态）的最长时间（秒）
+    chat_turn_timeout: float = 120.0
+    # 会话是否存在的缓存：容量、存在结果的有效期（秒）、不存在（404）结果的有效期（秒）
+    chat_session_cache_size: int = 10000
+    chat_session_cache_ttl: float = 300.0
+    chat_session_negative_ttl: float = 10.0
+    # Agent ID 后台刷新：已获取时的刷新间隔（秒）、未获取到时的重试间隔（秒）
+    chat_agent_refresh_interval: float = 300.0
+    chat_agent_retry_interval: float = 5.0
     
     class Config:
         env_file = ".env"
@@ -1,37 +1,53 @@
-from typing import List, TypedDict, Dict, Any, Optional, Annotated
-from datetime import datetime
+import hashlib
+import json
+import time
+from typing import List, TypedDict, Dict, Any, Optional, Annotated, Tuple
 from typing import List, AsyncIterator
+from langchain_core.callbacks import adispatch_custom_event
 from langchain_core.runnables import RunnableConfig
 from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
-from langgraph.checkpoint.memory import MemorySaver
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph.state import CompiledStateGraph
 
+from infrastructure.analysis_cache import analysis_cache
+from infrastructure.blob_store import blob_store, is_blob_ref
+from infrastructure.checkpointer import checkpoint_manager
 from infrastructure.service_manager import service_manager
-from utils.custom_serializer import CustomSerializer
+from llm_provider.hedge import HEDGE_WINNER_KEY
 from utils.unified_logger import get_logger
-from tools.bazi_tools import tian_gan_di_zhi
+from tools.bazi_tools import parse_birth_datetime, tian_gan_di_zhi
 
+SYNTHESIS_EXPERT_NAME = "命理师综合分析"
+SYNTHESIS_TITLE = "# 综合命理分析报告\n\n"
 
-def merge_dicts(left: Dict[str, Any], right: Dict[str, Any]) -> Dict[str, Any]:
-    """合并两个字典，用于并行节点更新 expert_reports"""
-    logger = get_logger(__name__)
-    logger.info(f"合并字典: left={list(left.keys())}, right={list(right.keys())}")
-    result = left.copy()
-    result.update(right)
-    logger.info(f"合并后: {list(result.keys())}")
-    return result
 
+def graph_signature(experts: List[Dict[str, Any]]) -> str:
+    """根据专家ID（排序后）和每个专家的配置（prompt、required_fields）生成图的签名"""
+    parts = []
+    for expert in sorted(experts, key=lambda e: e.get("id") or ""):
+        config = json.dumps(
+            {"prompt": expert.get("prompt"), "required_fields": expert.get("required_fields")},
+            ensure_ascii=False,
+            sort_keys=True,
+        )
+        config_hash = hashlib.sha256(config.encode("utf-8")).hexdigest()[:16]
+        parts.append(f"{expert.get('id')}:{config_hash}")
+    return "|".join(parts)
 
-def merge_lists(left: List[Dict[str, Any]], right: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    """合并两个列表，用于并行节点更新 streaming_chunks"""
-    return left + right
+
+def merge_dicts(left: Dict[str, Any], right: Dict[str, Any]) -> Dict[str, Any]:
+    """合并两个字典，用于并行节点更新 expert_reports（只复制引用，不复制报告内容）"""
+    return {**left, **right}
 
 
 class FateGraphState(TypedDict):
+    """
+    图状态：每份报告只保存一次
+    expert_reports 为各专家报告，final_report 为汇聚节点生成的综合报告（只有一个专家时为空）
+    """
     user_data: Dict[str, Any]
-    streaming_chunks: Annotated[List[Dict[str, Any]], merge_lists]
-    expert_reports: Annotated[Dict[str, Any], merge_dicts]
+    expert_reports: Annotated[Dict[str, str], merge_dicts]
+    final_report: str
 
 
 class FateGraph():
@@ -42,9 +58,22 @@ class FateGraph():
         llms = service_manager.get_llms()
         self.fast_llm = llms.get('fast_llm')
         self.vision_llm = llms.get('vision_llm')
+        # 专家节点使用对冲模型（配置了备用模型时），综合分析仍只使用主模型
+        self.expert_fast_llm = llms.get('fast_llm_hedged') or self.fast_llm
+        self.expert_vision_llm = llms.get('vision_llm_hedged') or self.vision_llm
         self.store = service_manager.store
-        self.checkpointer = MemorySaver(serde=CustomSerializer())
+        # 所有图共用按配置创建的检查点存储，none 模式下为 None
+        self.checkpointer = checkpoint_manager.get_checkpointer()
         self.analysis_experts = analysis_experts
+        self.signature = graph_signature(analysis_experts or [])
+        # expert_reports 以专家名称为键；名称唯一时用于给报告数据块补上专家 ID
+        names = [expert.get("name") for expert in analysis_experts or []]
+        self.expert_ids_by_name = {
+            expert.get("name"): expert.get("id")
+            for expert in analysis_experts or []
+            if names.count(expert.get("name")) == 1
+        }
+        self.expert_node_ids = {expert.get("id") for expert in analysis_experts or []}
         self.graph = self._build_graph()
 
         self.logger.info("FateGraph 实例创建完成")
@@ -78,8 +107,8 @@ class FateGraph():
     def _create_expert_node_factory(self, expert_config: Dict[str, Any]):
         """创建专家节点工厂函数，绑定专家配置"""
 
-        async def expert_node(state: FateGraphState) -> FateGraphState:
-            return await self._create_expert_node(state, expert_config)
+        async def expert_node(state: FateGraphState, config: RunnableConfig) -> FateGraphState:
+            return await self._create_expert_node(state, expert_config, config)
 
         return expert_node
 
@@ -96,7 +125,41 @@ class FateGraph():
         return ''.join(text_parts) if text_parts else ""
 
 
-    async def _create_expert_node(self, state: FateGraphState, expert_config: Dict[str, Any]) -> FateGraphState:
+    def _chunk_text(self, content: Any) -> str:
+        """提取流式块中的文本，视觉模型返回的是数组格式"""
+        if isinstance(content, str):
+            return content
+        if isinstance(content, list):
+            return self._parse_text_content(content)
+        return str(content) if content else ""
+
+
+    async def _stream_llm(self, llm, messages: List[Any], expert_name: str, config: RunnableConfig) -> Tuple[str, Optional[str]]:
+        """逐token调用模型，每个增量通过自定义事件 expert_delta 发送，返回完整内容和对冲胜出的模型（未对冲时为 None）"""
+        parts = []
+        seq = 0
+        winner = None
+        async for chunk in llm.astream(messages, config=config):
+            winner = getattr(chunk, 'response_metadata', {}).get(HEDGE_WINNER_KEY) or winner
+            delta = self._chunk_text(chunk.content if hasattr(chunk, 'content') else chunk)
+            if not delta:
+                continue
+            parts.append(delta)
+            await self._dispatch_delta("expert_delta", expert_name, delta, seq, config)
+            seq += 1
+        return ''.join(parts), winner
+
+
+    async def _dispatch_delta(self, event_name: str, expert_name: str, delta: str, seq: int, config: RunnableConfig) -> None:
+        """发送增量自定义事件，由 process_streaming_events 转发给客户端"""
+        await adispatch_custom_event(
+            event_name,
+            {"expert_name": expert_name, "delta": delta, "seq": seq},
+            config=config,
+        )
+
+
+    async def _create_expert_node(self, state: FateGraphState, expert_config: Dict[str, Any], config: RunnableConfig) -> FateGraphState:
         """专家节点函数，执行专家分析"""
 
         required_fields = expert_config.get("required_fields", [])
@@ -107,6 +170,9 @@ class FateGraph():
         expert_messages.append(SystemMessage(content=expert_config.get("prompt")))
 
         expert_user_data = state.get("user_data").get(expert_id)
+        # 所有字段都是 datetime 时，报告只取决于四柱，可使用分析缓存
+        pillars = []
+        cacheable = analysis_cache.enabled
         for field in required_fields:
             if not isinstance(field, dict):
                 continue
@@ -118,13 +184,23 @@ class FateGraph():
 
             if field_type == "datetime":
                 expert_messages.append(HumanMessage(content=self.caculate_bazi(field_name, field_value)))
-            elif field_type == "image":
+                if cacheable:
+                    pillars.append("".join(self._bazi_pillars(field_name, field_value)[1]))
+                continue
+            cacheable = False
+            if field_type == "image":
                 expert_messages.append(HumanMessage(content=field_name))
+                # 状态中只有 FortuneService 存入对象存储时得到的引用，构建消息时才读取图片
+                if not is_blob_ref(field_value):
+                    raise ValueError(f"图片字段 {field_id} 不是对象存储引用")
+                image_url = await blob_store.aget_data_url(field_value)
+                if image_url is None:
+                    raise ValueError(f"图片已过期或不存在: {field_value}")
                 image_message = HumanMessage(
                     content=[
                         {
                             "type": "image",
-                            "image": f"data:image/jpeg;base64,{field_value}"
+                            "image": image_url
                         }
                     ]
                 )
@@ -136,26 +212,85 @@ class FateGraph():
             for field in required_fields
             if isinstance(field, dict)
         )
-        llm = self.vision_llm if needs_vision else self.fast_llm
-        response = await llm.ainvoke(expert_messages)
-        content = response.content if hasattr(response, 'content') else str(response)
-        if needs_vision:
-            content = self._parse_text_content(content)
+        llm = self.expert_vision_llm if needs_vision else self.expert_fast_llm
+        stream_tokens = config.get("configurable", {}).get("stream_tokens")
+
+        cache_key = None
+        if cacheable and pillars:
+            cache_key = analysis_cache.make_key(expert_id, expert_config.get("prompt"), "/".join(pillars), self.config.fast_llm)
+            cached_report = await analysis_cache.get(cache_key)
+            if cached_report is not None:
+                self.logger.info(f"专家 {expert_name} 命中分析缓存: {pillars}")
+                if stream_tokens:
+                    await self._dispatch_delta("expert_delta", expert_name, cached_report, 0, config)
+                return self._process_result(expert_name, cached_report, state)
+
+        started_at = time.perf_counter()
+        if stream_tokens:
+            content, winner = await self._stream_llm(llm, expert_messages, expert_name, config)
+        else:
+            response = await llm.ainvoke(expert_messages)
+            winner = getattr(response, 'response_metadata', {}).get(HEDGE_WINNER_KEY)
+            content = response.content if hasattr(response, 'content') else str(response)
+            # 视觉模型返回数组格式，也可能直接返回字符串
+            content = self._chunk_text(content)
+        if cache_key is not None:
+            if winner and winner != self.config.fast_llm:
+                # 对冲时由备用模型生成的报告按备用模型缓存，不冒充主模型的结果
+                cache_key = analysis_cache.make_key(expert_id, expert_config.get("prompt"), "/".join(pillars), winner)
+            await analysis_cache.set(cache_key, content, time.perf_counter() - started_at)
 
         return self._process_result(expert_name, content, state)
 
 
-    async def _collect_node(self, state: FateGraphState) -> FateGraphState:
+    async def _run_synthesis(self, messages: List[Any], on_delta=None) -> str:
+        """调用模型生成综合报告，提供 on_delta 时逐token回调"""
+        if on_delta is None:
+            synthesis_response = await self.fast_llm.ainvoke(messages)
+            return synthesis_response.content
+        parts = []
+        async for chunk in self.fast_llm.astream(messages):
+            delta = self._chunk_text(chunk.content)
+            if delta:
+                parts.append(delta)
+                await on_delta(delta)
+        return ''.join(parts)
+
+
+    async def _collect_node(self, state: FateGraphState, config: RunnableConfig) -> FateGraphState:
         """汇聚节点，收集所有专家的分析结果并生成最终报告"""
         expert_reports = state.get("expert_reports", {})
         self.logger.info(f"收集节点收到 {len(expert_reports)} 个专家报告: {list(expert_reports.keys())}")
+        configurable = config.get("configurable", {})
+        stream_tokens = configurable.get("stream_tokens", False)
+
+        messages = self._build_synthesis_messages(expert_reports)
+        if messages is None:
+            # 只有一个专家时不做综合分析，SSE 直接复用该专家的报告
+            return {"final_report": ""}
+        seq = 0
+
+        async def on_delta(delta: str) -> None:
+            nonlocal seq
+            await self._dispatch_delta("synthesis_delta", SYNTHESIS_EXPERT_NAME, delta, seq, config)
+            seq += 1
+
+        if stream_tokens:
+            await on_delta(SYNTHESIS_TITLE)
+        content = await self._run_synthesis(messages, on_delta if stream_tokens else None)
+        final_report = f"{SYNTHESIS_TITLE}{content}"
+        self.logger.info(f"综合报告生成完成，长度={len(final_report)}")
+        return {"final_report": final_report}
+
+
+    def _build_synthesis_messages(self, expert_reports: Dict[str, Any]) -> Optional[List[Any]]:
+        """构建综合分析的消息，只有一个专家或没有有效报告时返回 None"""
         summary_parts = []
 
         for expert_name, content in expert_reports.items():
             if content and content.strip():
                 summary_parts.append(f"# {expert_name}分析\n\n{content}\n\n")
 
-        final_report = list(expert_reports.values())[0]
         if len(expert_reports) > 1 and self.fast_llm and summary_parts:
             synthesis_prompt = SystemMessage(content="""你是一个命理分析师，擅长综合多个专家的分析结果，生成一份完整、专业的综合命理分析报告。
 
@@ -175,30 +310,33 @@ class FateGraph():
 - 综合建议""")
             summary_text = "\n".join(summary_parts)
             user_message = HumanMessage(content=f"以下是各专家的分析结果：\n\n{summary_text}\n\n请生成综合命理分析报告。")
-            synthesis_response = await self.fast_llm.ainvoke([synthesis_prompt, user_message])
-            final_report = f"# 综合命理分析报告\n\n{synthesis_response.content}"
+            return [synthesis_prompt, user_message]
+        return None
 
-        return self._process_result("命理师综合分析", final_report, state)
 
+    def _bazi_pillars(self, field_name, field_value) -> tuple:
+        """
+        解析日期时间并计算四柱，返回 (公历时间, (年柱, 月柱, 日柱, 时柱))
+        字段名标明阴历/农历时先转换为公历
+        """
+        parsed_datetime = parse_birth_datetime(field_name, field_value)
+        return parsed_datetime, tian_gan_di_zhi(
+            parsed_datetime.year, parsed_datetime.month, parsed_datetime.day,
+            parsed_datetime.hour, parsed_datetime.minute
+        )
 
-    def caculate_bazi(self, field_name, field_value) -> str:
 
-        date_str = str(field_value).strip()
-        date_formats = "%Y-%m-%d %H:%M"
-        parsed_datetime = datetime.strptime(date_str, date_formats)
+    def caculate_bazi(self, field_name, field_value) -> str:
 
         bazi_info = ""
-        if parsed_datetime:
-            year = parsed_datetime.year
-            month = parsed_datetime.month
-            day = parsed_datetime.day
-            hour = parsed_datetime.hour
-
+        solar_datetime, pillars = self._bazi_pillars(field_name, field_value)
+        if pillars:
             # 计算八字
-            year_zhu, month_zhu, day_zhu, hour_zhu = tian_gan_di_zhi(year, month, day, hour)
+            year_zhu, month_zhu, day_zhu, hour_zhu = pillars
 
             # 格式化八字信息
             bazi_info = f"{field_name}：{field_value}\n"
+            bazi_info += f"公历：{solar_datetime.strftime('%Y-%m-%d %H:%M')}\n"
             bazi_info += f"八字：{year_zhu} {month_zhu} {day_zhu} {hour_zhu}"
             bazi_info += f"\n年柱：{year_zhu}，月柱：{month_zhu}，日柱：{day_zhu}，时柱：{hour_zhu}"
         return bazi_info
@@ -207,145 +345,158 @@ class FateGraph():
     def _process_result(self, expert_name, export_report, state):
         """处理执行结果，返回该节点要添加的部分状态"""
         self.logger.info(f"处理结果: 专家={expert_name}, 报告长度={len(export_report) if export_report else 0}")
-        # 创建要添加的流式块
-        chunk = {
-            "expert_name": expert_name,
-            "expert_report": export_report
-        }
+        return {"expert_reports": {expert_name: export_report}}
+
+
+    def _thread_id(self, task_id: str, user_data: Dict[str, Dict[str, Any]]) -> str:
+        """
+        检查点线程 ID：task_id 加上图签名与输入的摘要
+        所有图共用一个检查点存储，task_id 由客户端提供；专家组合或输入不同的请求即使 task_id 相同，也不会读到彼此的检查点
+        """
+        payload = json.dumps([self.signature, user_data], ensure_ascii=False, sort_keys=True, default=str)
+        return f"{task_id}:{hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]}"
 
-        result = {
-            "expert_reports": {expert_name: export_report},
-            "streaming_chunks": [chunk]
-        }
-        self.logger.info(f"返回部分状态: expert_reports keys={list(result['expert_reports'].keys())}")
-        return result
 
+    async def _load_partial_run(self, config: RunnableConfig, user_data: Dict[str, Dict[str, Any]]) -> Optional[Dict[str, str]]:
+        """
+        读取检查点线程的检查点，判断能否续跑
 
-    async def chat_with_planning_stream(self, task_id: str, user_data: Dict[str, Dict[str, Any]]) -> AsyncIterator[Dict[str, Any]]:
-        """流式聊天接口 """
+        存在未完成的检查点且输入一致时，返回已完成的专家报告：包括已提交到状态的报告，
+        以及当前超步中已完成节点保存在 pending_writes 中的报告；
+        否则删除检查点（已完成、输入不一致或无法解码）并返回 None
+        """
+        if self.checkpointer is None:
+            return None
+        thread_id = config["configurable"]["thread_id"]
+        try:
+            checkpoint_tuple = await self.checkpointer.aget_tuple(config)
+            if checkpoint_tuple is None:
+                return None
+            snapshot = await self.graph.aget_state(config)
+        except ValueError as e:
+            # 旧版本（pickle）写入的检查点无法解码，丢弃后重新执行
+            self.logger.warning(f"检查点线程 {thread_id} 无法解码，丢弃检查点重新执行: {e}")
+            await self.checkpointer.adelete_thread(thread_id)
+            return None
+        if not snapshot.next:
+            # 已完成的运行按新任务重新执行；先删除检查点，否则旧的专家报告会经 merge_dicts 合并进新的运行
+            self.logger.info(f"检查点线程 {thread_id} 已完成，丢弃检查点重新执行")
+            await self.checkpointer.adelete_thread(thread_id)
+            return None
+        if snapshot.values.get("user_data") != user_data:
+            self.logger.info(f"检查点线程 {thread_id} 的输入与检查点不一致，丢弃检查点重新执行")
+            await self.checkpointer.adelete_thread(thread_id)
+            return None
+
+        reports = dict(snapshot.values.get("expert_reports") or {})
+        for _, channel, value in checkpoint_tuple.pending_writes:
+            if channel == "expert_reports" and isinstance(value, dict):
+                reports.update(value)
+        self.logger.info(f"检查点线程 {thread_id} 从检查点续跑，已完成 {len(reports)} 个专家: {list(reports.keys())}，待执行节点: {snapshot.next}")
+        return reports
+
+
+    async def chat_with_planning_stream(self, task_id: str, user_data: Dict[str, Dict[str, Any]], stream_tokens: bool = False) -> AsyncIterator[Dict[str, Any]]:
+        """流式聊天接口
+
+        stream_tokens 为 True 时，专家报告按 token 以 delta 事件发送，
+        每个专家结束时再发送一个携带完整报告的 done 事件。
+        同一 task_id 以相同的专家组合和输入重新提交，且存在未完成的检查点（如进程重启或客户端断开）时续跑：
+        已完成的专家报告立即重放（replayed 为 True），只执行未完成的节点
+        """
 
         initial_state = {
             "user_data": user_data,
-            "streaming_chunks": [],
-            "expert_reports":{}
+            "expert_reports": {},
+            "final_report": ""
         }
-        config = RunnableConfig(configurable={"thread_id": task_id})
-        events = self.graph.astream_events(initial_state, config=config)
+        thread_id = self._thread_id(task_id, user_data)
+        config = RunnableConfig(configurable={"thread_id": thread_id, "stream_tokens": stream_tokens})
+        replayed = await self._load_partial_run(config, user_data)
+        if replayed is None:
+            events = self.graph.astream_events(initial_state, config=config)
+        else:
+            # 输入为 None 时从最新检查点继续，pending_writes 中已完成的节点不会重新执行
+            events = self.graph.astream_events(None, config=config)
+
+        async for chunk in self.process_streaming_events(events, stream_tokens=stream_tokens, replayed=replayed):
+            yield chunk
 
-        async for chunk in self.process_streaming_events(events):
+
+    async def process_streaming_events(self, events: AsyncIterator[Dict[str, Any]], stream_tokens: bool = False,
+                                       replayed: Optional[Dict[str, str]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """处理流式事件的公共方法，replayed 为续跑时从检查点恢复的专家报告"""
+        async for chunk in self._process_streaming_events(events, replayed):
+            if stream_tokens and "event" not in chunk:
+                # 流式模式下，完整报告作为该专家的 done 事件发送
+                chunk = {"event": "done", **chunk}
             yield chunk
 
 
-    async def process_streaming_events(self, events: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[Dict[str, Any]]:
-        """处理流式事件的公共方法"""
+    def _report_chunk(self, expert_name: str, expert_report: str, node_name: Optional[str], **extra: Any) -> Dict[str, Any]:
+        """专家报告数据块"""
+        chunk = {"expert_name": expert_name, "expert_report": expert_report, **extra}
+        expert_id = node_name if node_name in self.expert_node_ids else self.expert_ids_by_name.get(expert_name)
+        if expert_id is not None:
+            chunk["expert_id"] = expert_id
+        return chunk
+
+
+    async def _process_streaming_events(self, events: AsyncIterator[Dict[str, Any]],
+                                        replayed: Optional[Dict[str, str]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        将图事件转换为 SSE 数据块，唯一的数据来源是节点写入的 expert_reports 与 final_report：
+        专家节点结束时发送其报告，汇聚节点结束时发送综合报告（只有一个专家时为该专家的报告）。
+        专家报告的数据块带有 expert_id（专家节点名即专家 ID，其余情况按名称查找，名称重复时省略）。
+        续跑时先立即发送从检查点恢复的报告
+        """
         try:
-            # 用于跟踪已发送的专家报告，避免重复发送
-            sent_experts = set()
-            
+            # 已发送的专家报告，避免重复发送；只有一个专家时作为综合报告复用
+            sent_reports: Dict[str, str] = {}
+            final_sent = False
+
+            for expert_name, expert_report in (replayed or {}).items():
+                sent_reports[expert_name] = expert_report
+                yield self._report_chunk(expert_name, expert_report, None, replayed=True)
+
             async for event in events:
                 event_type = event.get('event', '')
                 event_name = event.get('name', 'unknown')
-                self.logger.info(f"收到event: {event_type} - {event_name}")
 
-                # 对于每个节点的 on_chain_end 事件，发送该节点的流式块（实时发送）
-                if event_type == "on_chain_end" and event_name != "LangGraph":
-                    data = event.get("data", {})
-                    chunk = data.get("chunk", {})
-                    output = data.get("output", {})
-                    
-                    # 检查 chunk 中的 streaming_chunks（单个节点的输出）
-                    if isinstance(chunk, dict) and "streaming_chunks" in chunk:
-                        streaming_chunks = chunk["streaming_chunks"]
-                        self.logger.info(f"节点 {event_name} 从chunk中找到 {len(streaming_chunks)} 个流式块")
-                        for streaming_chunk in streaming_chunks:
-                            expert_name = streaming_chunk.get("expert_name")
-                            # 只发送专家报告，综合报告稍后发送
-                            if expert_name and "综合" not in expert_name:
-                                if expert_name not in sent_experts:
-                                    sent_experts.add(expert_name)
-                                    yield {
-                                        "expert_name": expert_name,
-                                        "expert_report": streaming_chunk.get("expert_report"),
-                                    }
-                    
-                    # 检查 output 中的 streaming_chunks
-                    if isinstance(output, dict) and "streaming_chunks" in output:
-                        streaming_chunks = output["streaming_chunks"]
-                        self.logger.info(f"节点 {event_name} 从output中找到 {len(streaming_chunks)} 个流式块")
-                        for streaming_chunk in streaming_chunks:
-                            expert_name = streaming_chunk.get("expert_name")
-                            if expert_name and "综合" not in expert_name:
-                                if expert_name not in sent_experts:
-                                    sent_experts.add(expert_name)
-                                    yield {
-                                        "expert_name": expert_name,
-                                        "expert_report": streaming_chunk.get("expert_report"),
-                                    }
-                
-                # 对于整个图的 on_chain_end 事件，发送所有累积的流式块（包括综合报告）
-                elif event_type == "on_chain_end" and event_name == "LangGraph":
-                    data = event.get("data", {})
-                    output = data.get("output", {})
-                    
-                    # 在 LangGraph 的最终输出中，应该包含所有节点的流式块
-                    if isinstance(output, dict) and "streaming_chunks" in output:
-                        streaming_chunks = output["streaming_chunks"]
-                        self.logger.info(f"LangGraph最终输出中找到 {len(streaming_chunks)} 个流式块")
-                        # 先发送所有专家报告（排除综合报告）
-                        for streaming_chunk in streaming_chunks:
-                            expert_name = streaming_chunk.get("expert_name")
-                            expert_report = streaming_chunk.get("expert_report")
-                            
-                            # 如果是专家报告且未发送过，则发送
-                            if expert_name and "综合" not in expert_name and expert_name not in sent_experts:
-                                sent_experts.add(expert_name)
-                                self.logger.info(f"从最终输出中发送专家报告: {expert_name}, 长度: {len(expert_report) if expert_report else 0}")
-                                yield {
-                                    "expert_name": expert_name,
-                                    "expert_report": expert_report,
-                                }
-                        
-                        # 最后发送综合报告
-                        for streaming_chunk in streaming_chunks:
-                            expert_name = streaming_chunk.get("expert_name")
-                            expert_report = streaming_chunk.get("expert_report")
-                            
-                            # 如果是综合报告，总是发送
-                            if expert_name and "综合" in expert_name:
-                                self.logger.info(f"从最终输出中发送综合报告: {expert_name}, 长度: {len(expert_report) if expert_report else 0}")
-                                yield {
-                                    "expert_name": expert_name,
-                                    "expert_report": expert_report,
-                                }
-                    
-                    # 也检查 data 本身（作为备用）
-                    if isinstance(data, dict) and "streaming_chunks" in data:
-                        streaming_chunks = data["streaming_chunks"]
-                        self.logger.info(f"LangGraph data中找到 {len(streaming_chunks)} 个流式块")
-                        # 先发送专家报告
-                        for streaming_chunk in streaming_chunks:
-                            expert_name = streaming_chunk.get("expert_name")
-                            expert_report = streaming_chunk.get("expert_report")
-                            if expert_name and "综合" not in expert_name and expert_name not in sent_experts:
-                                sent_experts.add(expert_name)
-                                self.logger.info(f"从data中发送专家报告: {expert_name}")
-                                yield {
-                                    "expert_name": expert_name,
-                                    "expert_report": expert_report,
-                                }
-                        # 再发送综合报告
-                        for streaming_chunk in streaming_chunks:
-                            expert_name = streaming_chunk.get("expert_name")
-                            expert_report = streaming_chunk.get("expert_report")
-                            if expert_name and "综合" in expert_name:
-                                self.logger.info(f"从data中发送综合报告: {expert_name}")
-                                yield {
-                                    "expert_name": expert_name,
-                                    "expert_report": expert_report,
-                                }
+                # 专家报告的 token 增量
+                if event_type == "on_custom_event" and event_name == "expert_delta":
+                    yield {"event": "delta", **event.get("data", {})}
+                    continue
+                # 综合报告的 token 增量，单独的通道
+                if event_type == "on_custom_event" and event_name == "synthesis_delta":
+                    yield {"event": "synthesis_delta", **event.get("data", {})}
+                    continue
+
+                if event_type != "on_chain_end":
+                    continue
+                self.logger.info(f"收到event: {event_type} - {event_name}")
+                output = event.get("data", {}).get("output")
+                if not isinstance(output, dict):
+                    continue
+
+                # 专家节点的输出（以及图最终状态中未发送过的报告）
+                for expert_name, expert_report in (output.get("expert_reports") or {}).items():
+                    if expert_name not in sent_reports:
+                        sent_reports[expert_name] = expert_report
+                        yield self._report_chunk(expert_name, expert_report, event_name)
+
+                # 汇聚节点的输出，或图的最终状态
+                if not final_sent and "final_report" in output and (event_name == "collect" or event_name == "LangGraph"):
+                    final_sent = True
+                    final_report = output.get("final_report") or next(iter(sent_reports.values()), "")
+                    self.logger.info(f"发送综合报告: 长度: {len(final_report)}")
+                    yield {
+                        "expert_name": SYNTHESIS_EXPERT_NAME,
+                        "expert_report": final_report,
+                    }
         except Exception as e:
             self.logger.error(f"流式处理失败: {str(e)}")
             yield {
                 "expert_name": "error",
                 "expert_report": f" {str(e)}",
-            }
\ No newline at end of file
+            }
@@ -0,0 +1,84 @@
+"""
+FateGraph 注册表
+
+按专家组合缓存已编译的 FateGraph，避免每次请求都重新构建和编译图
+"""
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any
+
+from cfg.setting import get_settings
+from graph.fate_graph import FateGraph, graph_signature
+from utils.unified_logger import get_logger
+
+
+class FateGraphRegistry:
+    """已编译 FateGraph 的 LRU 注册表 - 单例模式"""
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not self._initialized:
+            self.logger = get_logger(__name__)
+            self._graphs: "OrderedDict[str, FateGraph]" = OrderedDict()
+            self._lock = threading.Lock()
+            self.hits = 0
+            self.misses = 0
+            self._initialized = True
+
+    @staticmethod
+    def make_key(experts: List[Dict[str, Any]]) -> str:
+        """根据专家ID（排序后）和每个专家的配置（prompt、required_fields）生成签名"""
+        return graph_signature(experts)
+
+    def get_graph(self, experts: List[Dict[str, Any]]) -> FateGraph:
+        """获取专家组合对应的 FateGraph，不存在时构建并缓存"""
+        key = self.make_key(experts)
+        with self._lock:
+            fate_graph = self._graphs.get(key)
+            if fate_graph is not None:
+                self._graphs.move_to_end(key)
+                self.hits += 1
+                return fate_graph
+
+        # 构建在锁外进行，避免阻塞其他专家组合的查询
+        fate_graph = FateGraph(analysis_experts=experts)
+        max_size = max(get_settings().graph_cache_size, 1)
+        with self._lock:
+            self.misses += 1
+            existing = self._graphs.get(key)
+            if existing is not None:
+                self._graphs.move_to_end(key)
+                return existing
+            self._graphs[key] = fate_graph
+            while len(self._graphs) > max_size:
+                evicted_key, _ = self._graphs.popitem(last=False)
+                self.logger.info(f"FateGraph 缓存已满，淘汰: {evicted_key}")
+        self.logger.info(f"FateGraph 已缓存: {key}，当前缓存数量: {len(self._graphs)}")
+        return fate_graph
+
+    def invalidate(self) -> None:
+        """清空所有缓存的图（专家配置变更时调用）"""
+        with self._lock:
+            count = len(self._graphs)
+            self._graphs.clear()
+        if count:
+            self.logger.info(f"专家配置已变更，清空 {count} 个缓存的 FateGraph")
+
+    def stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        return {
+            "size": len(self._graphs),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+# 全局 FateGraph 注册表实例
+fate_graph_registry = FateGraphRegistry()
@@ -0,0 +1,175 @@
+"""
+专家分析结果缓存
+
+八字类专家的输入只取决于四柱，相同的 (专家, prompt, 四柱, 模型) 可以复用报告。
+内存层为带 TTL 的 LRU，可选 SQLite 磁盘层（同样按 TTL 过期，超出行数上限时淘汰最久未访问的条目），默认关闭。
+条目从磁盘层提升到内存层时只保留剩余的 TTL，不会因此延长有效期
+"""
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from cfg.setting import get_settings
+from utils.ttl_cache import TTLCache
+from utils.unified_logger import get_logger
+
+
+class AnalysisCache:
+    """专家分析结果缓存 - 单例模式"""
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not self._initialized:
+            self.logger = get_logger(__name__)
+            self._memory: Optional[TTLCache] = None
+            self._conn: Optional[sqlite3.Connection] = None
+            self._db_lock = threading.Lock()
+            self._writes = 0
+            self.hits = 0
+            self.memory_hits = 0
+            self.sqlite_hits = 0
+            self.misses = 0
+            self.saved_seconds = 0.0
+            self._initialized = True
+
+    @property
+    def enabled(self) -> bool:
+        return get_settings().analysis_cache_enabled
+
+    @staticmethod
+    def make_key(expert_id: str, prompt: str, pillars: str, model: str) -> str:
+        """缓存键：专家ID、prompt 哈希、规范化后的四柱、模型名"""
+        prompt_hash = hashlib.sha256((prompt or "").encode("utf-8")).hexdigest()[:16]
+        return f"{expert_id}|{prompt_hash}|{pillars}|{model}"
+
+    def _get_memory(self) -> TTLCache:
+        if self._memory is None:
+            settings = get_settings()
+            self._memory = TTLCache(settings.analysis_cache_size, settings.analysis_cache_ttl)
+        return self._memory
+
+    def _get_conn(self) -> Optional[sqlite3.Connection]:
+        """打开 SQLite 磁盘层（未配置路径时返回 None）"""
+        path = get_settings().analysis_cache_sqlite_path
+        if not path:
+            return None
+        if self._conn is None:
+            conn = sqlite3.connect(path, check_same_thread=False)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS analysis_cache ("
+                "key TEXT PRIMARY KEY, report TEXT NOT NULL, elapsed REAL NOT NULL, created_at REAL NOT NULL, "
+                "accessed_at REAL NOT NULL DEFAULT 0)"
+            )
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(analysis_cache)")}
+            if "accessed_at" not in columns:
+                # 旧版本创建的表没有访问时间，按写入时间补齐
+                conn.execute("ALTER TABLE analysis_cache ADD COLUMN accessed_at REAL NOT NULL DEFAULT 0")
+                conn.execute("UPDATE analysis_cache SET accessed_at = created_at")
+            conn.execute("CREATE INDEX IF NOT EXISTS analysis_cache_accessed_at ON analysis_cache (accessed_at)")
+            conn.commit()
+            self._conn = conn
+            self._prune()
+            self.logger.info(f"分析缓存 SQLite 层已启用: {path}")
+        return self._conn
+
+    def _prune(self) -> None:
+        """删除磁盘层中已过期的条目"""
+        expired_before = time.time() - get_settings().analysis_cache_ttl
+        self._conn.execute("DELETE FROM analysis_cache WHERE created_at < ?", (expired_before,))
+        self._conn.commit()
+
+    def _evict(self) -> None:
+        """行数超过上限时删除最久未访问的条目"""
+        self._conn.execute(
+            "DELETE FROM analysis_cache WHERE key IN ("
+            "SELECT key FROM analysis_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (max(get_settings().analysis_cache_sqlite_max_rows, 1),),
+        )
+
+    def _sqlite_get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._db_lock:
+            conn = self._get_conn()
+            if conn is None:
+                return None
+            now = time.time()
+            row = conn.execute(
+                "SELECT report, elapsed, created_at FROM analysis_cache WHERE key = ? AND created_at >= ?",
+                (key, now - get_settings().analysis_cache_ttl),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE analysis_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            conn.commit()
+        return {"report": row[0], "elapsed": row[1], "created_at": row[2]}
+
+    def _sqlite_set(self, key: str, entry: Dict[str, Any]) -> None:
+        with self._db_lock:
+            conn = self._get_conn()
+            if conn is None:
+                return
+            now = time.time()
+            conn.execute(
+                "INSERT OR REPLACE INTO analysis_cache (key, report, elapsed, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, entry["report"], entry["elapsed"], now, now),
+            )
+            self._evict()
+            conn.commit()
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self._prune()
+
+    async def get(self, key: str) -> Optional[str]:
+        """读取缓存的报告，先查内存层，再查磁盘层"""
+        memory = self._get_memory()
+        entry = memory.get(key)
+        if entry is not None:
+            self.memory_hits += 1
+        else:
+            entry = await asyncio.to_thread(self._sqlite_get, key)
+            if entry is not None:
+                self.sqlite_hits += 1
+                # 按写入磁盘层的时间计算剩余 TTL，提升到内存层不延长有效期
+                remaining = get_settings().analysis_cache_ttl - (time.time() - entry["created_at"])
+                if remaining > 0:
+                    memory.set(key, entry, ttl=remaining)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.saved_seconds += entry["elapsed"]
+        return entry["report"]
+
+    async def set(self, key: str, report: str, elapsed: float) -> None:
+        """写入报告及生成耗时（用于统计节省的时间）"""
+        if not report:
+            return
+        entry = {"report": report, "elapsed": elapsed}
+        self._get_memory().set(key, entry)
+        await asyncio.to_thread(self._sqlite_set, key, entry)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取命中统计：命中次数即节省的 LLM 调用次数"""
+        return {
+            "enabled": self.enabled,
+            "size": len(self._memory) if self._memory is not None else 0,
+            "hits": self.hits,
+            "memory_hits": self.memory_hits,
+            "sqlite_hits": self.sqlite_hits,
+            "misses": self.misses,
+            "saved_llm_calls": self.hits,
+            "saved_seconds": round(self.saved_seconds, 3),
+        }
+
+
+# 全局分析缓存实例
+analysis_cache = AnalysisCache()
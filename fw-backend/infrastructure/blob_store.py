@@ -0,0 +1,164 @@
+"""
+内容寻址的二进制对象存储
+
+上传的图片按 SHA-256 存放在这里，图状态中只保存形如 blob:sha256:<hex> 的引用，
+构建视觉消息时才读取字节。内存层按总字节数做 LRU，超出预算的对象写入磁盘目录，
+磁盘上的对象超过 TTL 后删除
+"""
+import asyncio
+import base64
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from cfg.setting import get_settings
+from utils.unified_logger import get_logger
+
+BLOB_REF_PREFIX = "blob:sha256:"
+_DIGEST_PATTERN = re.compile(r"[0-9a-f]{64}")
+
+
+def _parse_digest(ref: Any) -> Optional[str]:
+    """从引用中取出摘要，不是 64 位小写十六进制摘要时返回 None（摘要会作为磁盘文件名使用）"""
+    if not isinstance(ref, str) or not ref.startswith(BLOB_REF_PREFIX):
+        return None
+    digest = ref[len(BLOB_REF_PREFIX):]
+    return digest if _DIGEST_PATTERN.fullmatch(digest) else None
+
+
+def is_blob_ref(value: Any) -> bool:
+    """判断字段值是否为合法的对象存储引用"""
+    return _parse_digest(value) is not None
+
+
+class BlobStore:
+    """内容寻址对象存储 - 单例模式"""
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not self._initialized:
+            self.logger = get_logger(__name__)
+            self._memory: "OrderedDict[str, Tuple[str, bytes]]" = OrderedDict()
+            self._memory_bytes = 0
+            self._lock = threading.Lock()
+            self._dir: Optional[Path] = None
+            self._spills = 0
+            self.puts = 0
+            self.dedup_hits = 0
+            self.memory_hits = 0
+            self.disk_hits = 0
+            self.misses = 0
+            self._initialized = True
+
+    def _get_dir(self) -> Path:
+        """磁盘层目录，首次使用时创建并清理过期对象"""
+        if self._dir is None:
+            path = get_settings().blob_store_dir or os.path.join(tempfile.gettempdir(), "fatewhisper_blobs")
+            self._dir = Path(path)
+            self._dir.mkdir(parents=True, exist_ok=True)
+            self._prune()
+            self.logger.info(f"对象存储磁盘层目录: {self._dir}")
+        return self._dir
+
+    def _prune(self) -> None:
+        """删除磁盘层中超过 TTL 的对象"""
+        expired_before = time.time() - get_settings().blob_store_ttl
+        for path in self._dir.iterdir():
+            try:
+                if path.stat().st_mtime < expired_before:
+                    path.unlink()
+            except OSError:
+                continue
+
+    def _spill(self, digest: str, mime_type: str, data: bytes) -> None:
+        """将对象写入磁盘层：第一行为 MIME 类型，其后为原始字节"""
+        path = self._get_dir() / digest
+        if not path.exists():
+            tmp_path = path.with_suffix(".tmp")
+            tmp_path.write_bytes(mime_type.encode("utf-8") + b"\n" + data)
+            os.replace(tmp_path, path)
+        self._spills += 1
+        if self._spills % 100 == 0:
+            self._prune()
+
+    def put(self, data: bytes, mime_type: str) -> str:
+        """
+        存入对象，返回引用；相同内容只保存一份
+        内存层超出预算时，最久未使用的对象转存到磁盘
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        budget = get_settings().blob_store_memory_mb * 1024 * 1024
+        spilled = []
+        with self._lock:
+            self.puts += 1
+            if digest in self._memory:
+                self.dedup_hits += 1
+                self._memory.move_to_end(digest)
+            else:
+                self._memory[digest] = (mime_type, data)
+                self._memory_bytes += len(data)
+                while self._memory_bytes > budget and len(self._memory) > 1:
+                    old_digest, (old_mime, old_data) = self._memory.popitem(last=False)
+                    self._memory_bytes -= len(old_data)
+                    spilled.append((old_digest, old_mime, old_data))
+        for item in spilled:
+            self._spill(*item)
+        return BLOB_REF_PREFIX + digest
+
+    def get(self, ref: str) -> Optional[Tuple[bytes, str]]:
+        """按引用读取对象，返回 (字节, MIME 类型)，不存在时返回 None；引用格式不合法时抛出 ValueError"""
+        digest = _parse_digest(ref)
+        if digest is None:
+            raise ValueError(f"非法的对象存储引用: {ref!r}")
+        with self._lock:
+            item = self._memory.get(digest)
+            if item is not None:
+                self._memory.move_to_end(digest)
+                self.memory_hits += 1
+                return item[1], item[0]
+        try:
+            raw = (self._get_dir() / digest).read_bytes()
+        except OSError:
+            self.misses += 1
+            return None
+        self.disk_hits += 1
+        mime_type, _, data = raw.partition(b"\n")
+        return data, mime_type.decode("utf-8")
+
+    async def aget_data_url(self, ref: str) -> Optional[str]:
+        """按引用读取对象并编码为 data URL（磁盘读取在线程池中执行）"""
+        item = await asyncio.to_thread(self.get, ref)
+        if item is None:
+            return None
+        data, mime_type = item
+        return f"data:{mime_type};base64,{base64.b64encode(data).decode('utf-8')}"
+
+    def stats(self) -> Dict[str, Any]:
+        """获取存储统计"""
+        return {
+            "memory_objects": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+            "puts": self.puts,
+            "dedup_hits": self.dedup_hits,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "spills": self._spills,
+        }
+
+
+# 全局对象存储实例
+blob_store = BlobStore()
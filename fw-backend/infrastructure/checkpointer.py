@@ -0,0 +1,414 @@
+"""
+FateGraph 检查点存储
+
+通过配置 checkpointer 选择模式：
+- none: 不保存检查点，省去每个超步的序列化开销
+- memory: 内存存储，限制线程（task_id）数量，超过 TTL 的线程被淘汰
+- sqlite: SQLite 磁盘存储（WAL 模式），进程重启后仍可读取，超过 TTL 的线程被清理
+
+所有图共用同一个检查点存储实例，并统计检查点写入次数、字节数和耗时
+"""
+import asyncio
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, Iterator, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.checkpoint.serde.base import SerializerProtocol
+
+from cfg.setting import get_settings
+from utils.custom_serializer import CustomSerializer
+from utils.unified_logger import get_logger
+
+CHECKPOINTER_MODES = ("none", "memory", "sqlite")
+
+
+class CheckpointStats:
+    """检查点写入统计：写入次数、序列化字节数、写入耗时"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.writes = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.evicted_threads = 0
+
+    def add_bytes(self, size: int) -> None:
+        with self._lock:
+            self.bytes += size
+
+    def record_write(self, seconds: float) -> None:
+        with self._lock:
+            self.writes += 1
+            self.seconds += seconds
+            self.max_seconds = max(self.max_seconds, seconds)
+
+    def add_evicted(self, count: int) -> None:
+        with self._lock:
+            self.evicted_threads += count
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "writes": self.writes,
+            "bytes": self.bytes,
+            "total_ms": round(self.seconds * 1000, 3),
+            "avg_ms": round(self.seconds * 1000 / self.writes, 3) if self.writes else 0.0,
+            "max_ms": round(self.max_seconds * 1000, 3),
+            "evicted_threads": self.evicted_threads,
+        }
+
+
+class _CountingSerializer(SerializerProtocol):
+    """包装序列化器，统计写入检查点的字节数"""
+
+    def __init__(self, serde: SerializerProtocol, stats: CheckpointStats):
+        self.serde = serde
+        self.stats = stats
+
+    def dumps_typed(self, obj: Any) -> Tuple[str, bytes]:
+        type_str, data = self.serde.dumps_typed(obj)
+        self.stats.add_bytes(len(data))
+        return type_str, data
+
+    def loads_typed(self, data: Tuple[str, bytes]) -> Any:
+        return self.serde.loads_typed(data)
+
+
+def _next_version(current: Optional[str]) -> str:
+    """通道版本号，与 InMemorySaver 的格式一致"""
+    if current is None:
+        current_v = 0
+    elif isinstance(current, int):
+        current_v = current
+    else:
+        current_v = int(current.split(".")[0])
+    return f"{current_v + 1:032}.{random.random():016}"
+
+
+class BoundedMemorySaver(InMemorySaver):
+    """
+    有界内存检查点存储
+
+    按线程记录最后访问时间，写入时淘汰超过 TTL 的线程，线程数超过上限时淘汰最久未访问的线程。
+    同步接口可能在工作线程中调用，访问记录、淘汰和存储的读写都在 _lock 内进行
+    """
+
+    def __init__(self, max_threads: int, ttl: float, stats: CheckpointStats, serde: Optional[SerializerProtocol] = None):
+        super().__init__(serde=_CountingSerializer(serde or CustomSerializer(), stats))
+        self.max_threads = max(max_threads, 1)
+        self.ttl = ttl
+        self.stats = stats
+        self._access: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.RLock()
+
+    def _touch(self, thread_id: str) -> None:
+        """记录访问并淘汰过期或超出上限的线程，调用方需持有 _lock"""
+        now = time.monotonic()
+        expired = []
+        self._access[thread_id] = now
+        self._access.move_to_end(thread_id)
+        for other_id, accessed_at in self._access.items():
+            if other_id != thread_id and (now - accessed_at > self.ttl or len(self._access) - len(expired) > self.max_threads):
+                expired.append(other_id)
+        for other_id in expired:
+            del self._access[other_id]
+            super().delete_thread(other_id)
+        if expired:
+            self.stats.add_evicted(len(expired))
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        with self._lock:
+            accessed_at = self._access.get(thread_id)
+            if accessed_at is not None and time.monotonic() - accessed_at > self.ttl:
+                self.delete_thread(thread_id)
+                return None
+            return super().get_tuple(config)
+
+    def list(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+             before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> Iterator[CheckpointTuple]:
+        # 在锁内取出全部结果，避免迭代存储字典时被其他线程的写入或淘汰修改
+        with self._lock:
+            items = [*super().list(config, filter=filter, before=before, limit=limit)]
+        yield from items
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        started = time.perf_counter()
+        with self._lock:
+            self._touch(config["configurable"]["thread_id"])
+            result = super().put(config, checkpoint, metadata, new_versions)
+        self.stats.record_write(time.perf_counter() - started)
+        return result
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                   task_path: str = "") -> None:
+        started = time.perf_counter()
+        with self._lock:
+            self._touch(config["configurable"]["thread_id"])
+            super().put_writes(config, writes, task_id, task_path)
+        self.stats.record_write(time.perf_counter() - started)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            self._access.pop(thread_id, None)
+            super().delete_thread(thread_id)
+
+
+class SqliteSaver(BaseCheckpointSaver):
+    """
+    SQLite 检查点存储（WAL 模式）
+
+    每个检查点连同通道值整体序列化为一行，节点写入（pending writes）单独保存，
+    异步接口在线程池中执行。超过 TTL 未更新的线程在打开时及每 100 次写入后清理
+    """
+
+    def __init__(self, path: str, ttl: float, stats: CheckpointStats, serde: Optional[SerializerProtocol] = None):
+        super().__init__(serde=_CountingSerializer(serde or CustomSerializer(), stats))
+        self.path = path
+        self.ttl = ttl
+        self.stats = stats
+        self._lock = threading.Lock()
+        self._puts = 0
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(
+            "CREATE TABLE IF NOT EXISTS checkpoints ("
+            "thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL DEFAULT '', checkpoint_id TEXT NOT NULL, "
+            "parent_checkpoint_id TEXT, type TEXT, checkpoint BLOB, metadata_type TEXT, metadata BLOB, "
+            "created_at REAL NOT NULL, PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id));"
+            "CREATE TABLE IF NOT EXISTS writes ("
+            "thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL DEFAULT '', checkpoint_id TEXT NOT NULL, "
+            "task_id TEXT NOT NULL, idx INTEGER NOT NULL, channel TEXT NOT NULL, type TEXT, value BLOB, "
+            "task_path TEXT NOT NULL DEFAULT '', PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx));"
+        )
+        self.conn.commit()
+        self._prune()
+
+    def _prune(self) -> None:
+        """删除超过 TTL 未更新的线程"""
+        expired_before = time.time() - self.ttl
+        with self._lock:
+            expired = [row[0] for row in self.conn.execute(
+                "SELECT thread_id FROM checkpoints GROUP BY thread_id HAVING MAX(created_at) < ?", (expired_before,)
+            )]
+            for thread_id in expired:
+                self.conn.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,))
+                self.conn.execute("DELETE FROM writes WHERE thread_id = ?", (thread_id,))
+            self.conn.commit()
+        self.stats.add_evicted(len(expired))
+
+    def _to_tuple(self, thread_id: str, checkpoint_ns: str, row: Tuple) -> CheckpointTuple:
+        checkpoint_id, parent_checkpoint_id, type_str, checkpoint, metadata_type, metadata = row
+        with self._lock:
+            writes = self.conn.execute(
+                "SELECT task_id, channel, type, value FROM writes "
+                "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+                (thread_id, checkpoint_ns, checkpoint_id),
+            ).fetchall()
+        return CheckpointTuple(
+            config={"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id}},
+            checkpoint=self.serde.loads_typed((type_str, checkpoint)),
+            metadata=self.serde.loads_typed((metadata_type, metadata)),
+            pending_writes=[(task_id, channel, self.serde.loads_typed((value_type, value)))
+                            for task_id, channel, value_type, value in writes],
+            parent_config=(
+                {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": parent_checkpoint_id}}
+                if parent_checkpoint_id else None
+            ),
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        columns = "checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata"
+        with self._lock:
+            if checkpoint_id := get_checkpoint_id(config):
+                row = self.conn.execute(
+                    f"SELECT {columns} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (thread_id, checkpoint_ns, checkpoint_id),
+                ).fetchone()
+            else:
+                row = self.conn.execute(
+                    f"SELECT {columns} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                    "ORDER BY checkpoint_id DESC LIMIT 1",
+                    (thread_id, checkpoint_ns),
+                ).fetchone()
+        if row is None:
+            return None
+        return self._to_tuple(thread_id, checkpoint_ns, row)
+
+    def list(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+             before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> Iterator[CheckpointTuple]:
+        query = "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata FROM checkpoints"
+        conditions, params = [], []
+        if config is not None:
+            conditions.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            if "checkpoint_ns" in config["configurable"]:
+                conditions.append("checkpoint_ns = ?")
+                params.append(config["configurable"]["checkpoint_ns"])
+        if before is not None and (before_id := get_checkpoint_id(before)):
+            conditions.append("checkpoint_id < ?")
+            params.append(before_id)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY checkpoint_id DESC"
+        with self._lock:
+            rows = self.conn.execute(query, params).fetchall()
+
+        count = 0
+        for thread_id, checkpoint_ns, *row in rows:
+            item = self._to_tuple(thread_id, checkpoint_ns, tuple(row))
+            if filter and not all(item.metadata.get(key) == value for key, value in filter.items()):
+                continue
+            yield item
+            count += 1
+            if limit is not None and count >= limit:
+                break
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        started = time.perf_counter()
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        type_str, data = self.serde.dumps_typed(checkpoint)
+        metadata_type, metadata_data = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO checkpoints (thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, "
+                "type, checkpoint, metadata_type, metadata, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (thread_id, checkpoint_ns, checkpoint["id"], config["configurable"].get("checkpoint_id"),
+                 type_str, data, metadata_type, metadata_data, time.time()),
+            )
+            self.conn.commit()
+            self._puts += 1
+        self.stats.record_write(time.perf_counter() - started)
+        if self._puts % 100 == 0:
+            self._prune()
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint["id"]}}
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                   task_path: str = "") -> None:
+        started = time.perf_counter()
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        # 特殊通道（错误、中断等）的写入可以覆盖，普通写入只保存第一次
+        verb = "INSERT OR REPLACE" if all(channel in WRITES_IDX_MAP for channel, _ in writes) else "INSERT OR IGNORE"
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            value_type, value_data = self.serde.dumps_typed(value)
+            rows.append((thread_id, checkpoint_ns, checkpoint_id, task_id, WRITES_IDX_MAP.get(channel, idx),
+                         channel, value_type, value_data, task_path))
+        with self._lock:
+            self.conn.executemany(
+                f"{verb} INTO writes (thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, type, value, task_path) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self.conn.commit()
+        self.stats.record_write(time.perf_counter() - started)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            self.conn.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,))
+            self.conn.execute("DELETE FROM writes WHERE thread_id = ?", (thread_id,))
+            self.conn.commit()
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+                    before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> AsyncIterator[CheckpointTuple]:
+        items = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for item in items:
+            yield item
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                          task_path: str = "") -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+    def get_next_version(self, current: Optional[str], channel: None) -> str:
+        return _next_version(current)
+
+
+class CheckpointManager:
+    """检查点存储管理器 - 单例模式，按配置创建所有图共用的检查点存储"""
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not self._initialized:
+            self.logger = get_logger(__name__)
+            self._lock = threading.Lock()
+            self._checkpointer: Optional[BaseCheckpointSaver] = None
+            self._created = False
+            self.stats_data = CheckpointStats()
+            self._initialized = True
+
+    @property
+    def mode(self) -> str:
+        mode = get_settings().checkpointer.lower()
+        if mode not in CHECKPOINTER_MODES:
+            raise ValueError(f"不支持的 checkpointer 模式: {mode}，可选: {', '.join(CHECKPOINTER_MODES)}")
+        return mode
+
+    def get_checkpointer(self) -> Optional[BaseCheckpointSaver]:
+        """获取共用的检查点存储，none 模式返回 None"""
+        if not self._created:
+            with self._lock:
+                if not self._created:
+                    self._checkpointer = self._create()
+                    self._created = True
+        return self._checkpointer
+
+    def _create(self) -> Optional[BaseCheckpointSaver]:
+        settings = get_settings()
+        mode = self.mode
+        serde = CustomSerializer(compress_threshold=settings.checkpointer_compress_threshold)
+        if mode == "memory":
+            checkpointer = BoundedMemorySaver(settings.checkpointer_max_threads, settings.checkpointer_ttl, self.stats_data, serde)
+        elif mode == "sqlite":
+            checkpointer = SqliteSaver(settings.checkpointer_sqlite_path, settings.checkpointer_ttl, self.stats_data, serde)
+        else:
+            checkpointer = None
+        self.logger.info(f"检查点存储模式: {mode}")
+        return checkpointer
+
+    def stats(self) -> Dict[str, Any]:
+        """获取检查点写入统计"""
+        return {"mode": self.mode, **self.stats_data.to_dict()}
+
+
+# 全局检查点存储管理器实例
+checkpoint_manager = CheckpointManager()
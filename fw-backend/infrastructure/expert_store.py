@@ -0,0 +1,255 @@
+"""
+专家配置存储
+
+通过配置 expert_backend 选择后端：
+- json: cfg/experts.json（默认），每次修改整体重写文件（临时文件 + os.replace）
+- sqlite: SQLite 数据库，按行更新；prompt 每次修改生成新的不可变版本，专家记录指向当前版本
+
+两种后端都提供 stamp()：数据变化时返回值随之变化，服务层据此判断内存快照是否需要重新加载。
+sqlite 后端首次打开且为空时，自动从 experts.json 导入；也可以手动迁移:
+    python -m infrastructure.expert_store [experts.json 路径] [数据库路径]
+"""
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from cfg.setting import get_settings
+from utils.unified_logger import get_logger
+
+EXPERT_BACKENDS = ("json", "sqlite")
+DEFAULT_JSON_PATH = Path(__file__).parent.parent / "cfg" / "experts.json"
+
+logger = get_logger(__name__)
+
+
+class JsonExpertStore:
+    """JSON 文件存储，以文件的 (mtime_ns, 大小) 作为变化标记"""
+
+    supports_versions = False
+
+    def __init__(self, path: Path = DEFAULT_JSON_PATH):
+        self.path = Path(path)
+        # 确保目录存在
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def stamp(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def load(self) -> List[Dict[str, Any]]:
+        """读取专家数据，文件不存在时返回空列表"""
+        if not self.path.exists():
+            return []
+        with open(self.path, 'r', encoding='utf-8') as f:
+            experts = json.load(f)
+        # 确保所有专家都有icon字段（向后兼容，只补全内存中的数据，不回写文件）
+        for expert in experts:
+            expert.setdefault('icon', '🔮')
+        return experts
+
+    def _write(self, experts: List[Dict[str, Any]]) -> None:
+        """写入临时文件后原子替换配置文件"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, prefix=".experts.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(experts, f, ensure_ascii=False, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def create(self, experts: List[Dict[str, Any]], expert: Dict[str, Any]) -> None:
+        self._write(experts)
+
+    def update(self, experts: List[Dict[str, Any]], expert: Dict[str, Any], prompt_changed: bool) -> None:
+        self._write(experts)
+
+    def delete(self, experts: List[Dict[str, Any]], expert_id: str) -> None:
+        self._write(experts)
+
+    def prompt_versions(self, expert_id: str) -> List[Dict[str, Any]]:
+        """JSON 存储不保存 prompt 版本历史"""
+        return []
+
+
+class SqliteExpertStore:
+    """
+    SQLite 存储（WAL 模式）
+
+    experts 表保存专家的当前配置，prompt 保存在 expert_prompts 表中，按 (expert_id, version) 索引，
+    写入后不再修改；删除专家时保留其 prompt 历史。meta 表的 revision 在每次写入时加 1，作为变化标记
+    """
+
+    supports_versions = True
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(
+            "CREATE TABLE IF NOT EXISTS experts ("
+            "id TEXT PRIMARY KEY, position INTEGER NOT NULL, name TEXT NOT NULL DEFAULT '', "
+            "skills TEXT NOT NULL DEFAULT '', icon TEXT NOT NULL DEFAULT '🔮', "
+            "required_fields TEXT NOT NULL DEFAULT '[]', prompt_version INTEGER NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS expert_prompts ("
+            "expert_id TEXT NOT NULL, version INTEGER NOT NULL, prompt TEXT NOT NULL, "
+            "created_at REAL NOT NULL, PRIMARY KEY (expert_id, version));"
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);"
+        )
+        self.conn.commit()
+
+    def _bump_revision(self) -> None:
+        self.conn.execute(
+            "INSERT INTO meta (key, value) VALUES ('revision', 1) "
+            "ON CONFLICT(key) DO UPDATE SET value = value + 1"
+        )
+
+    def _add_prompt_version(self, expert_id: str, prompt: str) -> int:
+        row = self.conn.execute(
+            "SELECT COALESCE(MAX(version), 0) FROM expert_prompts WHERE expert_id = ?", (expert_id,)
+        ).fetchone()
+        version = row[0] + 1
+        self.conn.execute(
+            "INSERT INTO expert_prompts (expert_id, version, prompt, created_at) VALUES (?, ?, ?, ?)",
+            (expert_id, version, prompt or "", time.time()),
+        )
+        return version
+
+    def _insert(self, expert: Dict[str, Any]) -> None:
+        """插入专家及其第一个 prompt 版本（调用方需持有锁并提交事务）"""
+        version = self._add_prompt_version(expert["id"], expert.get("prompt", ""))
+        self.conn.execute(
+            "INSERT INTO experts (id, position, name, skills, icon, required_fields, prompt_version) "
+            "VALUES (?, (SELECT COALESCE(MAX(position), 0) + 1 FROM experts), ?, ?, ?, ?, ?)",
+            (expert["id"], expert.get("name", ""), expert.get("skills", ""), expert.get("icon") or "🔮",
+             json.dumps(expert.get("required_fields") or [], ensure_ascii=False), version),
+        )
+        expert["prompt_version"] = version
+
+    def stamp(self) -> int:
+        with self._lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = 'revision'").fetchone()
+        return row[0] if row else 0
+
+    def count(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM experts").fetchone()[0]
+
+    def load(self) -> List[Dict[str, Any]]:
+        """读取所有专家的当前配置（含当前 prompt 版本号）"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT e.id, e.name, e.skills, p.prompt, e.icon, e.required_fields, e.prompt_version "
+                "FROM experts e LEFT JOIN expert_prompts p ON p.expert_id = e.id AND p.version = e.prompt_version "
+                "ORDER BY e.position"
+            ).fetchall()
+        return [
+            {
+                "id": expert_id,
+                "name": name,
+                "skills": skills,
+                "prompt": prompt or "",
+                "icon": icon,
+                "required_fields": json.loads(required_fields),
+                "prompt_version": prompt_version,
+            }
+            for expert_id, name, skills, prompt, icon, required_fields, prompt_version in rows
+        ]
+
+    def create(self, experts: List[Dict[str, Any]], expert: Dict[str, Any]) -> None:
+        with self._lock:
+            self._insert(expert)
+            self._bump_revision()
+            self.conn.commit()
+
+    def update(self, experts: List[Dict[str, Any]], expert: Dict[str, Any], prompt_changed: bool) -> None:
+        """更新专家的当前配置，prompt 变化时新增一个版本"""
+        with self._lock:
+            if prompt_changed:
+                expert["prompt_version"] = self._add_prompt_version(expert["id"], expert.get("prompt", ""))
+            self.conn.execute(
+                "UPDATE experts SET name = ?, skills = ?, icon = ?, required_fields = ?, prompt_version = ? WHERE id = ?",
+                (expert.get("name", ""), expert.get("skills", ""), expert.get("icon") or "🔮",
+                 json.dumps(expert.get("required_fields") or [], ensure_ascii=False),
+                 expert["prompt_version"], expert["id"]),
+            )
+            self._bump_revision()
+            self.conn.commit()
+
+    def delete(self, experts: List[Dict[str, Any]], expert_id: str) -> None:
+        with self._lock:
+            self.conn.execute("DELETE FROM experts WHERE id = ?", (expert_id,))
+            self._bump_revision()
+            self.conn.commit()
+
+    def prompt_versions(self, expert_id: str) -> List[Dict[str, Any]]:
+        """专家的 prompt 版本历史（按版本号升序）"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT version, prompt, created_at FROM expert_prompts WHERE expert_id = ? ORDER BY version",
+                (expert_id,),
+            ).fetchall()
+        return [{"version": version, "prompt": prompt, "created_at": created_at} for version, prompt, created_at in rows]
+
+    def import_experts(self, experts: List[Dict[str, Any]]) -> int:
+        """导入专家（已存在的ID跳过），返回导入数量"""
+        imported = 0
+        with self._lock:
+            for expert in experts:
+                if not expert.get("id"):
+                    continue
+                exists = self.conn.execute("SELECT 1 FROM experts WHERE id = ?", (expert["id"],)).fetchone()
+                if exists:
+                    continue
+                self._insert(dict(expert))
+                imported += 1
+            if imported:
+                self._bump_revision()
+            self.conn.commit()
+        return imported
+
+
+def migrate_json_to_sqlite(json_path: Path, db_path: str) -> int:
+    """将 experts.json 中的专家导入 SQLite 数据库，返回导入数量"""
+    experts = JsonExpertStore(json_path).load()
+    return SqliteExpertStore(db_path).import_experts(experts)
+
+
+def create_expert_store():
+    """按配置创建专家存储；sqlite 数据库为空时从 experts.json 导入"""
+    settings = get_settings()
+    backend = settings.expert_backend
+    if backend not in EXPERT_BACKENDS:
+        logger.warning(f"未知的专家存储后端 {backend}，使用 json")
+        backend = "json"
+    if backend == "json":
+        store = JsonExpertStore()
+    else:
+        store = SqliteExpertStore(settings.expert_sqlite_path)
+        if store.count() == 0 and DEFAULT_JSON_PATH.exists():
+            imported = store.import_experts(JsonExpertStore().load())
+            logger.info(f"已从 {DEFAULT_JSON_PATH} 导入 {imported} 个专家到 {settings.expert_sqlite_path}")
+    logger.info(f"专家存储后端: {backend}")
+    return store
+
+
+if __name__ == "__main__":
+    source = Path(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_JSON_PATH
+    target = sys.argv[2] if len(sys.argv) > 2 else get_settings().expert_sqlite_path
+    print(f"已导入 {migrate_json_to_sqlite(source, target)} 个专家: {source} -> {target}")
@@ -0,0 +1,162 @@
+"""
+Parlant REST API 的共享 HTTP 客户端
+
+整个进程共用一个 httpx.AsyncClient（连接池 + keep-alive），在 FastAPI lifespan 中创建和关闭，
+避免每次调用都重新建立 TCP 连接和构造客户端。支持：
+- 按操作配置超时（探活、写入、长轮询）
+- parlant 与后端在同一台机器时，通过 Unix 域套接字（parlant_uds）连接
+- 连接池使用情况（由进行中的请求数推算，不读取 httpx 内部状态）和按操作的请求统计
+"""
+import time
+from collections import defaultdict
+from typing import Any, Dict, Optional
+
+import httpx
+
+from cfg.setting import get_settings
+from utils.unified_logger import get_logger
+
+
+class _OperationStats:
+    """单个操作的请求统计"""
+
+    __slots__ = ("requests", "errors", "seconds", "max_seconds")
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "avg_ms": round(self.seconds / self.requests * 1000, 2) if self.requests else 0.0,
+            "max_ms": round(self.max_seconds * 1000, 2),
+        }
+
+
+class ParlantClient:
+    """Parlant HTTP 客户端 - 单例模式"""
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not self._initialized:
+            self.logger = get_logger(__name__)
+            self._client: Optional[httpx.AsyncClient] = None
+            self._in_flight = 0
+            self._max_in_flight = 0
+            self._operations: Dict[str, _OperationStats] = defaultdict(_OperationStats)
+            self._initialized = True
+
+    @property
+    def base_url(self) -> str:
+        return get_settings().parlant_url.rstrip("/")
+
+    async def start(self) -> httpx.AsyncClient:
+        """创建共享客户端（已创建时直接返回），在 lifespan 启动阶段调用"""
+        if self._client is not None:
+            return self._client
+        settings = get_settings()
+        limits = httpx.Limits(
+            max_connections=settings.parlant_max_connections,
+            max_keepalive_connections=settings.parlant_max_keepalive,
+            keepalive_expiry=settings.parlant_keepalive_expiry,
+        )
+        transport = httpx.AsyncHTTPTransport(limits=limits, uds=settings.parlant_uds or None)
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            transport=transport,
+            timeout=httpx.Timeout(settings.parlant_write_timeout, connect=settings.parlant_connect_timeout),
+        )
+        target = f"unix:{settings.parlant_uds}" if settings.parlant_uds else self.base_url
+        self.logger.info(
+            f"Parlant HTTP 客户端已创建: {target}，最大连接数 {settings.parlant_max_connections}，"
+            f"keep-alive 连接数 {settings.parlant_max_keepalive}"
+        )
+        return self._client
+
+    async def close(self) -> None:
+        """关闭共享客户端，在 lifespan 结束阶段调用"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self.logger.info("Parlant HTTP 客户端已关闭")
+
+    def timeout(self, operation: str, wait_for_data: float = 0.0) -> httpx.Timeout:
+        """
+        按操作返回超时配置
+        - probe: 探活、获取 Agent、检查会话是否存在
+        - write: 创建会话、发送消息
+        - poll: 长轮询事件，读超时为 wait_for_data 加上余量
+        """
+        settings = get_settings()
+        if operation == "poll":
+            total = wait_for_data + settings.parlant_poll_grace
+        elif operation == "probe":
+            total = settings.parlant_probe_timeout
+        else:
+            total = settings.parlant_write_timeout
+        return httpx.Timeout(total, connect=settings.parlant_connect_timeout)
+
+    async def request(self, name: str, method: str, path: str, timeout: httpx.Timeout, **kwargs: Any) -> httpx.Response:
+        """
+        通过共享客户端发送请求，按 name 记录请求数、错误数和耗时
+        未在 lifespan 中创建客户端时（如脚本中直接调用）首次请求时创建
+        """
+        client = self._client or await self.start()
+        stats = self._operations[name]
+        stats.requests += 1
+        self._in_flight += 1
+        self._max_in_flight = max(self._max_in_flight, self._in_flight)
+        started = time.perf_counter()
+        try:
+            return await client.request(method, path, timeout=timeout, **kwargs)
+        except httpx.RequestError:
+            stats.errors += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            self._in_flight -= 1
+            stats.seconds += elapsed
+            stats.max_seconds = max(stats.max_seconds, elapsed)
+
+    def pool_stats(self) -> Dict[str, Any]:
+        """
+        连接池配置与使用情况
+        所有请求都经过 request()，且读完响应后即归还连接，因此由进行中的请求数推算：
+        占用连接的请求数不超过最大连接数，超出的部分在排队等待连接
+        """
+        if self._client is None:
+            return {"started": False}
+        settings = get_settings()
+        return {
+            "started": True,
+            "active": min(self._in_flight, settings.parlant_max_connections),
+            "queued": max(self._in_flight - settings.parlant_max_connections, 0),
+            "max_connections": settings.parlant_max_connections,
+            "max_keepalive": settings.parlant_max_keepalive,
+            "keepalive_expiry": settings.parlant_keepalive_expiry,
+            "uds": bool(settings.parlant_uds),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """获取连接池与请求统计"""
+        return {
+            "pool": self.pool_stats(),
+            "in_flight": self._in_flight,
+            "max_in_flight": self._max_in_flight,
+            "operations": {name: stats.to_dict() for name, stats in self._operations.items()},
+        }
+
+
+# 全局 Parlant 客户端实例
+parlant_client = ParlantClient()
@@ -9,6 +9,8 @@ from langgraph.store.memory import InMemoryStore
 
 from cfg.setting import get_settings
 from llm_provider.base import get_llm, _SUPPORTED_PROVIDERS
+from llm_provider.cassette import Cassette, CassetteChatModel
+from llm_provider.hedge import HedgedChatModel
 from memory.embeddings import Embeddings
 from utils.unified_logger import get_logger
 
@@ -30,6 +32,10 @@ class ServiceManager:
             self.settings = None
             self.fast_llm = None
             self.vision_llm = None
+            # 专家节点使用的对冲模型，未配置备用模型时为 None
+            self.fast_llm_hedged = None
+            self.vision_llm_hedged = None
+            self._cassette = None
             self._initialized = True
             self.store = None
 
@@ -74,29 +80,83 @@ class ServiceManager:
         try:
             # 解析fast_llm配置
             fast_llm_provider, fast_llm_model = self.parse_llm(self.settings.fast_llm)
-            self.fast_llm = get_llm(
+            self.fast_llm = self._wrap_llm(get_llm(
                 llm_provider=fast_llm_provider,
                 model=fast_llm_model,
                 **{}
-            ).llm
+            ).llm, self.settings.fast_llm)
             
             # 解析vision_llm配置
             vision_llm_provider, vision_llm_model = self.parse_llm(self.settings.vision_llm)
-            self.vision_llm = get_llm(
+            self.vision_llm = self._wrap_llm(get_llm(
                 llm_provider=vision_llm_provider,
                 model=vision_llm_model,
                 **{}
-            ).llm
+            ).llm, self.settings.vision_llm)
+            
+            # 专家节点的对冲请求（可选）
+            self.fast_llm_hedged = self._hedge_llm(self.fast_llm, self.settings.fast_llm, self.settings.llm_hedge_fast_llm)
+            self.vision_llm_hedged = self._hedge_llm(self.vision_llm, self.settings.vision_llm, self.settings.llm_hedge_vision_llm)
             self.logger.info("LLM实例初始化完成")
         except Exception as e:
             self.logger.error(f"LLM初始化失败: {e}")
             raise
     
+    def _wrap_llm(self, llm, llm_str: str):
+        """按配置包装 LLM 实例（录制回放），llm_str 为 FAST_LLM / VISION_LLM 配置值"""
+        mode = self.settings.llm_cassette_mode
+        if mode:
+            if self._cassette is None:
+                self._cassette = Cassette(self.settings.llm_cassette_path)
+            llm = CassetteChatModel(
+                inner=llm,
+                cassette=self._cassette,
+                model=llm_str,
+                mode=mode,
+                speed=self.settings.llm_cassette_speed,
+                miss=self.settings.llm_cassette_miss,
+            )
+            self.logger.info(f"LLM {llm_str} 已启用录制回放: {mode}，文件 {self.settings.llm_cassette_path}")
+        return llm
+    
+    def _hedge_llm(self, primary, primary_str: str, secondary_str: str):
+        """构建主模型 + 备用模型的对冲模型，未配置备用模型时返回 None"""
+        if not secondary_str:
+            return None
+        secondary_provider, secondary_model = self.parse_llm(secondary_str)
+        secondary = self._wrap_llm(get_llm(
+            llm_provider=secondary_provider,
+            model=secondary_model,
+            **{}
+        ).llm, secondary_str)
+        self.logger.info(f"专家节点启用对冲请求: {primary_str} -> {secondary_str}")
+        return HedgedChatModel(
+            inner=primary,
+            secondary=secondary,
+            primary_name=primary_str,
+            secondary_name=secondary_str,
+            delay=self.settings.llm_hedge_delay,
+            initial_delay=self.settings.llm_hedge_initial_delay,
+            quantile=self.settings.llm_hedge_quantile,
+            window=self.settings.llm_hedge_window,
+            min_samples=self.settings.llm_hedge_min_samples,
+        )
+    
     def get_llms(self):
         """获取所有LLM实例"""
         return {
             'fast_llm': self.fast_llm,
-            'vision_llm': self.vision_llm
+            'vision_llm': self.vision_llm,
+            'fast_llm_hedged': self.fast_llm_hedged,
+            'vision_llm_hedged': self.vision_llm_hedged
+        }
+    
+    def get_hedge_stats(self):
+        """获取专家节点对冲请求的统计（对冲率、各 provider 胜出次数）"""
+        return {
+            name: llm.stats()
+            for name, llm in (('fast_llm', self.fast_llm_hedged), ('vision_llm', self.vision_llm_hedged))
+            if llm is not None
         }
     
     def get_config(self):
@@ -5,10 +5,12 @@ import os
 from typing import Any
 from colorama import Fore, Style, init
 from cfg.setting import get_settings
+from llm_provider.limiter import llm_limiters
 
 _SUPPORTED_PROVIDERS = {
     "azure_openai",
     "dashscope",
+    "fake",
 }
 
 SUPPORT_REASONING_EFFORT_MODELS = [
@@ -42,9 +44,27 @@ class GenericLLMProvider:
 
             kwargs = {"api_key": settings.dashscope_api_key, **kwargs}
             llm = ChatTongyi(**kwargs)
+        elif provider == "fake":
+            # 离线压测用的模拟模型，不访问网络
+            from llm_provider.fake import FakeChatModel
+
+            kwargs = {"ttft": settings.fake_llm_ttft,
+                      "tokens_per_second": settings.fake_llm_tokens_per_second,
+                      "jitter": settings.fake_llm_jitter,
+                      "jitter_scale": settings.fake_llm_jitter_scale,
+                      "error_rate": settings.fake_llm_error_rate,
+                      "seed": settings.fake_llm_seed,
+                      "output_tokens": settings.fake_llm_output_tokens,
+                      **kwargs}
+            if settings.fake_llm_output_file:
+                llm = FakeChatModel.from_output_file(settings.fake_llm_output_file, **kwargs)
+            else:
+                llm = FakeChatModel(**kwargs)
         else:
             raise ValueError(f"Unsupported provider: {provider}. Supported providers are: {', '.join(_SUPPORTED_PROVIDERS)}")
         
+        # 按 provider:model 限制并发和每分钟请求数/token 数（未配置时不包装）
+        llm = llm_limiters.wrap(llm, provider, kwargs.get("model"))
         return cls(llm)
 
 
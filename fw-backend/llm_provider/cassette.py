@@ -0,0 +1,219 @@
+"""
+LLM 调用的录制与回放（cassette）
+
+录制模式下把每次调用的请求与响应追加写入本地 JSONL 文件：流式调用保存每个块的内容和相对调用开始的时间，
+非流式调用保存完整内容和耗时。回放模式下按相同的时间间隔返回录制的内容，不访问网络，
+用于以真实的报告长度和内容结构压测 FateGraph 和 SSE 链路。
+
+条目按“模型名 + 规范化后的消息”的哈希索引：消息只保留角色和文本（空白折叠），
+图片内容替换为占位符（每次上传的图片不同，但不影响响应的形态）。
+同一个键录制了多次时回放轮流返回；未命中时按 miss 配置报错（error）或轮流返回该模型的任意录制（any）。
+"""
+import asyncio
+import hashlib
+import itertools
+import json
+import re
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from pydantic import PrivateAttr
+
+from llm_provider.wrapped import WrappedChatModel
+from utils.unified_logger import get_logger
+
+logger = get_logger(__name__)
+
+CASSETTE_MODES = ("record", "replay")
+MISS_POLICIES = ("error", "any")
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+class CassetteMissError(LookupError):
+    """回放时没有找到对应的录制"""
+
+
+def _normalize_content(content: Any) -> Any:
+    if isinstance(content, str):
+        return _WHITESPACE.sub(" ", content).strip()
+    parts = []
+    for part in content or []:
+        if isinstance(part, dict) and part.get("type") in ("image", "image_url"):
+            parts.append("<image>")
+        elif isinstance(part, dict):
+            parts.append(_normalize_content(part.get("text", "")))
+        else:
+            parts.append(_normalize_content(str(part)))
+    return parts
+
+
+def cassette_key(model: str, messages: List[BaseMessage]) -> str:
+    """模型名 + 规范化消息的哈希"""
+    normalized = [(message.type, _normalize_content(message.content)) for message in messages]
+    payload = json.dumps([model, normalized], ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """录制文件：首次回放时加载索引，录制时追加写入（在线程池中执行）"""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._entries: Optional[Dict[str, List[Dict[str, Any]]]] = None
+        self._by_model: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self._cursors: Dict[str, Any] = {}
+
+    def _load(self) -> Dict[str, List[Dict[str, Any]]]:
+        with self._lock:
+            if self._entries is None:
+                entries: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+                if self.path.exists():
+                    with open(self.path, "r", encoding="utf-8") as f:
+                        for line in f:
+                            if line.strip():
+                                entry = json.loads(line)
+                                entries[entry["key"]].append(entry)
+                                self._by_model[entry["model"]].append(entry)
+                self._entries = entries
+                logger.info(f"已加载 LLM 录制 {self.path}: {sum(len(v) for v in entries.values())} 条")
+            return self._entries
+
+    def _next(self, cursor_key: str, entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+        with self._lock:
+            cursor = self._cursors.get(cursor_key)
+            if cursor is None:
+                cursor = self._cursors[cursor_key] = itertools.cycle(entries)
+            return next(cursor)
+
+    def lookup(self, key: str, model: str, miss: str) -> Dict[str, Any]:
+        """查找录制，同一个键的多条录制轮流返回"""
+        entries = self._load().get(key)
+        if entries:
+            return self._next(key, entries)
+        if miss == "any" and self._by_model.get(model):
+            return self._next(f"model:{model}", self._by_model[model])
+        raise CassetteMissError(f"LLM 录制中没有该请求: model={model}, key={key[:12]}（{self.path}）")
+
+    def append(self, entry: Dict[str, Any]) -> None:
+        line = json.dumps(entry, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+            if self._entries is not None:
+                self._entries[entry["key"]].append(entry)
+                self._by_model[entry["model"]].append(entry)
+
+
+class CassetteChatModel(WrappedChatModel):
+    """录制或回放被包装模型的调用"""
+
+    cassette: Any
+    model: str
+    mode: str = "replay"
+    # 回放速度倍数：1 为原始速度，2 为两倍速，0 表示不等待
+    speed: float = 1.0
+    miss: str = "error"
+
+    _recorded: int = PrivateAttr(default=0)
+    _replayed: int = PrivateAttr(default=0)
+
+    def model_post_init(self, __context: Any) -> None:
+        if self.mode not in CASSETTE_MODES:
+            raise ValueError(f"Unsupported cassette mode: {self.mode}. Supported: {', '.join(CASSETTE_MODES)}")
+        if self.miss not in MISS_POLICIES:
+            raise ValueError(f"Unsupported cassette miss policy: {self.miss}. Supported: {', '.join(MISS_POLICIES)}")
+
+    @property
+    def _llm_type(self) -> str:
+        return f"cassette:{self.inner._llm_type}"
+
+    def stats(self) -> Dict[str, Any]:
+        return {"mode": self.mode, "recorded": self._recorded, "replayed": self._replayed}
+
+    async def _sleep_until(self, started: float, offset: float) -> None:
+        if self.speed <= 0:
+            return
+        delay = started + offset / self.speed - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def _save(self, key: str, messages: List[BaseMessage], entry: Dict[str, Any]) -> None:
+        entry = {
+            "key": key,
+            "model": self.model,
+            "recorded_at": datetime.now().isoformat(timespec="seconds"),
+            "input_chars": sum(len(str(message.content)) for message in messages),
+            **entry,
+        }
+        await asyncio.to_thread(self.cassette.append, entry)
+        self._recorded += 1
+
+    async def _ainvoke_inner(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                             **kwargs: Any) -> AIMessage:
+        key = cassette_key(self.model, messages)
+        if self.mode == "replay":
+            entry = await asyncio.to_thread(self.cassette.lookup, key, self.model, self.miss)
+            self._replayed += 1
+            await self._sleep_until(time.perf_counter(), entry["latency"])
+            return AIMessage(content=_entry_content(entry), usage_metadata=entry.get("usage"))
+
+        started = time.perf_counter()
+        message = await self.inner.ainvoke(messages, stop=stop, **kwargs)
+        await self._save(key, messages, {
+            "kind": "invoke",
+            "latency": round(time.perf_counter() - started, 4),
+            "content": message.content,
+            "usage": message.usage_metadata,
+        })
+        return message
+
+    async def _astream_inner(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                             **kwargs: Any) -> AsyncIterator[AIMessageChunk]:
+        key = cassette_key(self.model, messages)
+        if self.mode == "replay":
+            entry = await asyncio.to_thread(self.cassette.lookup, key, self.model, self.miss)
+            self._replayed += 1
+            started = time.perf_counter()
+            # 非流式的录制按总耗时一次返回
+            chunks = entry.get("chunks") or [[entry["latency"], entry["content"]]]
+            for offset, content in chunks:
+                await self._sleep_until(started, offset)
+                yield AIMessageChunk(content=content)
+            if entry.get("usage"):
+                yield AIMessageChunk(content=[] if isinstance(chunks[0][1], list) else "", usage_metadata=entry["usage"])
+            return
+
+        started = time.perf_counter()
+        chunks = []
+        usage = None
+        async for chunk in self.inner.astream(messages, stop=stop, **kwargs):
+            if chunk.usage_metadata:
+                usage = chunk.usage_metadata
+            if chunk.content:
+                chunks.append([round(time.perf_counter() - started, 4), chunk.content])
+            yield chunk
+        # 只保存完整结束的调用，调用方中途停止（如客户端断开）时不录制
+        await self._save(key, messages, {
+            "kind": "stream",
+            "latency": round(time.perf_counter() - started, 4),
+            "chunks": chunks,
+            "usage": usage,
+        })
+
+
+def _entry_content(entry: Dict[str, Any]) -> Any:
+    """录制的完整内容；流式录制拼接所有块（视觉模型的数组格式拼接为一个文本块）"""
+    if "content" in entry:
+        return entry["content"]
+    contents = [content for _, content in entry.get("chunks", [])]
+    if contents and isinstance(contents[0], list):
+        return [{"text": "".join(part.get("text", "") for content in contents for part in content if isinstance(part, dict))}]
+    return "".join(str(content) for content in contents)
@@ -0,0 +1,233 @@
+"""
+离线压测用的模拟 LLM（provider 为 fake）
+
+不访问网络，按配置的首 token 延迟（ttft）、生成速度（tokens_per_second）、抖动分布和错误率
+返回固定的 markdown 报告，用于在隔离的机器上测量 /api/fortune/analyze 和 FateGraph 的吞吐与尾延迟。
+同一个 seed 下，调用顺序相同则每次调用的延迟和是否出错都相同。
+
+输入中包含图片时（视觉消息），与 DashScope 多模态模型一样以 [{"text": ...}] 数组格式返回内容。
+"""
+import asyncio
+import math
+import random
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import ConfigDict, Field, PrivateAttr
+
+JITTER_DISTRIBUTIONS = ("none", "uniform", "normal", "lognormal", "exponential")
+
+DEFAULT_OUTPUT = """## 命理分析报告
+
+### 性格分析
+日主偏旺，性格坚毅果断，做事有主见，重承诺；但有时过于固执，宜多听取他人意见。
+
+### 事业分析
+官星透出，适合在组织中稳步发展，中年后事业运势上升，宜把握三十五岁前后的转机。
+
+### 财运分析
+正财稳定，偏财有起伏，理财宜稳健，避免高风险投资；与人合作求财较为有利。
+
+### 婚姻分析
+夫妻宫平稳，感情重在沟通，晚婚较为有利，婚后宜互相包容。
+
+### 健康分析
+注意脾胃与睡眠，作息规律，适度运动，少熬夜。
+
+### 建议
+1. 保持耐心，循序渐进
+2. 多结交贵人，拓展人脉
+3. 注重身体健康，劳逸结合
+"""
+
+# 中日韩字符按单字计为一个 token，其余按“前导空白 + 连续非空白字符”计为一个 token
+_CJK = "\u3000-\u303f\u4e00-\u9fff\uff00-\uffef"
+_TOKEN_PATTERN = re.compile(rf"[{_CJK}]|\s*[^\s{_CJK}]+|\s+")
+
+
+class FakeLLMError(RuntimeError):
+    """按 error_rate 注入的模拟调用失败"""
+
+
+def split_tokens(text: str) -> List[str]:
+    """把文本切分为模拟 token，拼接后与原文相同"""
+    return _TOKEN_PATTERN.findall(text)
+
+
+def _has_image(messages: List[BaseMessage]) -> bool:
+    for message in messages:
+        if isinstance(message.content, list):
+            for part in message.content:
+                if isinstance(part, dict) and part.get("type") in ("image", "image_url"):
+                    return True
+    return False
+
+
+def _content_length(messages: List[BaseMessage]) -> int:
+    total = 0
+    for message in messages:
+        if isinstance(message.content, str):
+            total += len(message.content)
+        else:
+            total += sum(len(part.get("text", "")) for part in message.content if isinstance(part, dict))
+    return total
+
+
+class FakeChatModel(BaseChatModel):
+    """模拟聊天模型：ainvoke/astream 按延迟参数返回固定的 markdown 输出"""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    model: str = "fake"
+    # 首 token 延迟（秒）和生成速度（token/秒，0 表示首 token 后立即返回全部内容）
+    ttft: float = 0.5
+    tokens_per_second: float = 50.0
+    # 抖动分布与尺度：每次调用抽取一个倍数，同时作用于首 token 延迟和生成时长
+    # uniform: [1-s, 1+s]；normal: N(1, s)；lognormal: exp(N(0, s))；exponential: 均值为 1 的指数分布（s 不生效）
+    jitter: str = "none"
+    jitter_scale: float = 0.2
+    # 调用失败的概率，失败在首 token 延迟之后抛出 FakeLLMError
+    error_rate: float = 0.0
+    seed: Optional[int] = None
+    # 固定输出内容；output_tokens 大于 0 时重复或截断到该 token 数
+    output: str = Field(default=DEFAULT_OUTPUT)
+    output_tokens: int = 0
+    # 输入包含图片时以 [{"text": ...}] 数组格式返回内容（与 DashScope 多模态模型一致）
+    vision_list_content: bool = True
+
+    _rng: random.Random = PrivateAttr()
+    _rng_lock: threading.Lock = PrivateAttr()
+    _tokens: List[str] = PrivateAttr()
+
+    def model_post_init(self, __context: Any) -> None:
+        if self.jitter not in JITTER_DISTRIBUTIONS:
+            raise ValueError(f"Unsupported jitter: {self.jitter}. Supported: {', '.join(JITTER_DISTRIBUTIONS)}")
+        self._rng = random.Random(self.seed)
+        self._rng_lock = threading.Lock()
+        tokens = split_tokens(self.output) or [""]
+        if self.output_tokens > 0:
+            repeats = math.ceil(self.output_tokens / len(tokens))
+            tokens = (tokens * repeats)[:self.output_tokens]
+        self._tokens = tokens
+
+    @classmethod
+    def from_output_file(cls, path: str, **kwargs: Any) -> "FakeChatModel":
+        """从 markdown 文件读取固定输出"""
+        return cls(output=Path(path).read_text(encoding="utf-8"), **kwargs)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    @property
+    def _identifying_params(self) -> dict:
+        return {"model": self.model, "ttft": self.ttft, "tokens_per_second": self.tokens_per_second, "jitter": self.jitter}
+
+    def _plan(self) -> tuple[float, float, bool]:
+        """抽取本次调用的首 token 延迟、每个 token 的间隔和是否失败"""
+        with self._rng_lock:
+            scale = self.jitter_scale
+            if self.jitter == "uniform":
+                factor = self._rng.uniform(1 - scale, 1 + scale)
+            elif self.jitter == "normal":
+                factor = self._rng.gauss(1.0, scale)
+            elif self.jitter == "lognormal":
+                factor = self._rng.lognormvariate(0.0, scale)
+            elif self.jitter == "exponential":
+                factor = self._rng.expovariate(1.0)
+            else:
+                factor = 1.0
+            failed = self.error_rate > 0 and self._rng.random() < self.error_rate
+        factor = max(factor, 0.0)
+        interval = factor / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+        return self.ttft * factor, interval, failed
+
+    def _chunk(self, text: str, vision: bool) -> AIMessageChunk:
+        content = [{"text": text}] if vision and self.vision_list_content else text
+        return AIMessageChunk(content=content)
+
+    def _usage_chunk(self, messages: List[BaseMessage], vision: bool) -> AIMessageChunk:
+        """最后一个空内容块携带 usage_metadata"""
+        content = [] if vision and self.vision_list_content else ""
+        return AIMessageChunk(content=content, usage_metadata=self._usage(messages))
+
+    def _result(self, messages: List[BaseMessage]) -> ChatResult:
+        text = "".join(self._tokens)
+        vision = _has_image(messages) and self.vision_list_content
+        message = AIMessage(
+            content=[{"text": text}] if vision else text,
+            usage_metadata=self._usage(messages),
+            response_metadata={"model_name": self.model},
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _usage(self, messages: List[BaseMessage]) -> dict:
+        input_tokens = _content_length(messages)
+        output_tokens = len(self._tokens)
+        return {"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens}
+
+    def _error(self) -> FakeLLMError:
+        return FakeLLMError(f"fake provider injected failure (model={self.model}, error_rate={self.error_rate})")
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        ttft, interval, failed = self._plan()
+        time.sleep(ttft)
+        if failed:
+            raise self._error()
+        time.sleep(interval * max(len(self._tokens) - 1, 0))
+        return self._result(messages)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        ttft, interval, failed = self._plan()
+        await asyncio.sleep(ttft)
+        if failed:
+            raise self._error()
+        await asyncio.sleep(interval * max(len(self._tokens) - 1, 0))
+        return self._result(messages)
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        ttft, interval, failed = self._plan()
+        vision = _has_image(messages)
+        started = time.perf_counter()
+        for index, token in enumerate(self._tokens):
+            # 按绝对时间表发送，避免逐 token sleep 的误差累积
+            delay = started + ttft + index * interval - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            if index == 0 and failed:
+                raise self._error()
+            chunk = ChatGenerationChunk(message=self._chunk(token, vision))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+        yield ChatGenerationChunk(message=self._usage_chunk(messages, vision))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                       **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        ttft, interval, failed = self._plan()
+        vision = _has_image(messages)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        for index, token in enumerate(self._tokens):
+            # 按绝对时间表发送，避免逐 token sleep 的误差累积；高速率下多个 token 可能在同一时刻发出
+            delay = started + ttft + index * interval - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if index == 0 and failed:
+                raise self._error()
+            chunk = ChatGenerationChunk(message=self._chunk(token, vision))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+        yield ChatGenerationChunk(message=self._usage_chunk(messages, vision))
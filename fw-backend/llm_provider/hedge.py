@@ -0,0 +1,197 @@
+"""
+跨 provider 的对冲请求（hedged requests）
+
+专家节点调用主模型后，超过对冲延迟仍未收到首个 token（非流式调用为完整响应）时，向备用模型发送同样的请求，
+先返回者胜出，另一个请求被取消（流式调用在收到首个 token 时决出胜负，之后只读取胜出方的流）。
+主模型在对冲前失败时立即改用备用模型。
+
+对冲延迟可以固定，也可以按主模型最近的首 token 延迟（非流式为总耗时）的分位数（默认 p90）自适应；
+主模型输掉时其延迟未知，按对冲决出胜负时已等待的时间记为样本（下界），避免样本偏小导致对冲越来越频繁。
+
+胜出的模型名写入返回消息（流式为第一个块）的 response_metadata["hedge_winner"]，
+调用方据此区分内容由哪个模型生成（如分析缓存按实际模型缓存）。
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from pydantic import PrivateAttr
+
+from llm_provider.wrapped import WrappedChatModel
+
+# response_metadata 中记录胜出模型名的键
+HEDGE_WINNER_KEY = "hedge_winner"
+
+
+def _tag_winner(message: AIMessage, winner: str) -> AIMessage:
+    return message.model_copy(update={"response_metadata": {**message.response_metadata, HEDGE_WINNER_KEY: winner}})
+
+
+class _StreamAttempt:
+    """向一个模型发起的流式请求，后台读取到首个有内容的块为止"""
+
+    def __init__(self, name: str, model: BaseChatModel, messages: List[BaseMessage],
+                 stop: Optional[List[str]], kwargs: Dict[str, Any]):
+        self.name = name
+        self.started = time.perf_counter()
+        self.stream = model.astream(messages, stop=stop, **kwargs)
+        self.task = asyncio.create_task(self._first())
+
+    async def _first(self) -> List[AIMessageChunk]:
+        prefix = []
+        async for chunk in self.stream:
+            prefix.append(chunk)
+            if chunk.content:
+                break
+        return prefix
+
+    def succeeded(self) -> bool:
+        return self.task.done() and not self.task.cancelled() and self.task.exception() is None
+
+    async def cancel(self) -> None:
+        if not self.task.done():
+            self.task.cancel()
+            # 只等待任务结束，不取出其异常（取消或请求失败）
+            await asyncio.wait({self.task})
+        await self.stream.aclose()
+
+
+class HedgedChatModel(WrappedChatModel):
+    """主模型（inner）慢于对冲延迟时同时请求备用模型，取先返回者"""
+
+    secondary: BaseChatModel
+    primary_name: str
+    secondary_name: str
+    # 固定的对冲延迟（秒），0 表示按主模型延迟的分位数自适应
+    delay: float = 0.0
+    initial_delay: float = 5.0
+    quantile: float = 0.9
+    window: int = 200
+    min_samples: int = 20
+
+    _samples: Dict[str, Deque[float]] = PrivateAttr()
+    _calls: int = PrivateAttr(default=0)
+    _hedged: int = PrivateAttr(default=0)
+    _fallbacks: int = PrivateAttr(default=0)
+    _failures: int = PrivateAttr(default=0)
+    _wins: Dict[str, int] = PrivateAttr()
+
+    def model_post_init(self, __context: Any) -> None:
+        self._samples = {"ttft": deque(maxlen=self.window), "latency": deque(maxlen=self.window)}
+        self._wins = {self.primary_name: 0, self.secondary_name: 0}
+
+    @property
+    def _llm_type(self) -> str:
+        return f"hedged:{self.inner._llm_type}+{self.secondary._llm_type}"
+
+    def hedge_delay(self, kind: str) -> float:
+        """当前的对冲延迟，kind 为 ttft（流式）或 latency（非流式）"""
+        if self.delay > 0:
+            return self.delay
+        samples = self._samples[kind]
+        if len(samples) < self.min_samples:
+            return self.initial_delay
+        ordered = sorted(samples)
+        return ordered[min(int(len(ordered) * self.quantile), len(ordered) - 1)]
+
+    def _record(self, kind: str, winner: str, primary_elapsed: Optional[float]) -> None:
+        self._wins[winner] += 1
+        if primary_elapsed is not None:
+            self._samples[kind].append(primary_elapsed)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取对冲率、各 provider 胜出次数和当前对冲延迟"""
+        return {
+            "primary": self.primary_name,
+            "secondary": self.secondary_name,
+            "calls": self._calls,
+            "hedged": self._hedged,
+            "hedge_rate": round(self._hedged / self._calls, 4) if self._calls else 0.0,
+            "fallbacks": self._fallbacks,
+            "failures": self._failures,
+            "wins": dict(self._wins),
+            "delay_ms": {
+                "ttft": round(self.hedge_delay("ttft") * 1000, 2),
+                "latency": round(self.hedge_delay("latency") * 1000, 2),
+            },
+        }
+
+    async def _ainvoke_inner(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                             **kwargs: Any) -> AIMessage:
+        self._calls += 1
+        started = time.perf_counter()
+        primary = asyncio.create_task(self.inner.ainvoke(messages, stop=stop, **kwargs))
+        tasks = {primary: self.primary_name}
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=self.hedge_delay("latency"))
+            if primary in done and primary.exception() is None:
+                self._record("latency", self.primary_name, time.perf_counter() - started)
+                return _tag_winner(primary.result(), self.primary_name)
+            if primary in done:
+                self._fallbacks += 1
+            else:
+                self._hedged += 1
+            secondary = asyncio.create_task(self.secondary.ainvoke(messages, stop=stop, **kwargs))
+            tasks[secondary] = self.secondary_name
+            pending = {task for task in tasks if not task.done()}
+            error: Optional[BaseException] = primary.exception() if primary.done() else None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                        continue
+                    winner = tasks[task]
+                    primary_elapsed = None if primary.done() and primary.exception() else time.perf_counter() - started
+                    self._record("latency", winner, primary_elapsed)
+                    return _tag_winner(task.result(), winner)
+            self._failures += 1
+            raise error
+        finally:
+            # 取消落败的请求并等待其结束，确保其占用的限流名额和连接在返回前释放
+            losers = [task for task in tasks if not task.done()]
+            for task in losers:
+                task.cancel()
+            if losers:
+                await asyncio.gather(*losers, return_exceptions=True)
+
+    async def _astream_inner(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                             **kwargs: Any) -> AsyncIterator[AIMessageChunk]:
+        self._calls += 1
+        primary = _StreamAttempt(self.primary_name, self.inner, messages, stop, kwargs)
+        attempts = [primary]
+        winner: Optional[_StreamAttempt] = None
+        try:
+            await asyncio.wait({primary.task}, timeout=self.hedge_delay("ttft"))
+            if primary.succeeded():
+                winner = primary
+            else:
+                if primary.task.done():
+                    self._fallbacks += 1
+                else:
+                    self._hedged += 1
+                attempts.append(_StreamAttempt(self.secondary_name, self.secondary, messages, stop, kwargs))
+                pending = {attempt.task for attempt in attempts if not attempt.task.done()}
+                while pending and winner is None:
+                    _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    # 两个同时完成时优先主模型
+                    winner = next((attempt for attempt in attempts if attempt.succeeded()), None)
+                if winner is None:
+                    self._failures += 1
+                    raise attempts[-1].task.exception() or primary.task.exception()
+            primary_failed = primary.task.done() and not primary.succeeded()
+            self._record("ttft", winner.name, None if primary_failed else time.perf_counter() - primary.started)
+            for attempt in attempts:
+                if attempt is not winner:
+                    await attempt.cancel()
+            prefix = winner.task.result()
+            for i, chunk in enumerate(prefix):
+                yield _tag_winner(chunk, winner.name) if i == 0 else chunk
+            async for chunk in winner.stream:
+                yield chunk
+        finally:
+            for attempt in attempts:
+                await attempt.cancel()
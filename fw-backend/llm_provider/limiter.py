@@ -0,0 +1,309 @@
+"""
+LLM 调用限流（按 provider:model）
+
+每个 provider:model 一个限流器，同时限制：
+- 最大并发调用数（流式调用在整个流结束前都占用一个并发）
+- 每分钟请求数（RPM）和每分钟 token 数（TPM），均为令牌桶，按每分钟额度匀速补充；
+  桶容量为 10 秒的额度（Azure 等服务按 1~10 秒的窗口统计额度，一次放出整分钟的额度同样会触发 429）
+
+排队严格先进先出：队首的调用未获准前，后面的调用不会插队（即使它需要的 token 更少），
+避免大请求被饿死。TPM 按输入字符数加上输出预留量预扣，调用结束后按 usage_metadata 的实际用量多退少补。
+限流在 GenericLLMProvider.from_provider 中套在模型外层，未配置任何限制时不包装。
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+
+from cfg.setting import get_settings
+from llm_provider.wrapped import WrappedChatModel
+from utils.unified_logger import get_logger
+
+# 每张图片预估的输入 token 数
+IMAGE_TOKENS = 1000
+# 令牌桶容量对应的秒数
+BURST_SECONDS = 10
+
+
+def estimate_tokens(messages: List[BaseMessage]) -> int:
+    """按字符数预估输入 token 数（中文约一字一 token，偏保守）"""
+    total = 0
+    for message in messages:
+        if isinstance(message.content, str):
+            total += len(message.content)
+            continue
+        for part in message.content:
+            if isinstance(part, dict) and part.get("type") in ("image", "image_url"):
+                total += IMAGE_TOKENS
+            elif isinstance(part, dict):
+                total += len(part.get("text", ""))
+            else:
+                total += len(str(part))
+    return total
+
+
+def _used_tokens(usage: Optional[Dict[str, Any]]) -> Optional[int]:
+    if not usage:
+        return None
+    total = usage.get("total_tokens")
+    return total if isinstance(total, int) else None
+
+
+class _TokenBucket:
+    """令牌桶：按每分钟额度匀速补充，容量为 BURST_SECONDS 秒的额度；余额可因实际用量超出预估而为负"""
+
+    def __init__(self, per_minute: int):
+        self.per_minute = per_minute
+        self.rate = per_minute / 60.0
+        self.capacity = max(self.rate * BURST_SECONDS, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """取出 amount 个令牌还需等待的秒数（超过容量的请求按容量计算）"""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def take(self, amount: float) -> None:
+        self.tokens -= min(amount, self.capacity)
+
+    def adjust(self, delta: float) -> None:
+        """按实际用量修正：delta 为正时多扣，为负时退还"""
+        self.tokens = min(self.capacity, self.tokens - delta)
+
+
+class _Waiter:
+    __slots__ = ("future", "tokens", "enqueued_at", "reason")
+
+    def __init__(self, future: asyncio.Future, tokens: int):
+        self.future = future
+        self.tokens = tokens
+        self.enqueued_at = time.monotonic()
+        self.reason: Optional[str] = None
+
+
+class LLMPermit:
+    """获准的一次调用，结束时交还限流器"""
+
+    __slots__ = ("tokens",)
+
+    def __init__(self, tokens: int):
+        self.tokens = tokens
+
+
+class ProviderLimiter:
+    """单个 provider:model 的限流器，0 表示对应维度不限制"""
+
+    def __init__(self, name: str, max_in_flight: int = 0, rpm: int = 0, tpm: int = 0):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.rpm = _TokenBucket(rpm) if rpm > 0 else None
+        self.tpm = _TokenBucket(tpm) if tpm > 0 else None
+        self._queue: Deque[_Waiter] = deque()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.in_flight = 0
+        self.max_queued = 0
+        self.granted = 0
+        self.throttled = {"concurrency": 0, "rpm": 0, "tpm": 0}
+        self.tokens_reserved = 0
+        self.tokens_used = 0
+        self._waits: Deque[float] = deque(maxlen=1024)
+        self._wait_total = 0.0
+
+    def _blocked_by(self, tokens: int, now: float) -> tuple[Optional[str], float]:
+        """返回队首调用被阻塞的原因和需要等待的秒数（并发限制时为 0，由 release 唤醒）"""
+        if self.max_in_flight and self.in_flight >= self.max_in_flight:
+            return "concurrency", 0.0
+        if self.rpm is not None:
+            wait = self.rpm.wait_time(1, now)
+            if wait > 0:
+                return "rpm", wait
+        if self.tpm is not None:
+            wait = self.tpm.wait_time(tokens, now)
+            if wait > 0:
+                return "tpm", wait
+        return None, 0.0
+
+    def _grant(self, waiter: _Waiter, now: float) -> None:
+        if self.rpm is not None:
+            self.rpm.take(1)
+        if self.tpm is not None:
+            self.tpm.take(waiter.tokens)
+        self.in_flight += 1
+        self.granted += 1
+        self.tokens_reserved += waiter.tokens
+        wait = now - waiter.enqueued_at
+        self._waits.append(wait)
+        self._wait_total += wait
+        waiter.future.set_result(LLMPermit(waiter.tokens))
+
+    def _pump(self) -> None:
+        """按先进先出放行队首的调用，令牌不足时定时重试"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._queue:
+            waiter = self._queue[0]
+            if waiter.future.done():
+                # 排队时已被取消
+                self._queue.popleft()
+                continue
+            now = time.monotonic()
+            reason, wait = self._blocked_by(waiter.tokens, now)
+            if reason is not None:
+                if waiter.reason is None:
+                    waiter.reason = reason
+                    self.throttled[reason] += 1
+                if wait > 0:
+                    self._timer = asyncio.get_running_loop().call_later(wait, self._pump)
+                return
+            self._queue.popleft()
+            self._grant(waiter, now)
+
+    async def acquire(self, tokens: int) -> LLMPermit:
+        """等待获准调用，tokens 为预估的 token 数"""
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), tokens)
+        self._queue.append(waiter)
+        self.max_queued = max(self.max_queued, len(self._queue))
+        self._pump()
+        try:
+            return await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # 已获准但调用方在恢复执行前被取消，交还名额
+                self.release(waiter.future.result(), None)
+            else:
+                self._pump()
+            raise
+
+    def release(self, permit: LLMPermit, used_tokens: Optional[int]) -> None:
+        """调用结束，按实际 token 用量修正 TPM 并放行下一个调用"""
+        self.in_flight -= 1
+        if used_tokens is not None:
+            self.tokens_used += used_tokens
+            if self.tpm is not None:
+                self.tpm.adjust(used_tokens - permit.tokens)
+        self._pump()
+
+    def stats(self) -> Dict[str, Any]:
+        waits = sorted(self._waits)
+
+        def pick(q: float) -> float:
+            return round(waits[min(int(len(waits) * q), len(waits) - 1)] * 1000, 2) if waits else 0.0
+
+        return {
+            "limits": {
+                "max_in_flight": self.max_in_flight,
+                "rpm": self.rpm.per_minute if self.rpm else 0,
+                "tpm": self.tpm.per_minute if self.tpm else 0,
+            },
+            "in_flight": self.in_flight,
+            "queued": sum(1 for waiter in self._queue if not waiter.future.done()),
+            "max_queued": self.max_queued,
+            "granted": self.granted,
+            "throttled": dict(self.throttled),
+            "wait_ms": {
+                "avg": round(self._wait_total / self.granted * 1000, 2) if self.granted else 0.0,
+                "p50": pick(0.5),
+                "p99": pick(0.99),
+                "max": round(waits[-1] * 1000, 2) if waits else 0.0,
+            },
+            "tokens_reserved": self.tokens_reserved,
+            "tokens_used": self.tokens_used,
+        }
+
+
+class RateLimitedChatModel(WrappedChatModel):
+    """调用被包装模型前先经过限流器"""
+
+    limiter: Any
+    output_reserve: int = 1000
+
+    @property
+    def _llm_type(self) -> str:
+        return f"limited:{self.inner._llm_type}"
+
+    async def _ainvoke_inner(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                             **kwargs: Any) -> AIMessage:
+        permit = await self.limiter.acquire(estimate_tokens(messages) + self.output_reserve)
+        used = None
+        try:
+            message = await self.inner.ainvoke(messages, stop=stop, **kwargs)
+            used = _used_tokens(message.usage_metadata)
+            return message
+        finally:
+            self.limiter.release(permit, used)
+
+    async def _astream_inner(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                             **kwargs: Any) -> AsyncIterator[AIMessageChunk]:
+        permit = await self.limiter.acquire(estimate_tokens(messages) + self.output_reserve)
+        used = None
+        try:
+            async for chunk in self.inner.astream(messages, stop=stop, **kwargs):
+                used = _used_tokens(chunk.usage_metadata) or used
+                yield chunk
+        finally:
+            self.limiter.release(permit, used)
+
+
+class LLMLimiterRegistry:
+    """按 provider:model 管理限流器 - 单例模式"""
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not self._initialized:
+            self.logger = get_logger(__name__)
+            self._limiters: Dict[str, ProviderLimiter] = {}
+            self._lock = threading.Lock()
+            self._initialized = True
+
+    def get(self, name: str) -> Optional[ProviderLimiter]:
+        """获取 provider:model 的限流器，未配置任何限制时返回 None"""
+        with self._lock:
+            limiter = self._limiters.get(name)
+            if limiter is not None:
+                return limiter
+            settings = get_settings()
+            limits = {
+                "max_in_flight": settings.llm_max_in_flight,
+                "rpm": settings.llm_rpm,
+                "tpm": settings.llm_tpm,
+                **settings.llm_limits.get(name, {}),
+            }
+            if not any(limits.values()):
+                return None
+            limiter = ProviderLimiter(name, **limits)
+            self._limiters[name] = limiter
+            self.logger.info(f"LLM {name} 已启用限流: {limits}")
+            return limiter
+
+    def wrap(self, llm: BaseChatModel, provider: str, model: Optional[str]) -> BaseChatModel:
+        """为模型套上对应的限流器，同一 provider:model 的多个实例共用一个限流器"""
+        limiter = self.get(f"{provider}:{model}")
+        if limiter is None:
+            return llm
+        return RateLimitedChatModel(inner=llm, limiter=limiter, output_reserve=get_settings().llm_output_token_reserve)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取各限流器的排队与等待统计"""
+        return {name: limiter.stats() for name, limiter in self._limiters.items()}
+
+
+# 全局 LLM 限流器注册表
+llm_limiters = LLMLimiterRegistry()
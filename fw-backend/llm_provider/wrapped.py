@@ -0,0 +1,75 @@
+"""
+包装其他聊天模型的基类
+
+ServiceManager 构建的 fast_llm / vision_llm 可以被包装一层（录制回放、限流、对冲请求等），
+包装后仍是 BaseChatModel，FateGraph 中的 ainvoke / astream 调用方式不变。
+子类只需重写 _ainvoke_inner / _astream_inner 两个钩子；同步接口直接转发给被包装的模型。
+"""
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import ConfigDict
+
+
+class WrappedChatModel(BaseChatModel):
+    """包装一个聊天模型，默认行为是原样转发"""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    inner: BaseChatModel
+
+    @property
+    def _llm_type(self) -> str:
+        return f"wrapped:{self.inner._llm_type}"
+
+    @property
+    def _identifying_params(self) -> dict:
+        return {"inner": self.inner._llm_type, **getattr(self.inner, "_identifying_params", {})}
+
+    def unwrap(self) -> BaseChatModel:
+        """返回最内层的模型"""
+        inner = self.inner
+        while isinstance(inner, WrappedChatModel):
+            inner = inner.inner
+        return inner
+
+    async def _ainvoke_inner(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                             **kwargs: Any) -> AIMessage:
+        """非流式调用的钩子"""
+        return await self.inner.ainvoke(messages, stop=stop, **kwargs)
+
+    async def _astream_inner(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                             **kwargs: Any) -> AsyncIterator[AIMessageChunk]:
+        """流式调用的钩子，被包装的模型不支持流式时由其退化为一次返回"""
+        async for chunk in self.inner.astream(messages, stop=stop, **kwargs):
+            yield chunk
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        message = await self._ainvoke_inner(messages, stop=stop, **kwargs)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                       **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        async for chunk in self._astream_inner(messages, stop=stop, **kwargs):
+            generation = ChatGenerationChunk(message=chunk)
+            if run_manager:
+                await run_manager.on_llm_new_token(generation.text, chunk=generation)
+            yield generation
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        message = self.inner.invoke(messages, stop=stop, **kwargs)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        for chunk in self.inner.stream(messages, stop=stop, **kwargs):
+            generation = ChatGenerationChunk(message=chunk)
+            if run_manager:
+                run_manager.on_llm_new_token(generation.text, chunk=generation)
+            yield generation
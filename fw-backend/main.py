@@ -5,7 +5,9 @@ from contextlib import asynccontextmanager
 from api.fate import router as supervisor_router
 from api.expert import router as expert_router
 from api.chat import router as chat_router
+from api.bazi import router as bazi_router
 from cfg.setting import get_settings
+from infrastructure.parlant_client import parlant_client
 from infrastructure.service_manager import service_manager
 from services.chat_service import chat_service
 from utils.unified_logger import initialize_logging, get_logger
@@ -36,6 +38,9 @@ async def lifespan(app: FastAPI):
     else:
         logger.info("服务初始化完成")
     
+    # 创建访问 parlant 的共享 HTTP 客户端（连接池），聊天服务的所有请求复用该客户端
+    await parlant_client.start()
+    
     # 初始化聊天服务
     # 注意：parlant Server 需要单独运行（通过 parlant_server.py 启动）
     logger.info("正在初始化聊天服务...")
@@ -51,6 +56,7 @@ async def lifespan(app: FastAPI):
     
     # 清理聊天服务
     await chat_service.cleanup()
+    await parlant_client.close()
     
     logger.info("服务清理完成")
 
@@ -73,6 +79,7 @@ app.add_middleware(
 app.include_router(supervisor_router)
 app.include_router(expert_router)
 app.include_router(chat_router)
+app.include_router(bazi_router)
 
 
 if __name__ == "__main__":
@@ -5,6 +5,7 @@ from cfg.setting import get_settings
 _SUPPORTED_PROVIDERS = {
     "azure_openai",
     "dashscope",
+    "fake",
 }
 
 
@@ -28,6 +29,10 @@ class Embeddings:
                     model=model,
                     dashscope_api_key=settings.dashscope_api_key,
                     **embedding_kwargs)
+            case "fake":
+                # 离线压测用：按文本哈希生成确定性向量，维度与 InMemoryStore 的索引一致
+                from langchain_core.embeddings import DeterministicFakeEmbedding
+                _embeddings = DeterministicFakeEmbedding(size=embedding_kwargs.get("size", 1024))
             case _:
                 raise Exception("Embedding not found.")
 
@@ -18,6 +18,7 @@ import os
 import sys
 import parlant.sdk as p
 from tools.bazi_tools import tian_gan_di_zhi
+from tools.lunar_calendar import parse_lunar_datetime
 import datetime
 
 
@@ -59,24 +60,24 @@ async def get_bazi_by_lunar(context: p.ToolContext, lunar: str) -> p.ToolResult:
     """
     date_str = str(lunar).strip()
     
-    # 首先尝试直接解析标准格式
+    # 解析农历日期并转换为公历
     try:
-        date_formats = "%Y-%m-%d %H:%M"
-        parsed_datetime = datetime.datetime.strptime(date_str, date_formats)
+        parsed_datetime = parse_lunar_datetime(date_str)
     except ValueError:
-        return p.ToolResult([f"抱歉，老夫未能识别您提供的日期格式：{date_str}。\n请提供标准的日期时间格式，例如：1949-12-12 06:15。"])
+        return p.ToolResult([f"抱歉，老夫未能识别您提供的日期格式：{date_str}。\n请提供标准的农历日期时间格式，例如：1949-12-12 06:15，闰月写作 2023-闰2-15 06:15。"])
     
     # 提取年月日时
     year = parsed_datetime.year
     month = parsed_datetime.month
     day = parsed_datetime.day
     hour = parsed_datetime.hour
+    minute = parsed_datetime.minute
 
     # 计算八字
-    year_zhu, month_zhu, day_zhu, hour_zhu = tian_gan_di_zhi(year, month, day, hour)
+    year_zhu, month_zhu, day_zhu, hour_zhu = tian_gan_di_zhi(year, month, day, hour, minute)
     
     # 更传统的八字展示格式
-    bazi_info = f"""八字排盘：
+    bazi_info = f"""八字排盘（公历 {parsed_datetime.strftime('%Y-%m-%d %H:%M')}）：
 年柱：{year_zhu}
 月柱：{month_zhu}
 日柱：{day_zhu}
@@ -0,0 +1,170 @@
+"""
+八字批量计算服务层
+处理批量导入出生时间的四柱计算，不调用 LLM
+"""
+import asyncio
+import codecs
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Any, AsyncIterator, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from starlette.datastructures import UploadFile
+
+from tools.bazi_tools import tian_gan_di_zhi, tian_gan_di_zhi_batch
+from utils.unified_logger import get_logger
+
+logger = get_logger(__name__)
+
+# 每批处理的行数
+BATCH_ROWS = 50_000
+# 开始流式响应前检查编码时读取的字节数
+ENCODING_PROBE_BYTES = 64 * 1024
+
+
+class BaziService:
+    """八字批量计算服务"""
+
+    def _parse_rows(self, header: List[str], rows: List[List[str]]) -> Tuple[List[int], List[int], List[int], List[int], List[int], List[Optional[str]]]:
+        """
+        解析 CSV 行为年、月、日、时、分五列（公历，北京时间）
+        支持 birth_time 列（格式 %Y-%m-%d %H:%M），或 year、month、day、hour 四列及可选的 minute 列
+        无法解析的行记录错误信息，数值置为 0（批量计算时视为非法行）
+        """
+        columns = {name: i for i, name in enumerate(header)}
+        years, months, days, hours, minutes, errors = [], [], [], [], [], []
+        for row in rows:
+            try:
+                if "birth_time" in columns:
+                    parsed = datetime.strptime(row[columns["birth_time"]].strip(), "%Y-%m-%d %H:%M")
+                    values = (parsed.year, parsed.month, parsed.day, parsed.hour, parsed.minute)
+                else:
+                    values = tuple(int(row[columns[name]]) for name in ("year", "month", "day", "hour"))
+                    values += (int(row[columns["minute"]]) if "minute" in columns else 0,)
+                error = None
+            except (ValueError, IndexError, KeyError) as e:
+                values = (0, 0, 0, 0, 0)
+                error = f"无法解析: {e}"
+            years.append(values[0])
+            months.append(values[1])
+            days.append(values[2])
+            hours.append(values[3])
+            minutes.append(values[4])
+            errors.append(error)
+        return years, months, days, hours, minutes, errors
+
+    def _compute_lines(self, header: List[str], rows: List[List[str]], start_row: int) -> str:
+        """计算一批行的四柱，返回 NDJSON 文本"""
+        years, months, days, hours, minutes, errors = self._parse_rows(header, rows)
+        year_zhu, month_zhu, day_zhu, hour_zhu = tian_gan_di_zhi_batch(years, months, days, hours, minutes)
+        id_index = header.index("id") if "id" in header else None
+
+        lines = []
+        for i in range(len(rows)):
+            result: Dict[str, Any] = {"row": start_row + i}
+            if id_index is not None and id_index < len(rows[i]):
+                result["id"] = rows[i][id_index]
+            pillars = (year_zhu[i], month_zhu[i], day_zhu[i], hour_zhu[i])
+            if errors[i] is None and not pillars[0]:
+                # 年份超出范围或日期非法，逐行计算以得到具体错误
+                try:
+                    pillars = tian_gan_di_zhi(years[i], months[i], days[i], hours[i], minutes[i])
+                except ValueError as e:
+                    errors[i] = f"日期非法: {e}"
+            if errors[i] is not None:
+                result["error"] = errors[i]
+            else:
+                result.update(year_zhu=pillars[0], month_zhu=pillars[1], day_zhu=pillars[2], hour_zhu=pillars[3])
+            lines.append(json.dumps(result, ensure_ascii=False))
+        return "\n".join(lines) + "\n"
+
+    def _iter_batches(self, raw: BinaryIO) -> Iterator[List[List[str]]]:
+        """
+        按批读取 CSV 行，由 csv.reader 直接迭代文本流，不一次性读入内存
+        newline="" 交给 csv 模块处理换行，带引号字段中的换行和 \r\n 都能正确解析
+        解码或解析出错时先返回出错前已读取的行，再抛出异常
+        """
+        text = io.TextIOWrapper(raw, encoding="utf-8-sig", newline="")
+        batch: List[List[str]] = []
+        try:
+            for row in csv.reader(text):
+                if not any(field.strip() for field in row):
+                    continue
+                batch.append(row)
+                if len(batch) >= BATCH_ROWS:
+                    yield batch
+                    batch = []
+        except (UnicodeDecodeError, csv.Error):
+            if batch:
+                yield batch
+            raise
+        else:
+            if batch:
+                yield batch
+        finally:
+            # 不关闭上传文件本身，由 UploadFile 负责
+            text.detach()
+
+    def _probe_encoding(self, raw: BinaryIO) -> None:
+        """读取文件开头检查是否为 UTF-8，读取后恢复文件位置"""
+        head = raw.read(ENCODING_PROBE_BYTES)
+        raw.seek(0)
+        # final=False：开头片段末尾被截断的多字节字符不算错误
+        codecs.getincrementaldecoder("utf-8-sig")().decode(head, final=False)
+
+    async def check_encoding(self, file: UploadFile) -> None:
+        """开始流式响应前检查上传文件的编码，不是 UTF-8 时返回 400"""
+        try:
+            await asyncio.to_thread(self._probe_encoding, file.file)
+        except UnicodeDecodeError:
+            raise HTTPException(status_code=400, detail="CSV 文件需要使用 UTF-8 编码（Excel 请另存为“CSV UTF-8”）")
+
+    async def _read_rows(self, file: UploadFile) -> AsyncIterator[List[List[str]]]:
+        """按批读取上传的 CSV 文件，读取和解析在线程池中执行"""
+        batches = self._iter_batches(file.file)
+        while True:
+            batch = await asyncio.to_thread(next, batches, None)
+            if batch is None:
+                break
+            yield batch
+
+    async def batch_from_csv(self, file: UploadFile) -> AsyncIterator[str]:
+        """
+        流式计算 CSV 中每行出生时间的四柱，逐批返回 NDJSON
+        第一行为表头；文件中途出现编码或 CSV 格式错误时，以一行 {"error", "row"} 结束响应
+        """
+        header: Optional[List[str]] = None
+        row_count = 0
+        try:
+            async for rows in self._read_rows(file):
+                if header is None:
+                    header = [name.strip().lower() for name in rows[0]]
+                    rows = rows[1:]
+                    if "birth_time" not in header and not {"year", "month", "day", "hour"} <= set(header):
+                        yield json.dumps({"error": "CSV 表头需要包含 birth_time 列，或 year、month、day、hour 四列"}, ensure_ascii=False) + "\n"
+                        return
+                if rows:
+                    yield await asyncio.to_thread(self._compute_lines, header, rows, row_count)
+                    row_count += len(rows)
+        except UnicodeDecodeError as e:
+            logger.warning(f"批量八字计算中止，第 {row_count} 行解码失败: {e}")
+            yield json.dumps({"error": f"CSV 文件需要使用 UTF-8 编码: {e}", "row": row_count}, ensure_ascii=False) + "\n"
+            return
+        except csv.Error as e:
+            logger.warning(f"批量八字计算中止，第 {row_count} 行 CSV 格式错误: {e}")
+            yield json.dumps({"error": f"CSV 格式错误: {e}", "row": row_count}, ensure_ascii=False) + "\n"
+            return
+        logger.info(f"批量八字计算完成，共 {row_count} 行")
+
+    def create_ndjson_response(self, stream_generator: AsyncIterator[str]) -> StreamingResponse:
+        """
+        创建 NDJSON 流式响应
+        """
+        return StreamingResponse(
+            stream_generator,
+            media_type="application/x-ndjson",
+            headers={"Cache-Control": "no-cache"}
+        )
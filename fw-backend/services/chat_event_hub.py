@@ -0,0 +1,252 @@
+"""
+聊天事件推送中心
+
+每个会话只保留一个到 Parlant 的上游长轮询，取到的事件按 offset 存入会话的环形缓冲区，
+再推送给该会话的所有订阅者（多个标签页共享同一个上游轮询）。订阅者可从任意 min_offset
+开始订阅：缓冲区中已有的事件直接返回，早于缓冲区的事件向上游补取一次。
+最后一个订阅者离开后，上游轮询在短暂保留期后停止，空闲会话不占用任何上游连接；
+上游返回会话不存在（404）时停止轮询并结束所有订阅
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Set
+
+from cfg.setting import get_settings
+from services.chat_service import chat_service
+from utils.unified_logger import get_logger
+
+logger = get_logger(__name__)
+
+# Agent 处理完一轮对话后的状态
+TURN_END_STATUSES = ("ready", "cancelled", "error")
+
+
+def _event_offset(event: Dict[str, Any]) -> Optional[int]:
+    offset = event.get("offset")
+    return offset if isinstance(offset, int) else None
+
+
+class _SessionChannel:
+    """单个会话的事件缓冲区、订阅者计数和上游轮询任务"""
+
+    def __init__(self, session_id: str, agent_id: str, start_offset: int, buffer_size: int):
+        self.session_id = session_id
+        self.agent_id = agent_id
+        self.events: Deque[Dict[str, Any]] = deque(maxlen=buffer_size)
+        # 缓冲区覆盖的起始 offset（更早的事件需要向上游补取）和下一次轮询的 offset
+        self.buffer_start = start_offset
+        self.next_offset = start_offset
+        self.subscribers = 0
+        self.changed = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.stop_handle: Optional[asyncio.TimerHandle] = None
+        self.closed = False
+
+    def close(self) -> None:
+        """会话不存在：标记关闭并唤醒所有订阅者，订阅者取完缓冲区后结束"""
+        self.closed = True
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+    def append(self, events: List[Dict[str, Any]]) -> int:
+        """追加上游事件（跳过重复的 offset），唤醒所有订阅者，返回新增数量"""
+        added = 0
+        for event in events:
+            offset = _event_offset(event)
+            if offset is None or offset < self.next_offset:
+                continue
+            if len(self.events) == self.events.maxlen:
+                self.buffer_start = _event_offset(self.events[1]) if len(self.events) > 1 else offset
+            self.events.append(event)
+            self.next_offset = offset + 1
+            added += 1
+        if added:
+            # 替换事件对象，已在等待的订阅者被唤醒，之后的订阅者等待新的事件对象
+            changed, self.changed = self.changed, asyncio.Event()
+            changed.set()
+        return added
+
+    def since(self, offset: int) -> List[Dict[str, Any]]:
+        """缓冲区中 offset 不小于给定值的事件"""
+        if not self.events or offset >= self.next_offset:
+            return []
+        return [event for event in self.events if _event_offset(event) >= offset]
+
+
+class ChatEventHub:
+    """聊天事件推送中心 - 单例模式"""
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not self._initialized:
+            self.logger = get_logger(__name__)
+            self._channels: Dict[str, _SessionChannel] = {}
+            self.upstream_polls = 0
+            self.backfills = 0
+            self.events_received = 0
+            self.events_delivered = 0
+            self._initialized = True
+
+    def _join(self, session_id: str, agent_id: str, min_offset: int) -> _SessionChannel:
+        channel = self._channels.get(session_id)
+        if channel is None:
+            channel = _SessionChannel(session_id, agent_id, min_offset, get_settings().chat_stream_buffer_size)
+            self._channels[session_id] = channel
+        if channel.stop_handle is not None:
+            channel.stop_handle.cancel()
+            channel.stop_handle = None
+        channel.subscribers += 1
+        if channel.task is None or channel.task.done():
+            channel.task = asyncio.create_task(self._poll_loop(channel))
+        return channel
+
+    def _leave(self, channel: _SessionChannel) -> None:
+        channel.subscribers -= 1
+        if channel.subscribers > 0:
+            return
+        # 最后一个订阅者离开后保留一段时间，页面刷新重连时不必重新建立上游轮询
+        grace = get_settings().chat_stream_idle_grace
+        channel.stop_handle = asyncio.get_running_loop().call_later(grace, self._stop, channel)
+
+    def _stop(self, channel: _SessionChannel) -> None:
+        if channel.subscribers > 0:
+            return
+        if channel.task is not None:
+            channel.task.cancel()
+        if self._channels.get(channel.session_id) is channel:
+            del self._channels[channel.session_id]
+        self.logger.info(f"会话 {channel.session_id} 已无订阅者，停止上游轮询")
+
+    async def _poll_loop(self, channel: _SessionChannel) -> None:
+        """上游长轮询：每个会话只有一个，出错时退避重试；会话不存在时关闭通道并停止"""
+        settings = get_settings()
+        backoff = 1.0
+        while True:
+            started = time.monotonic()
+            try:
+                self.upstream_polls += 1
+                events = await chat_service.list_events(
+                    channel.session_id, channel.agent_id,
+                    min_offset=channel.next_offset, wait_for_data=settings.chat_stream_poll_wait,
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.warning(f"会话 {channel.session_id} 上游轮询失败，{backoff:.0f} 秒后重试: {e}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+                continue
+            added = channel.append(events)
+            self.events_received += added
+            if added:
+                backoff = 1.0
+            elif chat_service.is_session_missing(channel.session_id):
+                # list_events 对 404 返回空列表并记录会话不存在
+                self.logger.info(f"会话 {channel.session_id} 不存在，停止上游轮询并关闭订阅")
+                channel.close()
+                if self._channels.get(channel.session_id) is channel:
+                    del self._channels[channel.session_id]
+                return
+            elif time.monotonic() - started < settings.chat_stream_poll_wait / 2:
+                # 没有等满长轮询时间就返回了空结果，避免空转
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+
+    async def _backfill(self, channel: _SessionChannel, cursor: int) -> List[Dict[str, Any]]:
+        """补取早于缓冲区起点的事件"""
+        self.backfills += 1
+        events = await chat_service.list_events(channel.session_id, channel.agent_id, min_offset=cursor, wait_for_data=0)
+        return [event for event in events if (_event_offset(event) or 0) < channel.buffer_start]
+
+    async def subscribe(self, session_id: str, agent_id: str, min_offset: int = 0,
+                        kinds: Optional[List[str]] = None) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """
+        订阅会话事件，从 min_offset 开始按 offset 顺序返回
+        超过 chat_stream_heartbeat 秒没有新事件时返回 None，调用方据此发送心跳；
+        会话不存在时结束迭代；调用方停止迭代（如客户端断开）后自动退订
+        """
+        heartbeat = get_settings().chat_stream_heartbeat
+        channel = self._join(session_id, agent_id, min_offset)
+        cursor = min_offset
+        kind_filter: Optional[Set[str]] = set(kinds) if kinds else None
+        try:
+            while True:
+                if cursor < channel.buffer_start:
+                    events = await self._backfill(channel, cursor)
+                    cursor = channel.buffer_start
+                else:
+                    changed = channel.changed
+                    events = channel.since(cursor)
+                    if not events:
+                        if channel.closed:
+                            return
+                        try:
+                            await asyncio.wait_for(changed.wait(), timeout=heartbeat)
+                        except asyncio.TimeoutError:
+                            yield None
+                        continue
+                for event in events:
+                    offset = _event_offset(event)
+                    if offset is not None:
+                        cursor = max(cursor, offset + 1)
+                    if kind_filter is None or event.get("kind") in kind_filter:
+                        self.events_delivered += 1
+                        yield event
+        finally:
+            self._leave(channel)
+
+    async def stream_turn(self, session_id: str, agent_id: str,
+                          customer_event: Dict[str, Any]) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """
+        返回一轮对话中 Agent 对 customer_event 的回复事件，Agent 进入结束状态
+        （TURN_END_STATUSES）或超过 chat_turn_timeout 后结束；心跳同 subscribe 返回 None。
+        customer_event 为 create_event 的返回值，有 offset 时从其下一个事件开始订阅，
+        否则从头订阅并跳过该事件及之前的事件
+        """
+        offset = customer_event.get("offset")
+        event_id = customer_event.get("id")
+        seen_customer_event = isinstance(offset, int)
+        deadline = time.monotonic() + get_settings().chat_turn_timeout
+        subscription = self.subscribe(session_id, agent_id, min_offset=offset + 1 if seen_customer_event else 0)
+        try:
+            async for event in subscription:
+                if time.monotonic() > deadline:
+                    self.logger.warning(f"会话 {session_id} 等待 Agent 回复超时")
+                    return
+                if event is None:
+                    yield None
+                    continue
+                if not seen_customer_event:
+                    seen_customer_event = event.get("id") == event_id
+                    continue
+                if event.get("source") == "customer":
+                    continue
+                yield event
+                if event.get("kind") == "status" and (event.get("data") or {}).get("status") in TURN_END_STATUSES:
+                    return
+        finally:
+            await subscription.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        """获取推送统计"""
+        return {
+            "sessions": len(self._channels),
+            "subscribers": sum(channel.subscribers for channel in self._channels.values()),
+            "buffered_events": sum(len(channel.events) for channel in self._channels.values()),
+            "upstream_polls": self.upstream_polls,
+            "backfills": self.backfills,
+            "events_received": self.events_received,
+            "events_delivered": self.events_delivered,
+        }
+
+
+# 全局聊天事件推送中心实例
+chat_event_hub = ChatEventHub()
@@ -1,11 +1,17 @@
 """
 聊天服务 - 使用 Parlant 框架
+
+会话是否存在的检查结果带 TTL 缓存（404 结果使用较短的有效期），创建会话、发送消息、
+获取事件时顺带更新缓存；Agent ID 由后台任务定期刷新，并发获取时只向 Parlant 发一次请求
 """
 import asyncio
 from typing import Optional, Dict, Any
 import httpx
 import parlant.sdk as p
+from cfg.setting import get_settings
+from infrastructure.parlant_client import parlant_client
 from utils.fix_json_encoding import fix_parlant_json_encoding
+from utils.ttl_cache import TTLCache
 from utils.unified_logger import get_logger
 
 # 修复 JSON 编码问题
@@ -33,6 +39,13 @@ class ChatService:
     def __init__(self):
         if not self._initialized:
             self.logger = get_logger(__name__)
+            self._session_cache: Optional[TTLCache] = None
+            self._agent_fetch: Optional[asyncio.Task] = None
+            self._agent_refresh_task: Optional[asyncio.Task] = None
+            self.session_cache_hits = 0
+            self.session_cache_misses = 0
+            self.agent_fetches = 0
+            self.agent_fetches_coalesced = 0
             self._initialized = True
     
     async def initialize(self) -> bool:
@@ -44,9 +57,10 @@ class ChatService:
         try:
             self.logger.info("正在初始化 Parlant 服务连接...")
             
-            # parlant Server 应该单独运行在 8800 端口
-            # 我们只需要配置 Server URL，不需要启动 Server
-            self._server_url = "http://localhost:8800"
+            # parlant Server 应该单独运行（默认 8800 端口）
+            # 我们只需要配置 Server URL，不需要启动 Server；
+            # 所有请求通过 lifespan 中创建的共享客户端（infrastructure.parlant_client）发送
+            self._server_url = parlant_client.base_url
             
             # 测试连接，确保 parlant Server 正在运行
             self.logger.info(f"正在测试 parlant Server 连接: {self._server_url}")
@@ -55,15 +69,13 @@ class ChatService:
             
             for i in range(max_retries):
                 try:
-                    async with httpx.AsyncClient() as client:
-                        # 尝试访问 parlant 的根路径
-                        test_response = await client.get(
-                            f"{self._server_url}/",
-                            timeout=5.0
-                        )
-                        self.logger.info(f"✅ Parlant 服务器连接测试成功，状态码: {test_response.status_code}")
-                        connected = True
-                        break
+                    # 尝试访问 parlant 的根路径
+                    test_response = await parlant_client.request(
+                        "probe", "GET", "/", timeout=parlant_client.timeout("probe")
+                    )
+                    self.logger.info(f"✅ Parlant 服务器连接测试成功，状态码: {test_response.status_code}")
+                    connected = True
+                    break
                 except httpx.ConnectError as e:
                     if i < max_retries - 1:
                         wait_time = min(i + 1, 2)  # 等待 1s, 2s, 2s...
@@ -73,7 +85,7 @@ class ChatService:
                         self.logger.error(f"❌ Parlant 服务器连接失败: {e}")
                         self.logger.error("💡 请先启动 parlant Server:")
                         self.logger.error("   运行: python parlant_server.py")
-                        self.logger.error("   确保 parlant Server 在 http://localhost:8800 运行")
+                        self.logger.error(f"   确保 parlant Server 在 {self._server_url} 运行")
                         self.logger.error("   查看日志: tail -f parlant-data/parlant.log")
                         # 不抛出异常，允许继续运行（用户可能稍后启动 Server）
                         self.logger.warning("⚠️ 继续运行，但聊天功能将无法使用，直到 parlant Server 启动")
@@ -83,27 +95,18 @@ class ChatService:
             
             if connected:
                 self.logger.info(f"✅ Parlant 服务器连接成功，URL: {self._server_url}")
-                # 尝试获取 agent ID
-                try:
-                    async with httpx.AsyncClient() as client:
-                        response = await client.get(
-                            f"{self._server_url}/agents",
-                            timeout=5.0
-                        )
-                        response.raise_for_status()
-                        agents = response.json()
-                        if isinstance(agents, list) and len(agents) > 0:
-                            self._cached_agent_id = agents[0].get("id")
-                            self.logger.info(f"✅ 获取到 Agent ID: {self._cached_agent_id}")
-                        else:
-                            self.logger.warning("⚠️ Parlant 服务器没有可用的 Agent")
-                except Exception as e:
-                    self.logger.warning(f"⚠️ 获取 Agent ID 失败: {e}，将在首次使用时获取")
+                # 尝试获取 agent ID，失败时由后台刷新任务重试
+                if not await self.fetch_agent_id():
+                    self.logger.warning("⚠️ 暂未获取到 Agent ID，将在后台定期重试")
             else:
                 self.logger.warning("⚠️ 无法连接到 parlant Server")
                 self.logger.warning(f"⚠️ Server URL: {self._server_url}")
                 self.logger.warning("💡 请运行: python parlant_server.py 启动 parlant Server")
             
+            # 后台定期刷新 Agent ID（启动时 Server 未就绪也能在其启动后自动获取）
+            if self._agent_refresh_task is None or self._agent_refresh_task.done():
+                self._agent_refresh_task = asyncio.create_task(self._agent_refresh_loop())
+            
             self.logger.info("✅ Parlant 服务初始化完成")
             return True
             
@@ -116,7 +119,12 @@ class ChatService:
     async def cleanup(self):
         """清理资源"""
         try:
-            # 由于 parlant Server 是单独运行的，我们不需要清理它
+            # 由于 parlant Server 是单独运行的，我们不需要清理它，只需停止后台刷新任务
+            for task in (self._agent_refresh_task, self._agent_fetch):
+                if task is not None and not task.done():
+                    task.cancel()
+            self._agent_refresh_task = None
+            self._agent_fetch = None
             self._server = None
             self._agent = None
             self._server_context = None
@@ -147,30 +155,72 @@ class ChatService:
         return None
     
     async def fetch_agent_id(self) -> Optional[str]:
-        """从 Parlant 服务器获取 Agent ID"""
+        """
+        从 Parlant 服务器获取 Agent ID
+        并发调用共享同一个进行中的请求（single-flight），大量页面同时加载时只请求一次 /agents
+        """
+        if self._agent_fetch is None or self._agent_fetch.done():
+            self.agent_fetches += 1
+            self._agent_fetch = asyncio.create_task(self._fetch_agent_id())
+        else:
+            self.agent_fetches_coalesced += 1
+        # shield：单个调用方被取消（如客户端断开）时不影响其他等待同一请求的调用方
+        return await asyncio.shield(self._agent_fetch)
+    
+    async def _agent_refresh_loop(self) -> None:
+        """后台刷新 Agent ID：未获取到时按重试间隔重试，获取到后按刷新间隔更新"""
+        settings = get_settings()
+        while True:
+            interval = settings.chat_agent_refresh_interval if self._cached_agent_id else settings.chat_agent_retry_interval
+            await asyncio.sleep(interval)
+            try:
+                await self.fetch_agent_id()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.warning(f"后台刷新 Agent ID 失败: {e}")
+    
+    async def _fetch_agent_id(self) -> Optional[str]:
+        """请求 /agents 获取 Agent ID，失败时保留已缓存的值"""
         try:
             if not self._server_url:
                 return None
             
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self._server_url}/agents",
-                    timeout=5.0
-                )
-                response.raise_for_status()
-                agents = response.json()
-                if isinstance(agents, list) and len(agents) > 0:
-                    agent_id = agents[0].get("id")
-                    # 缓存 agent_id
-                    self._cached_agent_id = agent_id
+            response = await parlant_client.request(
+                "list_agents", "GET", "/agents", timeout=parlant_client.timeout("probe")
+            )
+            response.raise_for_status()
+            agents = response.json()
+            if isinstance(agents, list) and len(agents) > 0:
+                agent_id = agents[0].get("id")
+                # 缓存 agent_id
+                if agent_id != self._cached_agent_id:
                     self.logger.info(f"✅ 获取到 Agent ID: {agent_id}")
-                    return agent_id
-                else:
-                    self.logger.warning("⚠️ Parlant 服务器没有可用的 Agent")
-                    return None
+                self._cached_agent_id = agent_id
+                return agent_id
+            else:
+                self.logger.warning("⚠️ Parlant 服务器没有可用的 Agent")
+                return self._cached_agent_id
         except Exception as e:
             self.logger.error(f"获取 Agent ID 失败: {e}")
-            return None
+            return self._cached_agent_id
+    
+    def _get_session_cache(self) -> TTLCache:
+        if self._session_cache is None:
+            settings = get_settings()
+            self._session_cache = TTLCache(settings.chat_session_cache_size, settings.chat_session_cache_ttl)
+        return self._session_cache
+    
+    def _mark_session(self, session_id: str, exists: bool) -> None:
+        """记录会话是否存在，不存在的结果使用较短的有效期（会话随后可能被创建）"""
+        if not session_id:
+            return
+        ttl = None if exists else get_settings().chat_session_negative_ttl
+        self._get_session_cache().set(session_id, exists, ttl=ttl)
+    
+    def is_session_missing(self, session_id: str) -> bool:
+        """会话是否已确认不存在（最近一次请求返回 404 且仍在缓存有效期内）"""
+        return self._get_session_cache().get(session_id) is False
     
     async def create_session(self, agent_id: str, customer_id: Optional[str] = None, title: Optional[str] = None) -> Dict[str, Any]:
         """创建会话 - 通过 HTTP 调用 parlant REST API"""
@@ -182,32 +232,31 @@ class ChatService:
                 raise RuntimeError("Server URL 未初始化")
             
             # 通过 HTTP 请求调用 parlant 的 REST API
-            async with httpx.AsyncClient() as client:
-                payload = {
-                    "agent_id": agent_id,
-                }
-                if customer_id:
-                    payload["customer_id"] = customer_id
-                if title:
-                    payload["title"] = title
-                else:
-                    payload["title"] = f"聊天会话 {asyncio.get_event_loop().time()}"
-                
-                response = await client.post(
-                    f"{self._server_url}/sessions",
-                    json=payload,
-                    timeout=30.0
-                )
-                response.raise_for_status()
-                session_data = response.json()
-                
-                self.logger.info(f"会话创建成功: {session_data.get('id')}, Agent ID: {agent_id}")
-                return {
-                    "id": session_data.get("id"),
-                    "agent_id": agent_id,
-                    "customer_id": customer_id,
-                    "title": payload.get("title")
-                }
+            payload = {
+                "agent_id": agent_id,
+            }
+            if customer_id:
+                payload["customer_id"] = customer_id
+            if title:
+                payload["title"] = title
+            else:
+                payload["title"] = f"聊天会话 {asyncio.get_event_loop().time()}"
+            
+            response = await parlant_client.request(
+                "create_session", "POST", "/sessions", json=payload, timeout=parlant_client.timeout("write")
+            )
+            response.raise_for_status()
+            session_data = response.json()
+            
+            # 新会话直接记为存在，覆盖之前可能缓存的不存在结果
+            self._mark_session(session_data.get("id"), True)
+            self.logger.info(f"会话创建成功: {session_data.get('id')}, Agent ID: {agent_id}")
+            return {
+                "id": session_data.get("id"),
+                "agent_id": agent_id,
+                "customer_id": customer_id,
+                "title": payload.get("title")
+            }
         except Exception as e:
             self.logger.error(f"创建会话失败: {e}")
             raise
@@ -230,28 +279,30 @@ class ChatService:
                 payload["message"] = event_data["message"]
             
             # 通过 HTTP 请求调用 parlant 的 REST API
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self._server_url}/sessions/{session_id}/events",
-                    json=payload,
-                    timeout=30.0
-                )
-                
-                # 处理 404 错误（会话不存在）
-                if response.status_code == 404:
-                    self.logger.warning(f"会话不存在，无法创建事件: {session_id}")
-                    raise RuntimeError(f"会话不存在或已过期: {session_id}")
-                
-                response.raise_for_status()
-                event_data_resp = response.json()
-                
-                self.logger.info(f"事件创建成功: {event_data_resp.get('id')}")
-                return {
-                    "id": event_data_resp.get("id"),
-                    "session_id": session_id,
-                    "kind": payload.get("kind"),
-                    "source": payload.get("source"),
-                }
+            response = await parlant_client.request(
+                "create_event", "POST", f"/sessions/{session_id}/events",
+                json=payload, timeout=parlant_client.timeout("write"),
+            )
+            
+            # 处理 404 错误（会话不存在）
+            if response.status_code == 404:
+                self._mark_session(session_id, False)
+                self.logger.warning(f"会话不存在，无法创建事件: {session_id}")
+                raise RuntimeError(f"会话不存在或已过期: {session_id}")
+            
+            response.raise_for_status()
+            event_data_resp = response.json()
+            self._mark_session(session_id, True)
+            
+            self.logger.info(f"事件创建成功: {event_data_resp.get('id')}")
+            return {
+                "id": event_data_resp.get("id"),
+                "session_id": session_id,
+                "kind": payload.get("kind"),
+                "source": payload.get("source"),
+                # 事件在会话中的偏移量，用于只获取该事件之后的回复
+                "offset": event_data_resp.get("offset"),
+            }
         except httpx.HTTPStatusError as e:
             # 处理其他 HTTP 错误
             if e.response.status_code == 404:
@@ -270,18 +321,28 @@ class ChatService:
             raise
     
     async def check_session_exists(self, session_id: str) -> bool:
-        """检查会话是否存在"""
+        """检查会话是否存在，结果（包括 404）按 TTL 缓存，请求出错时不缓存"""
         try:
             if not self._server_url:
                 return False
             
+            cached = self._get_session_cache().get(session_id)
+            if cached is not None:
+                self.session_cache_hits += 1
+                return cached
+            self.session_cache_misses += 1
+            
             # 尝试获取会话事件列表，如果返回 404 则会话不存在
-            async with httpx.AsyncClient(timeout=5.0) as client:
-                response = await client.get(
-                    f"{self._server_url}/sessions/{session_id}/events",
-                    params={"min_offset": 0, "wait_for_data": 0},
-                )
-                return response.status_code != 404
+            response = await parlant_client.request(
+                "check_session", "GET", f"/sessions/{session_id}/events",
+                params={"min_offset": 0, "wait_for_data": 0}, timeout=parlant_client.timeout("probe"),
+            )
+            if response.status_code == 404:
+                self._mark_session(session_id, False)
+                return False
+            if response.is_success:
+                self._mark_session(session_id, True)
+            return True
         except Exception as e:
             self.logger.warning(f"检查会话是否存在时出错: {e}")
             return False
@@ -300,36 +361,37 @@ class ChatService:
             if kinds:
                 params["kinds"] = kinds
             
-            # 通过 HTTP 请求调用 parlant 的 REST API
-            async with httpx.AsyncClient(timeout=wait_for_data + 10.0) as client:
-                response = await client.get(
-                    f"{self._server_url}/sessions/{session_id}/events",
-                    params=params,
-                )
-                
-                # 处理 404 错误（会话不存在）
-                if response.status_code == 404:
-                    self.logger.warning(f"会话不存在: {session_id}")
-                    # 返回空列表而不是抛出异常，允许前端处理
-                    return []
-                
-                response.raise_for_status()
-                data = response.json()
-                
-                # 解析返回的数据
-                if isinstance(data, list):
-                    return data
-                elif isinstance(data, dict):
-                    if "events" in data:
-                        return data["events"]
-                    elif "items" in data:
-                        return data["items"]
-                    elif "data" in data:
-                        return data["data"] if isinstance(data["data"], list) else [data["data"]]
-                    else:
-                        return [data]
+            # 通过 HTTP 请求调用 parlant 的 REST API（长轮询，读超时为 wait_for_data 加余量）
+            response = await parlant_client.request(
+                "list_events", "GET", f"/sessions/{session_id}/events",
+                params=params, timeout=parlant_client.timeout("poll", wait_for_data),
+            )
+            
+            # 处理 404 错误（会话不存在）
+            if response.status_code == 404:
+                self._mark_session(session_id, False)
+                self.logger.warning(f"会话不存在: {session_id}")
+                # 返回空列表而不是抛出异常，允许前端处理
+                return []
+            
+            response.raise_for_status()
+            data = response.json()
+            self._mark_session(session_id, True)
+            
+            # 解析返回的数据
+            if isinstance(data, list):
+                return data
+            elif isinstance(data, dict):
+                if "events" in data:
+                    return data["events"]
+                elif "items" in data:
+                    return data["items"]
+                elif "data" in data:
+                    return data["data"] if isinstance(data["data"], list) else [data["data"]]
                 else:
-                    return []
+                    return [data]
+            else:
+                return []
         except httpx.HTTPStatusError as e:
             # 处理其他 HTTP 错误
             if e.response.status_code == 404:
@@ -343,6 +405,19 @@ class ChatService:
         except Exception as e:
             self.logger.error(f"获取事件列表失败: {e}")
             raise
+    
+    def stats(self) -> Dict[str, Any]:
+        """获取会话缓存与 Agent ID 获取统计"""
+        return {
+            "session_cache": {
+                "size": len(self._get_session_cache()),
+                "hits": self.session_cache_hits,
+                "misses": self.session_cache_misses,
+            },
+            "agent_id": self._cached_agent_id,
+            "agent_fetches": self.agent_fetches,
+            "agent_fetches_coalesced": self.agent_fetches_coalesced,
+        }
 
 
 # 全局服务实例
@@ -2,68 +2,184 @@
 专家管理服务层
 处理专家相关的业务逻辑
 """
-import json
+import asyncio
+import copy
+import threading
+import time
 import uuid
-from pathlib import Path
-from typing import List, Dict, Any, Optional
+from types import MappingProxyType
+from typing import List, Dict, Any, Callable, Hashable, Mapping, Optional, Tuple
 
+from cfg.setting import get_settings
+from graph.graph_registry import fate_graph_registry
+from infrastructure.expert_store import create_expert_store
 from utils.unified_logger import get_logger
 
 logger = get_logger(__name__)
 
 
+class ExpertSnapshot:
+    """
+    专家配置的只读快照
+
+    专家列表和按ID的索引在创建后不再修改，写操作会生成新的快照，
+    读取方拿到的始终是一份一致的数据。返回的专家字典为共享对象，调用方不应修改。
+    version 每生成一个新快照加 1，比较版本号即可判断配置是否变化
+    """
+
+    __slots__ = ("experts", "by_id", "stamp", "version")
+
+    def __init__(self, experts: List[Dict[str, Any]], stamp: Hashable, version: int):
+        self.experts: Tuple[Dict[str, Any], ...] = tuple(experts)
+        self.by_id: Mapping[str, Dict[str, Any]] = MappingProxyType({e.get("id"): e for e in self.experts})
+        # 加载时存储的变化标记（JSON 为文件的 (mtime_ns, size)，SQLite 为 revision）
+        self.stamp = stamp
+        self.version = version
+
+
 class ExpertService:
-    """专家管理服务"""
-    
+    """
+    专家管理服务 - 单例模式，专家配置缓存在内存快照中
+
+    专家数据保存在 JSON 文件（默认）或 SQLite 中，见 infrastructure.expert_store。
+    写操作（创建、更新、删除）通过异步锁串行执行，存储写入在线程池中进行，不阻塞事件循环；
+    JSON 写入临时文件后 os.replace 替换，进程崩溃时也不会留下写了一半的文件。
+    本进程的写入直接替换内存快照；其他进程的写入按 expert_reload_interval 在线程池中检查存储的变化标记发现，
+    事件循环上的读取不访问存储。锁只在当前进程内有效，多个 worker 同时编辑专家时仍需外部协调
+    """
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
     def __init__(self):
-        # 数据文件路径 - 保存到config目录
-        self.config_dir = Path(__file__).parent.parent / "cfg"
-        self.experts_file = self.config_dir / "experts.json"
-        # 确保config目录存在
-        self.config_dir.mkdir(exist_ok=True)
-    
+        if not self._initialized:
+            # 存储后端，首次使用时按配置创建
+            self.store = None
+            self._snapshot: Optional[ExpertSnapshot] = None
+            self._load_lock = threading.Lock()
+            self._write_lock = asyncio.Lock()
+            self._version = 0
+            self._checked_at = 0.0
+            self._refresh_task: Optional[asyncio.Task] = None
+            self.reloads = 0
+            self.writes = 0
+            self._initialized = True
+
+    def _get_store(self):
+        if self.store is None:
+            with self._load_lock:
+                if self.store is None:
+                    self.store = create_expert_store()
+        return self.store
+
+    def get_snapshot(self) -> ExpertSnapshot:
+        """
+        获取当前专家配置快照
+
+        距上次检查超过 expert_reload_interval 时检查存储的变化标记（如手动编辑文件、其他进程写入）：
+        在事件循环中调用时在线程池中后台检查，本次直接返回内存中的快照；在工作线程中调用时同步检查。
+        只有首次加载在调用方所在线程同步执行
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            return self._reload_if_changed()
+        if time.monotonic() - self._checked_at < get_settings().expert_reload_interval:
+            return snapshot
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return self._reload_if_changed()
+        if self._refresh_task is None or self._refresh_task.done():
+            self._checked_at = time.monotonic()
+            self._refresh_task = loop.create_task(self._refresh())
+        return snapshot
+
+    async def _refresh(self) -> None:
+        """后台检查存储是否变化"""
+        try:
+            await asyncio.to_thread(self._reload_if_changed)
+        except Exception as e:
+            logger.warning(f"检查专家配置变化失败: {e}")
+
+    def _reload_if_changed(self) -> ExpertSnapshot:
+        """读取存储的变化标记，变化时重新加载（同步执行，会访问存储）"""
+        store = self._get_store()
+        snapshot = self._snapshot
+        stamp = store.stamp()
+        self._checked_at = time.monotonic()
+        if snapshot is not None and snapshot.stamp == stamp:
+            return snapshot
+        with self._load_lock:
+            # 等待锁期间其他线程可能已完成加载
+            snapshot = self._snapshot
+            stamp = store.stamp()
+            if snapshot is not None and snapshot.stamp == stamp:
+                return snapshot
+            new_snapshot = self._install(store.load(), stamp)
+            self.reloads += 1
+        if snapshot is not None:
+            logger.info(f"专家配置已变更，重新加载 {len(new_snapshot.experts)} 个专家")
+            fate_graph_registry.invalidate()
+        return new_snapshot
+
+    def _install(self, experts: List[Dict[str, Any]], stamp: Hashable) -> ExpertSnapshot:
+        """生成新版本的快照并替换当前快照（调用方需持有 _load_lock）"""
+        self._version += 1
+        snapshot = ExpertSnapshot(experts, stamp, self._version)
+        self._snapshot = snapshot
+        self._checked_at = time.monotonic()
+        return snapshot
+
+    @property
+    def version(self) -> int:
+        """当前快照的版本号（不检查文件变化）"""
+        return self._version
+
     def load_experts(self) -> List[Dict[str, Any]]:
-        """从配置文件加载专家数据"""
-        if not self.experts_file.exists():
-            # 如果配置文件不存在，返回空列表
-            return []
-        
-        with open(self.experts_file, 'r', encoding='utf-8') as f:
-            experts = json.load(f)
-            # 确保所有专家都有icon字段（向后兼容）
-            has_update = False
-            for expert in experts:
-                if 'icon' not in expert:
-                    expert['icon'] = '🔮'
-                    has_update = True
-            # 如果有更新，保存回文件
-            if has_update:
-                self.save_experts(experts)
-            return experts
-    
-    def save_experts(self, experts: List[Dict[str, Any]]) -> None:
-        """保存专家数据"""
-        with open(self.experts_file, 'w', encoding='utf-8') as f:
-            json.dump(experts, f, ensure_ascii=False, indent=2)
-    
+        """获取专家数据（列表为副本，专家字典为快照中的共享对象）"""
+        return list(self.get_snapshot().experts)
+
+    def _apply(self, experts: List[Dict[str, Any]], operation: Callable[[], None]) -> ExpertSnapshot:
+        """执行存储写入，并用写入后的数据替换内存快照（在线程池中执行）"""
+        store = self._get_store()
+        operation()
+        with self._load_lock:
+            return self._install(experts, store.stamp())
+
+    async def save_experts(self, experts: List[Dict[str, Any]], operation: Callable[[], None]) -> None:
+        """保存专家数据（调用方需持有 _write_lock）"""
+        await asyncio.to_thread(self._apply, experts, operation)
+        self.writes += 1
+        # 专家配置变更后，已编译的图不再有效
+        fate_graph_registry.invalidate()
+
     def get_expert_by_id(self, expert_id: str) -> Optional[Dict[str, Any]]:
         """根据ID获取专家信息"""
-        experts = self.load_experts()
-        return next((e for e in experts if e.get("id") == expert_id), None)
-    
+        return self.get_snapshot().by_id.get(expert_id)
+
     def get_all_experts(self) -> List[Dict[str, Any]]:
         """获取所有专家列表"""
         return self.load_experts()
     
-    def create_expert(self, expert_data: Dict[str, Any]) -> Dict[str, Any]:
+    async def create_expert(self, expert_data: Dict[str, Any]) -> Dict[str, Any]:
         """创建新专家"""
-        experts = self.load_experts()
+        async with self._write_lock:
+            return await self._create_expert(expert_data)
+
+    async def _create_expert(self, expert_data: Dict[str, Any]) -> Dict[str, Any]:
+        snapshot = await asyncio.to_thread(self.get_snapshot)
+        experts = list(snapshot.experts)
         
         # 使用UUID生成专家ID
         expert_id = str(uuid.uuid4())
         
         # UUID理论上是唯一的，但为了安全起见，还是检查一下
-        while any(e.get("id") == expert_id for e in experts):
+        while expert_id in snapshot.by_id:
             expert_id = str(uuid.uuid4())
         
         new_expert = {
@@ -75,17 +191,27 @@ class ExpertService:
             "required_fields": expert_data.get("required_fields", [])
         }
         experts.append(new_expert)
-        self.save_experts(experts)
+        store = self._get_store()
+        await self.save_experts(experts, lambda: store.create(experts, new_expert))
         return new_expert
     
-    def update_expert(self, expert_id: str, expert_data: Dict[str, Any]) -> Dict[str, Any]:
+    async def update_expert(self, expert_id: str, expert_data: Dict[str, Any]) -> Dict[str, Any]:
         """更新专家信息"""
-        experts = self.load_experts()
-        expert = next((e for e in experts if e.get("id") == expert_id), None)
+        async with self._write_lock:
+            return await self._update_expert(expert_id, expert_data)
+
+    async def _update_expert(self, expert_id: str, expert_data: Dict[str, Any]) -> Dict[str, Any]:
+        snapshot = await asyncio.to_thread(self.get_snapshot)
+        experts = list(snapshot.experts)
+        current = snapshot.by_id.get(expert_id)
         
-        if not expert:
+        if not current:
             return None
         
+        # 快照中的字典是共享的，修改副本后整体替换
+        expert = copy.deepcopy(current)
+        experts[experts.index(current)] = expert
+        
         # 更新字段
         if "name" in expert_data and expert_data["name"] is not None:
             expert["name"] = expert_data["name"]
@@ -102,18 +228,39 @@ class ExpertService:
         if "required_fields" in expert_data and expert_data["required_fields"] is not None:
             expert["required_fields"] = expert_data["required_fields"]
         
-        self.save_experts(experts)
+        # SQLite 存储在 prompt 变化时生成新版本，并更新 expert 的 prompt_version
+        prompt_changed = expert.get("prompt") != current.get("prompt")
+        store = self._get_store()
+        await self.save_experts(experts, lambda: store.update(experts, expert, prompt_changed))
         return expert
     
-    def delete_expert(self, expert_id: str) -> bool:
+    async def delete_expert(self, expert_id: str) -> bool:
         """删除专家"""
-        experts = self.load_experts()
-        expert = next((e for e in experts if e.get("id") == expert_id), None)
+        async with self._write_lock:
+            return await self._delete_expert(expert_id)
+
+    async def _delete_expert(self, expert_id: str) -> bool:
+        snapshot = await asyncio.to_thread(self.get_snapshot)
+        experts = list(snapshot.experts)
+        expert = snapshot.by_id.get(expert_id)
         
         if not expert:
             return False
         
         experts.remove(expert)
-        self.save_experts(experts)
+        store = self._get_store()
+        await self.save_experts(experts, lambda: store.delete(experts, expert_id))
         return True
 
+    @property
+    def supports_versions(self) -> bool:
+        """当前存储是否保存 prompt 版本历史（仅 SQLite）"""
+        return self._get_store().supports_versions
+
+    def get_prompt_versions(self, expert_id: str) -> List[Dict[str, Any]]:
+        """获取专家的 prompt 版本历史，存储不支持版本历史时返回空列表"""
+        return self._get_store().prompt_versions(expert_id)
+
+
+# 全局专家服务实例
+expert_service = ExpertService()
@@ -2,15 +2,19 @@
 命理分析服务层
 处理命理分析相关的业务逻辑
 """
+import asyncio
 import base64
 import json
-from typing import List, Dict, Any, Optional, AsyncIterator
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple
 from fastapi import HTTPException
 from fastapi.responses import StreamingResponse
 from starlette.datastructures import UploadFile
 
-from graph.fate_graph import FateGraph
-from services.expert_service import ExpertService
+from graph.graph_registry import fate_graph_registry
+from infrastructure.blob_store import blob_store
+from services.expert_service import expert_service
+from tools.bazi_tools import parse_birth_datetime
+from utils.image_processing import ImageTooLargeError, InvalidImageError, preprocess_image
 from utils.unified_logger import get_logger
 
 logger = get_logger(__name__)
@@ -20,13 +24,30 @@ class FortuneService:
     """命理分析服务"""
     
     def __init__(self):
-        self.expert_service = ExpertService()
+        self.expert_service = expert_service
     
-    def get_expert_by_id(self, expert_id: str, experts: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
-        """根据ID获取专家配置"""
-        return next((e for e in experts if e.get("id") == expert_id), None)
-    
-    def extract_field_value_from_form(
+    def _process_image(self, content: bytes) -> Tuple[str, int, str]:
+        """预处理图片并存入对象存储，返回 (引用, 处理后字节数, MIME 类型)"""
+        processed, mime_type = preprocess_image(content)
+        return blob_store.put(processed, mime_type), len(processed), mime_type
+
+    async def _encode_image(self, content: bytes, field_id: str) -> str:
+        """
+        在线程池中预处理图片（旋正、缩放、重新编码）并存入对象存储
+        返回对象引用，图状态中不保存图片内容；图片像素数过多（解压炸弹）或无法识别时返回 400
+        """
+        try:
+            ref, size, mime_type = await asyncio.to_thread(self._process_image, content)
+        except ImageTooLargeError as e:
+            logger.warning(f"图片字段 {field_id} 被拒绝: {e}")
+            raise HTTPException(status_code=400, detail=f"图片字段 {field_id} 的图片尺寸过大")
+        except InvalidImageError as e:
+            logger.warning(f"图片字段 {field_id} 被拒绝: {e}")
+            raise HTTPException(status_code=400, detail=f"图片字段 {field_id} 不是可识别的图片")
+        logger.info(f"图片字段 {field_id}: 上传 {len(content)} 字节，处理后 {size} 字节（{mime_type}），{ref}")
+        return ref
+
+    async def extract_field_value_from_form(
         self,
         form_data: Dict[str, Any],
         field: Dict[str, Any],
@@ -34,7 +55,8 @@ class FortuneService:
     ) -> Optional[str]:
         """
         从表单数据中提取字段值
-        对于 image 类型，转换为 base64 字符串返回（避免序列化问题）
+        对于 image 类型，预处理后存入对象存储，返回对象引用（避免在图状态中复制图片），base64 不合法时返回 400
+        对于 datetime 类型，出生时间无法解析或超出支持范围时返回 400
         对于其他类型，返回字符串
         """
         field_id = field.get("field_id", "")
@@ -46,13 +68,14 @@ class FortuneService:
         # 检查上传文件（优先检查，因为 image 类型应该是文件）
         if field_id in uploaded_files:
             file = uploaded_files[field_id]
-            file_content = file.file.read()
-            file.file.seek(0)  # 重置文件指针
+            file_content = await file.read()
+            await file.seek(0)  # 重置文件指针
             
             if field_type == "image":
-                # image 类型转换为 base64 字符串（可序列化）
-                base64_content = base64.b64encode(file_content).decode('utf-8')
-                return base64_content
+                # image 类型预处理后存入对象存储；空文件（未选择图片）视为未上传
+                if not file_content:
+                    return None
+                return await self._encode_image(file_content, field_id)
             else:
                 # 非 image 类型，读取内容转换为字符串
                 return file_content.decode('utf-8', errors='ignore')
@@ -60,14 +83,27 @@ class FortuneService:
         # 检查表单数据（文本字段）
         if field_id in form_data:
             value = form_data[field_id]
-            if field_type == "image" and isinstance(value, str):
-                # 如果是 base64 字符串，直接返回
-                return value
+            if field_type == "image":
+                # base64 字符串（可带 data URL 前缀），解码后同样预处理；
+                # 图片字段的值只能是本次请求存入对象存储后得到的引用，不接受客户端传入的其他字符串
+                if not isinstance(value, str) or not value:
+                    return None
+                try:
+                    content = base64.b64decode(value.split(",", 1)[1] if value.startswith("data:") else value, validate=True)
+                except (ValueError, IndexError):
+                    raise HTTPException(status_code=400, detail=f"图片字段 {field_id} 不是合法的 base64 数据")
+                return await self._encode_image(content, field_id)
+            if field_type == "datetime" and value:
+                # 出生时间在进入图之前校验，格式非法或超出历法数据范围时返回 400
+                try:
+                    parse_birth_datetime(field.get("field_name", ""), value)
+                except ValueError as e:
+                    raise HTTPException(status_code=400, detail=f"{field.get('field_name') or field_id} 无效: {e}")
             return str(value) if value else None
         
         return None
     
-    def build_user_data(
+    async def build_user_data(
         self,
         selected_experts: List[Dict[str, Any]],
         form_data: Dict[str, Any],
@@ -75,9 +111,11 @@ class FortuneService:
     ) -> Dict[str, Dict[str, Any]]:
         """
         构建用户数据，根据专家配置动态提取字段
+        同一字段被多个专家使用时只提取（预处理）一次
         返回格式: {expert_id: {field_id: field_value}}
         """
         user_data = {}
+        extracted: Dict[str, Optional[str]] = {}
         
         for expert in selected_experts:
             expert_user_data = {}
@@ -88,7 +126,10 @@ class FortuneService:
                     continue
                 
                 field_id = field.get("field_id", "")
-                field_value = self.extract_field_value_from_form(form_data, field, uploaded_files)
+                cache_key = f"{field_id}:{field.get('field_type', 'text')}"
+                if cache_key not in extracted:
+                    extracted[cache_key] = await self.extract_field_value_from_form(form_data, field, uploaded_files)
+                field_value = extracted[cache_key]
                 
                 if field_value is not None:
                     expert_user_data[field_id] = field_value
@@ -109,15 +150,15 @@ class FortuneService:
         if not expert_ids:
             return []
         
-        # 加载专家配置
-        experts = self.expert_service.load_experts()
-        if not experts:
+        # 加载专家配置（内存快照，按ID索引）
+        snapshot = self.expert_service.get_snapshot()
+        if not snapshot.experts:
             raise HTTPException(status_code=500, detail="未找到专家配置")
         
         # 验证专家ID是否存在
         selected_experts = []
         for expert_id in expert_ids:
-            expert_config = self.get_expert_by_id(expert_id, experts)
+            expert_config = snapshot.by_id.get(expert_id)
             if not expert_config:
                 raise HTTPException(status_code=404, detail=f"未找到专家: {expert_id}")
             selected_experts.append(expert_config)
@@ -166,14 +207,28 @@ class FortuneService:
         self,
         task_id: str,
         selected_experts: List[Dict[str, Any]],
-        user_data: Dict[str, Dict[str, Any]]
+        user_data: Dict[str, Dict[str, Any]],
+        stream_tokens: bool = False
     ) -> AsyncIterator[Dict[str, Any]]:
         """
         执行命理分析并流式返回结果
+        stream_tokens 为 True 时逐 token 返回专家报告；
+        专家来自 SQLite 存储时，专家报告带有所用的 prompt_version
         """
+        # 记录本次分析使用的 prompt 版本（SQLite 存储），按专家 ID 附加到对应专家的报告中
+        prompt_versions = {
+            expert["id"]: expert["prompt_version"]
+            for expert in selected_experts
+            if expert.get("prompt_version") is not None
+        }
+        if prompt_versions:
+            logger.info(f"任务 {task_id} 使用的 prompt 版本: {prompt_versions}")
         try:
-            fate_graph = FateGraph(analysis_experts=selected_experts)
-            async for chunk in fate_graph.chat_with_planning_stream(task_id, user_data):
+            fate_graph = fate_graph_registry.get_graph(selected_experts)
+            async for chunk in fate_graph.chat_with_planning_stream(task_id, user_data, stream_tokens=stream_tokens):
+                version = prompt_versions.get(chunk.get("expert_id"))
+                if version is not None and "expert_report" in chunk:
+                    chunk["prompt_version"] = version
                 yield chunk
         except Exception as e:
             logger.error(f"流式处理失败: {str(e)}")
@@ -1,56 +1,225 @@
 import calendar
+import threading
+from array import array
 from datetime import datetime
 
+import numpy as np
 
-def tian_gan_di_zhi(year:int, month:int, day:int, hour:int):
+from tools.lunar_calendar import MAX_YEAR, MIN_YEAR, days_since_epoch, parse_lunar_datetime, solar_term_minutes
+
+HEAVENLY_STEMS = ("甲", "乙", "丙", "丁", "戊", "己", "庚", "辛", "壬", "癸")
+EARTHLY_BRANCHES = ("子", "丑", "寅", "卯", "辰", "巳", "午", "未", "申", "酉", "戌", "亥")
+
+# 支持的年份范围，与农历节气数据一致
+TABLE_MIN_YEAR = MIN_YEAR
+TABLE_MAX_YEAR = MAX_YEAR
+
+# 1900-01-01 为甲戌日
+DAY_OFFSET = 10
+
+
+def _jiazi_index(stem: int, branch: int) -> int:
+    """天干、地支序号对应的六十甲子序号"""
+    return (6 * stem - 5 * branch) % 60
+
+
+def _year_index(bazi_year: int) -> int:
+    """年柱的六十甲子序号（bazi_year 为以立春为界的年份）"""
+    return (bazi_year - 4) % 60
+
+
+def _month_index(bazi_year: int, branch: int) -> int:
+    """月柱的六十甲子序号，月干按五虎遁从寅月起"""
+    first_month_stem = ((bazi_year - 4) % 5 * 2 + 2) % 10
+    return _jiazi_index((first_month_stem + (branch - 2) % 12) % 10, branch)
+
+
+def _hour_index(day_stem: int, hour: int) -> int:
     """
-    计算天干地支
+    时柱的六十甲子序号，时干按五鼠遁从子时起
+    23 点为次日子时，时干按次日日干推算，日柱不变
     """
+    branch = (hour + 1) % 24 // 2
+    if hour == 23:
+        day_stem = (day_stem + 1) % 10
+    return _jiazi_index((day_stem % 5 * 2 + branch) % 10, branch)
 
-    heavenly_stems = ["甲", "乙", "丙", "丁", "戊", "己", "庚", "辛", "壬", "癸"]
-    earthly_branches = ["子", "丑", "寅", "卯", "辰", "巳", "午", "未", "申", "酉", "戌", "亥"]
 
-    def year_zhu(year):
-        year_offset = (year - 4) % 60
-        return heavenly_stems[year_offset % 10] + earthly_branches[year_offset % 12]
+class _BaziTable:
+    """
+    天干地支预计算表，按公历 (年, 月) 索引
 
-    def month_stem(year, month):
-        year_stem_index = (year - 4) % 10
-        month_stem_index = (year_stem_index * 2 + month) % 10
-        return heavenly_stems[month_stem_index]
+    每个公历月恰有一个“节”（小寒、立春……大雪），节前后的年柱、月柱各存一份，
+    查询时只需比较出生时刻与该月节的时刻
+
+    month_start: 每月第一天距 1900-01-01 的天数
+    month_days: 每月天数
+    jie_minute: 每月节的时刻，距 1900-01-01 00:00 的分钟数（北京时间）
+    year_before / year_after: 节前、节后的年柱序号
+    month_before / month_after: 节前、节后的月柱序号
+    jiazi: 六十甲子，年柱、月柱、日柱按序号查表
+    hour_pillars: 按 (日干序号, 小时) 索引的时柱
+    """
 
-    def month_branch(year, month):
-        _, month_days = calendar.monthrange(year, month)
-        first_month_branch = 2  # 寅
-        if calendar.isleap(year):
-            first_month_branch -= 1
-        m_branch = (first_month_branch + month - 1) % 12
-        return earthly_branches[m_branch]
+    def __init__(self):
+        self.jiazi = tuple(HEAVENLY_STEMS[i % 10] + EARTHLY_BRANCHES[i % 12] for i in range(60))
+        self.month_start = array("l")
+        self.month_days = array("B")
+        self.jie_minute = array("l")
+        self.year_before = array("B")
+        self.year_after = array("B")
+        self.month_before = array("B")
+        self.month_after = array("B")
+        days = 0
+        for year in range(TABLE_MIN_YEAR, TABLE_MAX_YEAR + 1):
+            for month in range(1, 13):
+                _, month_days = calendar.monthrange(year, month)
+                self.month_start.append(days)
+                self.month_days.append(month_days)
+                days += month_days
+                # 第 month 个月的节是第 month - 1 个节，节后进入地支序号为 month 的月份（大雪后为子月）
+                self.jie_minute.append(solar_term_minutes(year, 2 * (month - 1)))
+                year_before = year - 1 if month <= 2 else year
+                year_after = year - 1 if month == 1 else year
+                self.year_before.append(_year_index(year_before))
+                self.year_after.append(_year_index(year_after))
+                self.month_before.append(_month_index(year_before, (month - 1) % 12))
+                self.month_after.append(_month_index(year_after, month % 12))
+        self.hour_pillars = tuple(
+            self.jiazi[_hour_index(day_stem, hour)]
+            for day_stem in range(10)
+            for hour in range(24)
+        )
+        # 批量计算使用的 NumPy 视图，末尾追加空字符串作为非法行的占位
+        self.np_month_start = np.array(self.month_start, dtype=np.int64)
+        self.np_month_days = np.array(self.month_days, dtype=np.int64)
+        self.np_jie_minute = np.array(self.jie_minute, dtype=np.int64)
+        self.np_year_before = np.array(self.year_before, dtype=np.int64)
+        self.np_year_after = np.array(self.year_after, dtype=np.int64)
+        self.np_month_before = np.array(self.month_before, dtype=np.int64)
+        self.np_month_after = np.array(self.month_after, dtype=np.int64)
+        self.np_jiazi = np.array(self.jiazi + ("",))
+        self.np_hour_pillars = np.array(self.hour_pillars + ("",))
 
-    def day_zhu(year, month, day):
-        base_date = datetime(1900, 1, 1)
-        target_date = datetime(year, month, day)
-        days_passed = (target_date - base_date).days
-        day_offset = days_passed % 60
-        return heavenly_stems[day_offset % 10] + earthly_branches[day_offset % 12]
 
-    def hour_stem(year, month, day, hour):
-        base_date = datetime(1900, 1, 1)
-        target_date = datetime(year, month, day)
-        days_passed = (target_date - base_date).days
-        day_stem_index = days_passed % 10
-        hour_stem_index = (day_stem_index * 2 + hour // 2) % 10
-        return heavenly_stems[hour_stem_index]
+_table = None
+_table_lock = threading.Lock()
 
-    def hour_branch(h):
-        h = (h + 1) % 24
-        return earthly_branches[h // 2]
 
-    year_zhu_result = year_zhu(year)
-    month_stem_result = month_stem(year, month)
-    month_branch_result = month_branch(year, month)
-    day_zhu_result = day_zhu(year, month, day)
-    hour_stem_result = hour_stem(year, month, day, hour)
-    hour_branch_result = hour_branch(hour)
+def _get_table() -> _BaziTable:
+    """每个进程只在首次使用时构建一次预计算表"""
+    global _table
+    if _table is None:
+        with _table_lock:
+            if _table is None:
+                _table = _BaziTable()
+    return _table
 
-    return year_zhu_result, month_stem_result + month_branch_result, day_zhu_result, hour_stem_result + hour_branch_result
+
+def tian_gan_di_zhi(year: int, month: int, day: int, hour: int, minute: int = 0):
+    """
+    计算天干地支（公历，北京时间）
+
+    年柱以立春为界，月柱以节为界，日柱以 0 点为界，23 点起为次日子时。
+    1900-2100 年内查预计算表；年份超出范围或日期非法时抛出 ValueError
+    """
+    if TABLE_MIN_YEAR <= year <= TABLE_MAX_YEAR and 1 <= month <= 12 and 0 <= hour <= 23 and 0 <= minute <= 59:
+        table = _get_table()
+        month_index = (year - TABLE_MIN_YEAR) * 12 + month - 1
+        if 1 <= day <= table.month_days[month_index]:
+            days_passed = table.month_start[month_index] + day - 1
+            if days_passed * 1440 + hour * 60 + minute >= table.jie_minute[month_index]:
+                year_index, month_pillar_index = table.year_after[month_index], table.month_after[month_index]
+            else:
+                year_index, month_pillar_index = table.year_before[month_index], table.month_before[month_index]
+            return (
+                table.jiazi[year_index],
+                table.jiazi[month_pillar_index],
+                table.jiazi[(days_passed + DAY_OFFSET) % 60],
+                table.hour_pillars[(days_passed + DAY_OFFSET) % 10 * 24 + hour],
+            )
+    return _tian_gan_di_zhi_compute(year, month, day, hour, minute)
+
+
+def tian_gan_di_zhi_batch(years, months, days, hours, minutes=None):
+    """
+    批量计算天干地支（向量化）
+
+    参数为等长的 NumPy 数组或列表，minutes 可省略（按整点计算），
+    返回 (年柱, 月柱, 日柱, 时柱) 四列字符串数组。
+    日期非法或年份超出 1900-2100 的行返回空字符串，由调用方决定如何处理
+    """
+    table = _get_table()
+    years = np.asarray(years, dtype=np.int64)
+    months = np.asarray(months, dtype=np.int64)
+    days = np.asarray(days, dtype=np.int64)
+    hours = np.asarray(hours, dtype=np.int64)
+    minutes = np.zeros_like(hours) if minutes is None else np.asarray(minutes, dtype=np.int64)
+
+    valid = (
+        (years >= TABLE_MIN_YEAR) & (years <= TABLE_MAX_YEAR)
+        & (months >= 1) & (months <= 12)
+        & (hours >= 0) & (hours <= 23)
+        & (minutes >= 0) & (minutes <= 59)
+        & (days >= 1)
+    )
+    month_index = np.where(valid, (years - TABLE_MIN_YEAR) * 12 + months - 1, 0)
+    valid &= days <= table.np_month_days[month_index]
+    days_passed = table.np_month_start[month_index] + days - 1 + DAY_OFFSET
+    after_jie = (days_passed - DAY_OFFSET) * 1440 + hours * 60 + minutes >= table.np_jie_minute[month_index]
+
+    # 非法行指向表末尾的空字符串
+    invalid_jiazi = len(table.jiazi)
+    year_index = np.where(after_jie, table.np_year_after[month_index], table.np_year_before[month_index])
+    month_pillar_index = np.where(after_jie, table.np_month_after[month_index], table.np_month_before[month_index])
+    year_zhu = table.np_jiazi[np.where(valid, year_index, invalid_jiazi)]
+    month_zhu = table.np_jiazi[np.where(valid, month_pillar_index, invalid_jiazi)]
+    day_zhu = table.np_jiazi[np.where(valid, days_passed % 60, invalid_jiazi)]
+    hour_zhu = table.np_hour_pillars[
+        np.where(valid, days_passed % 10 * 24 + hours, len(table.hour_pillars))
+    ]
+    return year_zhu, month_zhu, day_zhu, hour_zhu
+
+
+def _tian_gan_di_zhi_compute(year: int, month: int, day: int, hour: int, minute: int = 0):
+    """
+    逐项计算天干地支（不使用预计算表），用于校验预计算表
+    """
+    if not TABLE_MIN_YEAR <= year <= TABLE_MAX_YEAR:
+        raise ValueError(f"年份超出支持范围 {TABLE_MIN_YEAR}-{TABLE_MAX_YEAR}: {year}")
+    if not (0 <= hour <= 23 and 0 <= minute <= 59):
+        raise ValueError(f"时间非法: {hour}:{minute:02d}")
+    days_passed = days_since_epoch(year, month, day)
+    moment = days_passed * 1440 + hour * 60 + minute
+
+    # 立春前属上一年
+    bazi_year = year if moment >= solar_term_minutes(year, 2) else year - 1
+    # 最近一个已过的节决定月支，小寒前为子月
+    branch = 0
+    for jie in range(12):
+        if moment >= solar_term_minutes(year, jie * 2):
+            branch = (jie + 1) % 12
+
+    jiazi = tuple(HEAVENLY_STEMS[i % 10] + EARTHLY_BRANCHES[i % 12] for i in range(60))
+    day_index = (days_passed + DAY_OFFSET) % 60
+    return (
+        jiazi[_year_index(bazi_year)],
+        jiazi[_month_index(bazi_year, branch)],
+        jiazi[day_index],
+        jiazi[_hour_index(day_index % 10, hour)],
+    )
+
+
+def parse_birth_datetime(field_name: str, value: str) -> datetime:
+    """
+    解析出生时间字段为公历时间（格式如 1990-05-17 10:30），字段名标明阴历/农历时先转换为公历
+    格式非法或年份超出支持范围时抛出 ValueError
+    """
+    date_str = str(value).strip()
+    if "阴历" in field_name or "农历" in field_name:
+        parsed = parse_lunar_datetime(date_str)
+    else:
+        parsed = datetime.strptime(date_str, "%Y-%m-%d %H:%M")
+    if not TABLE_MIN_YEAR <= parsed.year <= TABLE_MAX_YEAR:
+        raise ValueError(f"年份超出支持范围 {TABLE_MIN_YEAR}-{TABLE_MAX_YEAR}: {parsed.year}")
+    return parsed
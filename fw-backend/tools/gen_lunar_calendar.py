@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+生成农历与节气数据文件 tools/data/lunar_calendar.bin
+
+只在更新数据时运行，运行时不依赖本脚本。节气时刻由 PyEphem 计算
+（太阳视黄经到达 15° 整数倍的时刻），需要先安装: pip install ephem
+
+使用方法（在 fw-backend 目录下）:
+    python -m tools.gen_lunar_calendar
+
+文件格式（小端序）:
+    头部 12 字节: magic b"FWLC", version u16, min_year u16, max_year u16, 保留 u16
+    农历数据: 每年一个 uint32，编码方式见 LUNAR_INFO
+    节气数据: 每年 24 个 int32，小寒、大寒……冬至，为距 1900-01-01 00:00（北京时间）的分钟数
+"""
+import math
+import struct
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from tools.lunar_calendar import DATA_FILE, HEADER_FORMAT, MAGIC, MAX_YEAR, MIN_YEAR, VERSION
+
+# 1900-2100 年农历数据（香港天文台公布的农历表）
+# 低 4 位: 闰月月份（0 表示无闰月）
+# 第 5-16 位: 1-12 月的大小月，从高位到低位，1 为大月（30 天），0 为小月（29 天）
+# 第 17 位: 闰月为大月时为 1
+LUNAR_INFO = [
+    0x04bd8, 0x04ae0, 0x0a570, 0x054d5, 0x0d260, 0x0d950, 0x16554, 0x056a0, 0x09ad0, 0x055d2,  # 1900
+    0x04ae0, 0x0a5b6, 0x0a4d0, 0x0d250, 0x1d255, 0x0b540, 0x0d6a0, 0x0ada2, 0x095b0, 0x14977,  # 1910
+    0x04970, 0x0a4b0, 0x0b4b5, 0x06a50, 0x06d40, 0x1ab54, 0x02b60, 0x09570, 0x052f2, 0x04970,  # 1920
+    0x06566, 0x0d4a0, 0x0ea50, 0x16a95, 0x05ad0, 0x02b60, 0x186e3, 0x092e0, 0x1c8d7, 0x0c950,  # 1930
+    0x0d4a0, 0x1d8a6, 0x0b550, 0x056a0, 0x1a5b4, 0x025d0, 0x092d0, 0x0d2b2, 0x0a950, 0x0b557,  # 1940
+    0x06ca0, 0x0b550, 0x15355, 0x04da0, 0x0a5b0, 0x14573, 0x052b0, 0x0a9a8, 0x0e950, 0x06aa0,  # 1950
+    0x0aea6, 0x0ab50, 0x04b60, 0x0aae4, 0x0a570, 0x05260, 0x0f263, 0x0d950, 0x05b57, 0x056a0,  # 1960
+    0x096d0, 0x04dd5, 0x04ad0, 0x0a4d0, 0x0d4d4, 0x0d250, 0x0d558, 0x0b540, 0x0b6a0, 0x195a6,  # 1970
+    0x095b0, 0x049b0, 0x0a974, 0x0a4b0, 0x0b27a, 0x06a50, 0x06d40, 0x0af46, 0x0ab60, 0x09570,  # 1980
+    0x04af5, 0x04970, 0x064b0, 0x074a3, 0x0ea50, 0x06b58, 0x05ac0, 0x0ab60, 0x096d5, 0x092e0,  # 1990
+    0x0c960, 0x0d954, 0x0d4a0, 0x0da50, 0x07552, 0x056a0, 0x0abb7, 0x025d0, 0x092d0, 0x0cab5,  # 2000
+    0x0a950, 0x0b4a0, 0x0baa4, 0x0ad50, 0x055d9, 0x04ba0, 0x0a5b0, 0x15176, 0x052b0, 0x0a930,  # 2010
+    0x07954, 0x06aa0, 0x0ad50, 0x05b52, 0x04b60, 0x0a6e6, 0x0a4e0, 0x0d260, 0x0ea65, 0x0d530,  # 2020
+    0x05aa0, 0x076a3, 0x096d0, 0x04afb, 0x04ad0, 0x0a4d0, 0x1d0b6, 0x0d250, 0x0d520, 0x0dd45,  # 2030
+    0x0b5a0, 0x056d0, 0x055b2, 0x049b0, 0x0a577, 0x0a4b0, 0x0aa50, 0x1b255, 0x06d20, 0x0ada0,  # 2040
+    0x14b63, 0x09370, 0x049f8, 0x04970, 0x064b0, 0x168a6, 0x0ea50, 0x06b20, 0x1a6c4, 0x0aae0,  # 2050
+    0x092e0, 0x0d2e3, 0x0c960, 0x0d557, 0x0d4a0, 0x0da50, 0x05d55, 0x056a0, 0x0a6d0, 0x055d4,  # 2060
+    0x052d0, 0x0a9b8, 0x0a950, 0x0b4a0, 0x0b6a6, 0x0ad50, 0x055a0, 0x0aba4, 0x0a5b0, 0x052b0,  # 2070
+    0x0b273, 0x06930, 0x07337, 0x06aa0, 0x0ad50, 0x14b55, 0x04b60, 0x0a570, 0x054e4, 0x0d160,  # 2080
+    0x0e968, 0x0d520, 0x0daa0, 0x16aa6, 0x056d0, 0x04ae0, 0x0a9d4, 0x0a2d0, 0x0d150, 0x0f252,  # 2090
+    0x0d520,  # 2100
+]
+
+# 北京时间 1900-01-01 00:00
+EPOCH = datetime(1900, 1, 1)
+
+
+def _sun_longitude(ephem, date) -> float:
+    """太阳的地心视黄经（弧度）"""
+    sun = ephem.Sun(date)
+    return float(ephem.Ecliptic(ephem.Equatorial(sun.g_ra, sun.g_dec, epoch=date), epoch=date).lon)
+
+
+def solar_term_minutes(ephem, year: int, index: int) -> int:
+    """第 index 个节气（0 为小寒，黄经 285°）距 EPOCH 的分钟数（北京时间，向下取整）"""
+    target = math.radians((285 + 15 * index) % 360)
+    date = ephem.Date(datetime(year, 1, 6) + timedelta(days=15.22 * index))
+    for _ in range(50):
+        diff = (_sun_longitude(ephem, date) - target + math.pi) % (2 * math.pi) - math.pi
+        step = -diff / (2 * math.pi) * 365.2422
+        date = ephem.Date(date + step)
+        if abs(step) < 1e-7:
+            break
+    beijing_time = ephem.Date(date).datetime() + timedelta(hours=8)
+    return math.floor((beijing_time - EPOCH).total_seconds() / 60)
+
+
+def main() -> None:
+    import ephem
+
+    assert len(LUNAR_INFO) == MAX_YEAR - MIN_YEAR + 1
+    years = range(MIN_YEAR, MAX_YEAR + 1)
+    data = bytearray(struct.pack(HEADER_FORMAT, MAGIC, VERSION, MIN_YEAR, MAX_YEAR, 0))
+    data += struct.pack(f"<{len(LUNAR_INFO)}I", *LUNAR_INFO)
+    for year in years:
+        data += struct.pack("<24i", *(solar_term_minutes(ephem, year, i) for i in range(24)))
+
+    Path(DATA_FILE).write_bytes(bytes(data))
+    print(f"已生成 {DATA_FILE}（{len(data)} 字节）")
+
+
+if __name__ == "__main__":
+    main()
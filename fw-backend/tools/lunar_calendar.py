@@ -0,0 +1,177 @@
+"""
+农历与节气
+
+数据文件 tools/data/lunar_calendar.bin 由 tools/gen_lunar_calendar.py 生成，
+首次使用时加载并预计算每个农历月的起始日，之后的转换都是 O(1) 查表。
+节气时刻为北京时间（UTC+8），以距 1900-01-01 00:00 的分钟数表示
+"""
+import re
+import struct
+import sys
+import threading
+from array import array
+from bisect import bisect_right
+from datetime import date, datetime
+from pathlib import Path
+from typing import Tuple
+
+MAGIC = b"FWLC"
+VERSION = 1
+HEADER_FORMAT = "<4sHHHH"
+DATA_FILE = Path(__file__).parent / "data" / "lunar_calendar.bin"
+
+MIN_YEAR = 1900
+MAX_YEAR = 2100
+
+# 从小寒开始的 24 节气，偶数序号为“节”，决定月柱的交接
+SOLAR_TERMS = (
+    "小寒", "大寒", "立春", "雨水", "惊蛰", "春分", "清明", "谷雨", "立夏", "小满", "芒种", "夏至",
+    "小暑", "大暑", "立秋", "处暑", "白露", "秋分", "寒露", "霜降", "立冬", "小雪", "大雪", "冬至",
+)
+
+# 公历 1900-01-01 的序数，日期统一用距该日的天数表示
+EPOCH_ORDINAL = date(1900, 1, 1).toordinal()
+# 农历 1900 年正月初一为公历 1900-01-31
+LUNAR_EPOCH_OFFSET = 30
+# 农历日期时间输入格式，闰月在月份前加“闰”
+_LUNAR_DATETIME = re.compile(r"^(\d{4})-(闰)?(\d{1,2})-(\d{1,2}) (\d{1,2}):(\d{2})$")
+
+
+class _LunarData:
+    """
+    农历与节气数据
+
+    year_start: 每个农历年正月初一距 1900-01-01 的天数，末尾多一项为下一年
+    month_start: 每个农历年最多 13 个月的起始天数，按年内顺序（含闰月）排列
+    leap_month: 每年的闰月月份，0 表示无闰月
+    solar_terms: 每年 24 个节气的分钟数
+    """
+
+    def __init__(self, path: Path):
+        raw = path.read_bytes()
+        magic, version, min_year, max_year, _ = struct.unpack_from(HEADER_FORMAT, raw)
+        if magic != MAGIC or version != VERSION or (min_year, max_year) != (MIN_YEAR, MAX_YEAR):
+            raise ValueError(f"农历数据文件格式不匹配: {path}")
+        year_count = max_year - min_year + 1
+        offset = struct.calcsize(HEADER_FORMAT)
+
+        lunar_info = array("I")
+        lunar_info.frombytes(raw[offset:offset + year_count * 4])
+        offset += year_count * 4
+        self.solar_terms = array("i")
+        self.solar_terms.frombytes(raw[offset:offset + year_count * 24 * 4])
+        if sys.byteorder == "big":
+            lunar_info.byteswap()
+            self.solar_terms.byteswap()
+
+        self.leap_month = array("B")
+        self.year_start = array("l")
+        self.month_start = array("l")
+        days = LUNAR_EPOCH_OFFSET
+        for info in lunar_info:
+            leap = info & 0xF
+            self.leap_month.append(leap)
+            self.year_start.append(days)
+            months = []
+            for month in range(1, 13):
+                months.append(30 if info & (0x10000 >> month) else 29)
+                if month == leap:
+                    months.append(30 if info & 0x10000 else 29)
+            for i in range(13):
+                self.month_start.append(days)
+                if i < len(months):
+                    days += months[i]
+        self.year_start.append(days)
+
+
+_data = None
+_data_lock = threading.Lock()
+
+
+def _get_data() -> _LunarData:
+    """每个进程只在首次使用时加载一次数据文件"""
+    global _data
+    if _data is None:
+        with _data_lock:
+            if _data is None:
+                _data = _LunarData(DATA_FILE)
+    return _data
+
+
+def _check_year(year: int) -> None:
+    if not MIN_YEAR <= year <= MAX_YEAR:
+        raise ValueError(f"年份超出支持范围 {MIN_YEAR}-{MAX_YEAR}: {year}")
+
+
+def days_since_epoch(year: int, month: int, day: int) -> int:
+    """公历日期距 1900-01-01 的天数"""
+    return date(year, month, day).toordinal() - EPOCH_ORDINAL
+
+
+def lunar_to_solar(year: int, month: int, day: int, leap: bool = False) -> date:
+    """
+    农历转公历
+
+    leap 为 True 表示闰月；该年没有对应闰月、日期超出当月天数，
+    或对应的公历日期超出节气数据范围（农历 2100 年末已是公历 2101 年）时抛出 ValueError
+    """
+    _check_year(year)
+    data = _get_data()
+    year_index = year - MIN_YEAR
+    leap_month = data.leap_month[year_index]
+    if not 1 <= month <= 12:
+        raise ValueError(f"农历月份非法: {month}")
+    if leap and month != leap_month:
+        raise ValueError(f"农历 {year} 年没有闰{month}月")
+
+    # 闰月排在同名月之后，闰月之后的月份在年内顺延一位
+    position = month - 1 + (1 if leap_month and (month > leap_month or leap) else 0)
+    month_index = year_index * 13 + position
+    month_days = data.month_start[month_index + 1] - data.month_start[month_index] if position < 12 \
+        else data.year_start[year_index + 1] - data.month_start[month_index]
+    if not 1 <= day <= month_days:
+        raise ValueError(f"农历日期非法: {year}年{'闰' if leap else ''}{month}月{day}日")
+    solar = date.fromordinal(EPOCH_ORDINAL + data.month_start[month_index] + day - 1)
+    if not MIN_YEAR <= solar.year <= MAX_YEAR:
+        raise ValueError(
+            f"农历 {year}年{'闰' if leap else ''}{month}月{day}日 对应公历 {solar.isoformat()}，"
+            f"超出支持范围 {MIN_YEAR}-{MAX_YEAR}"
+        )
+    return solar
+
+
+def solar_to_lunar(year: int, month: int, day: int) -> Tuple[int, int, int, bool]:
+    """公历转农历，返回 (年, 月, 日, 是否闰月)"""
+    data = _get_data()
+    days = days_since_epoch(year, month, day)
+    year_index = bisect_right(data.year_start, days) - 1
+    if not 0 <= year_index <= MAX_YEAR - MIN_YEAR:
+        raise ValueError(f"日期超出农历数据范围: {year}-{month:02d}-{day:02d}")
+
+    leap_month = data.leap_month[year_index]
+    month_count = 13 if leap_month else 12
+    base = year_index * 13
+    position = bisect_right(data.month_start, days, base, base + month_count) - base - 1
+    lunar_day = days - data.month_start[base + position] + 1
+    if leap_month and position >= leap_month:
+        return MIN_YEAR + year_index, position, lunar_day, position == leap_month
+    return MIN_YEAR + year_index, position + 1, lunar_day, False
+
+
+def solar_term_minutes(year: int, index: int) -> int:
+    """第 index 个节气（0 为小寒）距 1900-01-01 00:00 的分钟数（北京时间）"""
+    _check_year(year)
+    return _get_data().solar_terms[(year - MIN_YEAR) * 24 + index]
+
+
+def parse_lunar_datetime(text: str) -> datetime:
+    """
+    解析农历日期时间并转换为公历，格式如 1990-04-23 10:30，闰月写作 2023-闰2-15 10:30
+    """
+    match = _LUNAR_DATETIME.match(str(text).strip())
+    if not match:
+        raise ValueError(f"农历日期格式非法: {text}")
+    year, leap, month, day, hour, minute = match.groups()
+    solar = lunar_to_solar(int(year), int(month), int(day), leap=bool(leap))
+    return datetime(solar.year, solar.month, solar.day, int(hour), int(minute))
+
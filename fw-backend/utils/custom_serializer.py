@@ -1,123 +1,186 @@
 """
-自定义序列化器 - 解决 ToolMessage 序列化问题
+自定义序列化器 - LangGraph 检查点使用的紧凑二进制格式
 
-支持 LangGraph 检查点功能，同时处理 ToolMessage 等特殊类型的序列化
+基于 msgpack（ormsgpack），不使用 pickle：
+- 原生类型（str、int、float、bool、list、dict、bytes）直接编码
+- LangChain 消息、元组、集合、日期时间、UUID 以及 LangGraph 的 Send/Interrupt
+  使用 msgpack 扩展类型，每种消息类别有固定的类型标记
+- 顶层 bytes 原样返回，不复制、不编码
+- 编码结果超过阈值时使用 zstd 压缩（未安装 zstandard 时跳过）
+- 遇到无法识别的类型时抛出异常，不会静默返回原始数据
 """
-import pickle
-import json
-import uuid
-import logging
-from typing import Any, Tuple, Dict
-from langchain_core.messages import ToolMessage, AIMessage, HumanMessage, SystemMessage
+from datetime import date, datetime, time, timedelta
+from typing import Any, Callable, Dict, Tuple, Type
+from uuid import UUID
+
+import ormsgpack
+from langchain_core.messages import (
+    AIMessage,
+    AIMessageChunk,
+    BaseMessage,
+    HumanMessage,
+    RemoveMessage,
+    SystemMessage,
+    ToolMessage,
+)
 from langgraph.checkpoint.serde.base import SerializerProtocol
+from langgraph.types import Interrupt, Send
+
+try:
+    import zstandard
+except ImportError:  # 未安装时不压缩
+    zstandard = None
+
+# 类型标记
+TYPE_NULL = "null"
+TYPE_BYTES = "bytes"
+TYPE_MSGPACK = "msgpack"
+TYPE_MSGPACK_ZSTD = "msgpack+zstd"
+
+# 默认压缩阈值（字节）
+DEFAULT_COMPRESS_THRESHOLD = 64 * 1024
+ZSTD_LEVEL = 3
+
+# msgpack 扩展类型编号
+_EXT_MESSAGE = 1
+_EXT_TUPLE = 2
+_EXT_SET = 3
+_EXT_DATETIME = 4
+_EXT_DATE = 5
+_EXT_TIME = 6
+_EXT_TIMEDELTA = 7
+_EXT_UUID = 8
+_EXT_SEND = 9
+_EXT_INTERRUPT = 10
+_EXT_FROZENSET = 11
+
+# 消息类别的类型标记，新增消息类型时在这里登记
+_MESSAGE_TAGS: Dict[Type[BaseMessage], int] = {
+    HumanMessage: 1,
+    AIMessage: 2,
+    SystemMessage: 3,
+    ToolMessage: 4,
+    AIMessageChunk: 5,
+    RemoveMessage: 6,
+}
+_MESSAGE_CLASSES: Dict[int, Type[BaseMessage]] = {tag: cls for cls, tag in _MESSAGE_TAGS.items()}
+
+_PACK_OPTIONS = (
+    ormsgpack.OPT_NON_STR_KEYS
+    | ormsgpack.OPT_PASSTHROUGH_TUPLE
+    | ormsgpack.OPT_PASSTHROUGH_DATETIME
+    | ormsgpack.OPT_PASSTHROUGH_UUID
+    | ormsgpack.OPT_PASSTHROUGH_DATACLASS
+)
+
+
+def _pack(obj: Any) -> bytes:
+    return ormsgpack.packb(obj, default=_default, option=_PACK_OPTIONS)
+
+
+def _unpack(data: bytes) -> Any:
+    return ormsgpack.unpackb(data, ext_hook=_ext_hook, option=ormsgpack.OPT_NON_STR_KEYS)
+
+
+def _default(obj: Any) -> ormsgpack.Ext:
+    """把 msgpack 不支持的类型编码为扩展类型"""
+    message_tag = _MESSAGE_TAGS.get(type(obj))
+    if message_tag is not None:
+        return ormsgpack.Ext(_EXT_MESSAGE, _pack((message_tag, obj.model_dump())))
+    if isinstance(obj, tuple):
+        return ormsgpack.Ext(_EXT_TUPLE, _pack(list(obj)))
+    if isinstance(obj, set):
+        return ormsgpack.Ext(_EXT_SET, _pack(list(obj)))
+    if isinstance(obj, frozenset):
+        return ormsgpack.Ext(_EXT_FROZENSET, _pack(list(obj)))
+    if isinstance(obj, datetime):
+        return ormsgpack.Ext(_EXT_DATETIME, obj.isoformat().encode("utf-8"))
+    if isinstance(obj, date):
+        return ormsgpack.Ext(_EXT_DATE, obj.isoformat().encode("utf-8"))
+    if isinstance(obj, time):
+        return ormsgpack.Ext(_EXT_TIME, obj.isoformat().encode("utf-8"))
+    if isinstance(obj, timedelta):
+        return ormsgpack.Ext(_EXT_TIMEDELTA, _pack([obj.days, obj.seconds, obj.microseconds]))
+    if isinstance(obj, UUID):
+        return ormsgpack.Ext(_EXT_UUID, obj.bytes)
+    if isinstance(obj, Send):
+        return ormsgpack.Ext(_EXT_SEND, _pack([obj.node, obj.arg]))
+    if isinstance(obj, Interrupt):
+        return ormsgpack.Ext(_EXT_INTERRUPT, _pack([obj.value, obj.id]))
+    raise TypeError(f"CustomSerializer 不支持的类型: {type(obj).__module__}.{type(obj).__qualname__}")
+
 
-logger = logging.getLogger(__name__)
+def _decode_message(data: bytes) -> BaseMessage:
+    tag, fields = _unpack(data)
+    cls = _MESSAGE_CLASSES.get(tag)
+    if cls is None:
+        raise ValueError(f"未知的消息类型标记: {tag}")
+    return cls(**fields)
+
+
+_EXT_DECODERS: Dict[int, Callable[[bytes], Any]] = {
+    _EXT_MESSAGE: _decode_message,
+    _EXT_TUPLE: lambda data: tuple(_unpack(data)),
+    _EXT_SET: lambda data: set(_unpack(data)),
+    _EXT_FROZENSET: lambda data: frozenset(_unpack(data)),
+    _EXT_DATETIME: lambda data: datetime.fromisoformat(data.decode("utf-8")),
+    _EXT_DATE: lambda data: date.fromisoformat(data.decode("utf-8")),
+    _EXT_TIME: lambda data: time.fromisoformat(data.decode("utf-8")),
+    _EXT_TIMEDELTA: lambda data: timedelta(*_unpack(data)),
+    _EXT_UUID: lambda data: UUID(bytes=data),
+    _EXT_SEND: lambda data: Send(*_unpack(data)),
+    _EXT_INTERRUPT: lambda data: Interrupt(*_unpack(data)),
+}
+
+
+def _ext_hook(code: int, data: bytes) -> Any:
+    decoder = _EXT_DECODERS.get(code)
+    if decoder is None:
+        raise ValueError(f"未知的扩展类型: {code}")
+    return decoder(data)
 
 
 class CustomSerializer(SerializerProtocol):
-    """自定义序列化器，专门处理 LangChain 消息类型"""
-    
-    def dumps(self, obj: Any) -> bytes:
-        """序列化对象"""
-        if isinstance(obj, ToolMessage):
-            # 将 ToolMessage 转换为可序列化的字典
-            obj_dict = {
-                'type': 'ToolMessage',
-                'content': obj.content,
-                'tool_call_id': getattr(obj, 'tool_call_id', None),
-                'name': getattr(obj, 'name', None),
-                'additional_kwargs': getattr(obj, 'additional_kwargs', {}),
-                'id': getattr(obj, 'id', None)
-            }
-            return pickle.dumps(obj_dict)
-        elif isinstance(obj, (AIMessage, HumanMessage, SystemMessage)):
-            # 处理其他消息类型
-            obj_dict = {
-                'type': obj.__class__.__name__,
-                'content': obj.content,
-                'additional_kwargs': getattr(obj, 'additional_kwargs', {}),
-                'id': getattr(obj, 'id', None)
-            }
-            return pickle.dumps(obj_dict)
-        else:
-            # 其他类型使用 pickle 序列化
-            return pickle.dumps(obj)
-    
+    """msgpack 序列化器，专门处理 LangChain 消息类型，大对象使用 zstd 压缩"""
+
+    def __init__(self, compress_threshold: int = DEFAULT_COMPRESS_THRESHOLD):
+        # 小于等于 0 时不压缩
+        self.compress_threshold = compress_threshold
+
     def dumps_typed(self, obj: Any) -> Tuple[str, bytes]:
         """带类型的序列化"""
-        if isinstance(obj, ToolMessage):
-            obj_dict = {
-                'type': 'ToolMessage',
-                'content': obj.content,
-                'tool_call_id': getattr(obj, 'tool_call_id', None),
-                'name': getattr(obj, 'name', None),
-                'additional_kwargs': getattr(obj, 'additional_kwargs', {}),
-                'id': getattr(obj, 'id', None)
-            }
-            return "ToolMessage", pickle.dumps(obj_dict)
-        elif isinstance(obj, (AIMessage, HumanMessage, SystemMessage)):
-            obj_dict = {
-                'type': obj.__class__.__name__,
-                'content': obj.content,
-                'additional_kwargs': getattr(obj, 'additional_kwargs', {}),
-                'id': getattr(obj, 'id', None)
-            }
-            return obj.__class__.__name__, pickle.dumps(obj_dict)
-        else:
-            return "pickle", pickle.dumps(obj)
-    
-    def loads(self, data: bytes) -> Any:
-        """反序列化对象"""
-        try:
-            obj = pickle.loads(data)
-            if isinstance(obj, dict) and 'type' in obj:
-                return self._reconstruct_message(obj)
-            return obj
-        except Exception as e:
-            # 如果反序列化失败，返回原始数据
-            return data
-    
+        if obj is None:
+            return TYPE_NULL, b""
+        if isinstance(obj, bytes):
+            return TYPE_BYTES, obj
+        if isinstance(obj, (bytearray, memoryview)):
+            return TYPE_BYTES, bytes(obj)
+        data = _pack(obj)
+        if zstandard is not None and 0 < self.compress_threshold <= len(data):
+            compressed = zstandard.compress(data, ZSTD_LEVEL)
+            if len(compressed) < len(data):
+                return TYPE_MSGPACK_ZSTD, compressed
+        return TYPE_MSGPACK, data
+
     def loads_typed(self, data: Tuple[str, bytes]) -> Any:
-        """带类型的反序列化"""
-        type_str, bytes_data = data
-        try:
-            obj = pickle.loads(bytes_data)
-            if isinstance(obj, dict) and 'type' in obj:
-                return self._reconstruct_message(obj)
-            return obj
-        except Exception as e:
-            # 如果反序列化失败，返回原始数据
-            return bytes_data
-    
-    def _reconstruct_message(self, obj_dict: Dict[str, Any]) -> Any:
-        """重建消息对象"""
-        message_type = obj_dict.get('type')
-        
-        if message_type == 'ToolMessage':
-            return ToolMessage(
-                content=obj_dict.get('content', ''),
-                tool_call_id=obj_dict.get('tool_call_id'),
-                name=obj_dict.get('name'),
-                additional_kwargs=obj_dict.get('additional_kwargs', {}),
-                id=obj_dict.get('id')
-            )
-        elif message_type == 'AIMessage':
-            return AIMessage(
-                content=obj_dict.get('content', ''),
-                additional_kwargs=obj_dict.get('additional_kwargs', {}),
-                id=obj_dict.get('id')
-            )
-        elif message_type == 'HumanMessage':
-            return HumanMessage(
-                content=obj_dict.get('content', ''),
-                additional_kwargs=obj_dict.get('additional_kwargs', {}),
-                id=obj_dict.get('id')
-            )
-        elif message_type == 'SystemMessage':
-            return SystemMessage(
-                content=obj_dict.get('content', ''),
-                additional_kwargs=obj_dict.get('additional_kwargs', {}),
-                id=obj_dict.get('id')
-            )
-        else:
-            return obj_dict
+        """带类型的反序列化，类型标记未知时抛出 ValueError"""
+        type_str, payload = data
+        if type_str == TYPE_NULL:
+            return None
+        if type_str == TYPE_BYTES:
+            return payload
+        if type_str == TYPE_MSGPACK:
+            return _unpack(payload)
+        if type_str == TYPE_MSGPACK_ZSTD:
+            if zstandard is None:
+                raise ValueError("数据使用 zstd 压缩，但未安装 zstandard")
+            return _unpack(zstandard.decompress(payload))
+        raise ValueError(f"不支持的序列化类型: {type_str}")
+
+    def dumps(self, obj: Any) -> bytes:
+        """序列化对象（不带类型，只用于 msgpack 可编码的对象）"""
+        return _pack(obj)
+
+    def loads(self, data: bytes) -> Any:
+        """反序列化 dumps 的结果"""
+        return _unpack(data)
@@ -0,0 +1,113 @@
+"""
+图片预处理
+
+上传的手相、面相照片在发送给视觉模型前统一处理：按 EXIF 方向旋正、缩小到最长边不超过配置值、
+重新编码为 JPEG/WebP，并识别真实的 MIME 类型。处理为 CPU 密集操作，调用方应放到线程池执行。
+像素数超过 Pillow 的 MAX_IMAGE_PIXELS 的图片（解压炸弹）抛出 ImageTooLargeError，
+无法解析或类型未知的文件抛出 InvalidImageError，均由调用方返回 400，不转发给模型
+"""
+import io
+from typing import Optional, Tuple
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from cfg.setting import get_settings
+from utils.unified_logger import get_logger
+
+logger = get_logger(__name__)
+
+# 文件头魔数对应的 MIME 类型，关闭预处理时用于校验上传的文件
+_MAGIC_MIME_TYPES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+)
+
+_EXIF_ORIENTATION = 0x0112
+
+_OUTPUT_FORMATS = {
+    "jpeg": ("JPEG", "image/jpeg"),
+    "webp": ("WEBP", "image/webp"),
+}
+
+
+class ImageTooLargeError(ValueError):
+    """图片像素数超过上限（可能是解压炸弹）"""
+
+
+class InvalidImageError(ValueError):
+    """上传的文件不是可识别的图片"""
+
+
+def detect_image_mime(data: bytes) -> Optional[str]:
+    """根据文件头识别图片 MIME 类型，无法识别时返回 None"""
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data[4:12] in (b"ftypheic", b"ftypheix", b"ftypmif1", b"ftypmsf1"):
+        return "image/heic"
+    for magic, mime in _MAGIC_MIME_TYPES:
+        if data.startswith(magic):
+            return mime
+    return None
+
+
+def preprocess_image(data: bytes) -> Tuple[bytes, str]:
+    """
+    预处理图片，返回 (图片字节, MIME 类型)
+
+    图片已足够小且重新编码后反而更大时保留原图；像素数超过上限时抛出 ImageTooLargeError，
+    Pillow 无法解析时抛出 InvalidImageError。关闭预处理时只按文件头校验类型，未知类型同样抛出 InvalidImageError
+    """
+    settings = get_settings()
+    original_mime = detect_image_mime(data)
+    if not settings.image_preprocess_enabled:
+        if original_mime is None:
+            raise InvalidImageError(f"无法识别的图片类型（{len(data)} 字节）")
+        return data, original_mime
+
+    output_format, output_mime = _OUTPUT_FORMATS.get(settings.image_format.lower(), _OUTPUT_FORMATS["jpeg"])
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            original_mime = Image.MIME.get(image.format, original_mime or "application/octet-stream")
+            original_size = image.size
+            # 超过 MAX_IMAGE_PIXELS 但未到两倍时 Pillow 只发出警告，这里同样拒绝，不解码
+            if Image.MAX_IMAGE_PIXELS and original_size[0] * original_size[1] > Image.MAX_IMAGE_PIXELS:
+                raise ImageTooLargeError(
+                    f"图片像素数过多: {original_size[0]}x{original_size[1]}，上限 {Image.MAX_IMAGE_PIXELS} 像素"
+                )
+            rotated = image.getexif().get(_EXIF_ORIENTATION, 1) != 1
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((settings.image_max_edge, settings.image_max_edge), Image.Resampling.LANCZOS)
+
+            if image.mode not in ("RGB", "L") and not (output_format == "WEBP" and image.mode == "RGBA"):
+                if image.mode in ("RGBA", "LA", "P") and output_format == "JPEG":
+                    # JPEG 不支持透明通道，铺白底
+                    rgba = image.convert("RGBA")
+                    image = Image.new("RGB", rgba.size, (255, 255, 255))
+                    image.paste(rgba, mask=rgba.getchannel("A"))
+                else:
+                    image = image.convert("RGB")
+
+            buffer = io.BytesIO()
+            image.save(buffer, format=output_format, quality=settings.image_quality, optimize=True)
+            processed = buffer.getvalue()
+            resized = image.size != original_size
+    except (Image.DecompressionBombError, Image.DecompressionBombWarning) as e:
+        # 警告被配置为异常（如 -W error）时同样按解压炸弹处理
+        raise ImageTooLargeError(f"图片像素数过多: {e}") from e
+    except ImageTooLargeError:
+        raise
+    except (UnidentifiedImageError, OSError, ValueError) as e:
+        raise InvalidImageError(f"图片无法解析: {e}（{len(data)} 字节，{original_mime or '未知类型'}）") from e
+
+    if not resized and not rotated and original_mime == output_mime and len(processed) >= len(data):
+        logger.info(f"图片无需压缩: {len(data)} 字节，{original_mime}，{original_size[0]}x{original_size[1]}")
+        return data, original_mime
+
+    logger.info(
+        f"图片预处理: {len(data)} -> {len(processed)} 字节，"
+        f"{original_mime} {original_size[0]}x{original_size[1]} -> {output_mime} {image.size[0]}x{image.size[1]}"
+    )
+    return processed, output_mime